@@ -5,10 +5,177 @@ Created on Fri Jul  5 16:11:11 2019
 @author: Clemens Schaefermeier, attocube systems AG
 '''
 
+import collections
 import ctypes
+import enum
 import os
-import warnings
-import platform
+import sys
+import time
+
+# logging and warnings are imported when needed, they are among the
+# slowest imports of the module
+def __getattr__(name):
+    if name == 'logger':
+        import logging
+        return logging.getLogger(__name__)
+    raise AttributeError('module {!r} has no attribute {!r}'.format(
+        __name__, name))
+
+# Records returned by the status and info methods. Being tuples, they
+# unpack like the plain tuples returned before.
+AxisStatus = collections.namedtuple(
+    'AxisStatus',
+    'connected enabled moving target eot_fwd eot_bwd error')
+DeviceConfig = collections.namedtuple(
+    'DeviceConfig', 'sync lockin duty app')
+DeviceInfo = collections.namedtuple(
+    'DeviceInfo', 'dev_type id serial_no address connected')
+# Outcome of move_to / move_many. reason is one of 'target', 'timeout',
+# 'eot_fwd', 'eot_bwd' or 'error'; elapsed is in s.
+MoveResult = collections.namedtuple(
+    'MoveResult', 'axis target position reached reason elapsed polls')
+CacheStats = collections.namedtuple('CacheStats', 'hits misses entries')
+
+class AxisFlag(enum.IntFlag):
+    '''
+    Axis status packed into one integer, one bit per field of AxisStatus
+    in the same order. Fits into a uint8 for logging status histories,
+    see ANC350.arrays.
+    '''
+    CONNECTED = 0x01
+    ENABLED = 0x02
+    MOVING = 0x04
+    TARGET = 0x08
+    EOT_FWD = 0x10
+    EOT_BWD = 0x20
+    ERROR = 0x40
+
+    @classmethod
+    def from_status(cls, status):
+        '''
+        Packs an AxisStatus into flags.
+        '''
+        bits = 0
+        for bit, value in zip(_AXIS_BITS, status):
+            if value:
+                bits |= bit
+        return cls(bits)
+
+    def status(self):
+        '''
+        Unpacks the flags into an AxisStatus of ints.
+        '''
+        return AxisStatus(*(int(bool(self & bit)) for bit in _AXIS_BITS))
+
+_AXIS_BITS = tuple(1 << i for i in range(len(AxisStatus._fields)))
+
+class DeviceFeature(enum.IntFlag):
+    '''
+    Feature bits of the device configuration, see getDeviceConfig.
+    '''
+    SYNC = 0x01
+    LOCKIN = 0x02
+    DUTY = 0x04
+    APP = 0x08
+
+def _report(verbose, message, *args):
+    '''
+    Prints a diagnostic message in verbose mode, otherwise passes it to the
+    module logger at debug level. The message is only formatted if it is
+    printed or the debug level is enabled.
+    '''
+    if verbose:
+        print(message.format(*args))
+        return
+    # If logging has not been imported, no handler can be configured
+    logging = sys.modules.get('logging')
+    if logging is None:
+        return
+    logger = logging.getLogger(__name__)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(message.format(*args))
+
+# List of error types, manually imported from the header file anc350.h
+ANC_RC = {
+    0 : "No error",
+    -1 : "Unknown / other error",
+    1 : "Timeout during data retrieval",
+    2 : "No contact with the positioner via USB",
+    3 : "Error in the driver response",
+    7 : "A connection attempt failed because the device is already in use",
+    8 : "Unknown error",
+    9 : "Invalid device number used in call",
+    10 : "Invalid axis number in function call",
+    11 : "Parameter in call is out of range",
+    12 : "Function not available for device type",
+    13 : "Error opening or interpreting a file"}
+
+class ANCError(RuntimeError):
+    '''
+    Error returned by a dll function. The subclasses below are raised for
+    the individual return codes, this class for unknown / other errors.
+    The message is only formatted when the exception is printed.
+    '''
+    def __init__(self, ret_code, func_name, args):
+        '''
+        Parameters
+        ----------
+        ret_code : int
+            Return value from the function
+        func_name : str
+            Name of the function that is called
+        args : tuple
+            Parameters passed to the function
+        '''
+        super().__init__(ret_code, func_name, args)
+        self.ret_code = ret_code
+        self.func_name = func_name
+        self.func_args = args
+
+    def __str__(self):
+        return 'Error: {:} {:} with parameters: {:}'.format(
+            ANC_RC.get(self.ret_code, 'Return code {}'.format(self.ret_code)),
+            self.func_name, self.func_args)
+
+class ANCTimeout(ANCError):
+    '''Timeout during data retrieval (1).'''
+
+class ANCNotConnected(ANCError):
+    '''No contact with the positioner via USB (2).'''
+
+class ANCDriverError(ANCError):
+    '''Error in the driver response (3).'''
+
+class ANCDeviceLocked(ANCError):
+    '''The device is already in use (7).'''
+
+class ANCNoDevice(ANCError):
+    '''Invalid device number used in call (9).'''
+
+class ANCNoAxis(ANCError):
+    '''Invalid axis number in function call (10).'''
+
+class ANCParamOutOfRange(ANCError):
+    '''Parameter in call is out of range (11).'''
+
+class ANCNotAvailable(ANCError):
+    '''Function not available for device type (12).'''
+
+class ANCFileError(ANCError):
+    '''Error opening or interpreting a file (13).'''
+
+_ANC_EXCEPTIONS = {
+    1: ANCTimeout,
+    2: ANCNotConnected,
+    3: ANCDriverError,
+    7: ANCDeviceLocked,
+    9: ANCNoDevice,
+    10: ANCNoAxis,
+    11: ANCParamOutOfRange,
+    12: ANCNotAvailable,
+    13: ANCFileError}
+
+_ANC_OK = ANC_RC[0]
 
 def ANC_errcheck(ret_code, func, args):
     '''
@@ -27,80 +194,240 @@ def ANC_errcheck(ret_code, func, args):
     -------
     str
         String of the return code
+
+    Raises
+    ------
+    ANCError
+        Subclass of ANCError matching the return code, if not 0
     '''
-    # List of error types, manually imported from the header file anc350.h
-    ANC_RC = {
-        0 : "No error",
-        -1 : "Unknown / other error",
-        1 : "Timeout during data retrieval",
-        2 : "No contact with the positioner via USB",
-        3 : "Error in the driver response",
-        7 : "A connection attempt failed because the device is already in use",
-        8 : "Unknown error",
-        9 : "Invalid device number used in call",
-        10 : "Invalid axis number in function call",
-        11 : "Parameter in call is out of range",
-        12 : "Function not available for device type",
-        13 : "Error opening or interpreting a file"}
-
-    assert str(type(func)) == "<class 'ctypes.CDLL.__init__.<locals>._FuncPtr'>"
-
-    if ret_code != 0:
-        raise RuntimeError('Error: {:} '.format(ANC_RC[ret_code]) +
-                           str(func.__name__) +
-                           ' with parameters: ' + str(args))
-    return ANC_RC[ret_code]
-
-def load_ANC350dll():
+    if ret_code == 0:
+        return _ANC_OK
+    raise _ANC_EXCEPTIONS.get(ret_code, ANCError)(ret_code, func.__name__,
+                                                   args)
+
+# Prototypes of the library functions, taken from anc350res.h,v 1.12
+# 2017/08/04 13:59:18. Out strings are declared as void pointers, so both
+# string buffers and byref() can be passed. Functions found in non-res
+# products only have a return type.
+_DEVHDL = ctypes.c_void_p
+_PROTOTYPES = (
+    ('ANC_configureAQuadBIn', (_DEVHDL, ctypes.c_uint, ctypes.c_int,
+                               ctypes.c_double)),
+    ('ANC_configureAQuadBOut', (_DEVHDL, ctypes.c_uint, ctypes.c_int,
+                                ctypes.c_double, ctypes.c_double)),
+    ('ANC_configureExtTrigger', (_DEVHDL, ctypes.c_uint, ctypes.c_uint)),
+    ('ANC_configureNslTrigger', (_DEVHDL, ctypes.c_int)),
+    ('ANC_configureNslTriggerAxis', (_DEVHDL, ctypes.c_uint)),
+    ('ANC_configureRngTrigger', (_DEVHDL, ctypes.c_uint, ctypes.c_uint,
+                                 ctypes.c_uint)),
+    ('ANC_configureRngTriggerEps', (_DEVHDL, ctypes.c_uint, ctypes.c_uint)),
+    ('ANC_configureRngTriggerPol', (_DEVHDL, ctypes.c_uint, ctypes.c_uint)),
+    ('ANC_connect', (ctypes.c_uint, ctypes.POINTER(_DEVHDL))),
+    ('ANC_disconnect', (_DEVHDL,)),
+    ('ANC_discover', (ctypes.c_uint, ctypes.POINTER(ctypes.c_uint))),
+    ('ANC_getActuatorName', (_DEVHDL, ctypes.c_uint, ctypes.c_void_p)),
+    ('ANC_getActuatorType', (_DEVHDL, ctypes.c_uint,
+                             ctypes.POINTER(ctypes.c_int))),
+    ('ANC_getAmplitude', (_DEVHDL, ctypes.c_uint,
+                          ctypes.POINTER(ctypes.c_double))),
+    ('ANC_getAxisStatus', (_DEVHDL, ctypes.c_uint) +
+                          (ctypes.POINTER(ctypes.c_int),) * 7),
+    ('ANC_getDcVoltage', (_DEVHDL, ctypes.c_uint,
+                          ctypes.POINTER(ctypes.c_double))),
+    ('ANC_getDeviceConfig', (_DEVHDL, ctypes.POINTER(ctypes.c_uint))),
+    ('ANC_getDeviceInfo', (ctypes.c_uint, ctypes.POINTER(ctypes.c_int),
+                           ctypes.POINTER(ctypes.c_int), ctypes.c_void_p,
+                           ctypes.c_void_p, ctypes.POINTER(ctypes.c_int))),
+    ('ANC_getFirmwareVersion', (_DEVHDL, ctypes.POINTER(ctypes.c_int))),
+    ('ANC_getFrequency', (_DEVHDL, ctypes.c_uint,
+                          ctypes.POINTER(ctypes.c_double))),
+    ('ANC_getLutName', (_DEVHDL, ctypes.c_uint, ctypes.c_void_p)),
+    ('ANC_getPosition', (_DEVHDL, ctypes.c_uint,
+                         ctypes.POINTER(ctypes.c_double))),
+    ('ANC_loadLutFile', (_DEVHDL, ctypes.c_uint, ctypes.c_char_p)),
+    ('ANC_measureCapacitance', (_DEVHDL, ctypes.c_uint,
+                                ctypes.POINTER(ctypes.c_double))),
+    ('ANC_registerExternalIp', (ctypes.c_char_p,)),
+    ('ANC_saveParams', (_DEVHDL,)),
+    ('ANC_selectActuator', (_DEVHDL, ctypes.c_uint, ctypes.c_uint)),
+    ('ANC_setAmplitude', (_DEVHDL, ctypes.c_uint, ctypes.c_double)),
+    ('ANC_setAxisOutput', (_DEVHDL, ctypes.c_uint, ctypes.c_int,
+                           ctypes.c_int)),
+    ('ANC_setDcVoltage', (_DEVHDL, ctypes.c_uint, ctypes.c_double)),
+    ('ANC_setFrequency', (_DEVHDL, ctypes.c_uint, ctypes.c_double)),
+    ('ANC_setTargetGround', (_DEVHDL, ctypes.c_uint, ctypes.c_int)),
+    ('ANC_setTargetPosition', (_DEVHDL, ctypes.c_uint, ctypes.c_double)),
+    ('ANC_setTargetRange', (_DEVHDL, ctypes.c_uint, ctypes.c_double)),
+    ('ANC_startAutoMove', (_DEVHDL, ctypes.c_uint, ctypes.c_int,
+                           ctypes.c_int)),
+    ('ANC_startContinousMove', (_DEVHDL, ctypes.c_uint, ctypes.c_int,
+                                ctypes.c_int)),
+    ('ANC_startSingleStep', (_DEVHDL, ctypes.c_uint, ctypes.c_int)),
+    # Not implemented -- start (found in non-res products):
+    ('ANC_configureDutyCycle', None),
+    ('ANC_enableRefAutoReset', None),
+    ('ANC_enableRefAutoUpdate', None),
+    ('ANC_enableSensor', None),
+    ('ANC_enableTrace', None),
+    ('ANC_getRefPosition', None),
+    ('ANC_moveReference', None),
+    ('ANC_resetPosition', None),
+    # Not implemented -- stop.
+)
+
+# Optional symbols, missing in older library versions
+_OPTIONAL = ('ANC_getLutName',)
+
+_native_dll = None
+_library_path = None
+_function_tables = {}
+# Metrics registry of the module-level functions, see enableModuleMetrics
+_module_metrics = None
+
+def load_ANC350dll(backend=None):
     '''
     Import .dll/.so to communicate with ANC350. Pay attention to have libusb0
     available too for Windows systems.
 
+    Parameters
+    ----------
+    backend : str or object
+        'native' for the vendor library, 'sim' for the in-process simulator
+        of ANC350.simulator, or an object providing the ANC_* functions
+        itself, e.g. a SimulatedANC350 instance. Default: None, i.e. the
+        value of the environment variable ANC350_BACKEND or 'native'
+
     Returns
     -------
     anc : ctypes
-        Instance of the LoadLibrary method
+        Instance of the LoadLibrary method. The native library is loaded on
+        the first call only, later calls return the same handle.
     '''
-    root_path = os.path.dirname(os.path.realpath(__file__))
-    lib_name = 'anc350v4'
-    bitness = platform.architecture()[0]
-    os_name = platform.system()
-
-    if os_name not in ('Windows', 'Linux'):
-        RuntimeError('Running only on Windows or Linux OS')
-    if bitness not in ('64bit', '32bit'):
-        RuntimeError('Can not determine OS bit-ness')
+    if backend is None:
+        backend = os.environ.get('ANC350_BACKEND', 'native')
+    if not isinstance(backend, str):
+        return backend
+    if backend in ('sim', 'simulator'):
+        from . import simulator
+        return simulator.default_simulator()
+    if backend != 'native':
+        raise ValueError('Unknown backend {!r}'.format(backend))
+
+    global _native_dll
+    if _native_dll is None:
+        _native_dll = _load_native_dll()
+    return _native_dll
+
+def library_path():
+    '''
+    Returns the path of the vendor library for this platform and the
+    bit-ness of the Python interpreter. It is determined once.
 
-    if os_name == 'Windows':
-        # Note: MSVCP100.dll is required to work with the dll
-        lib_name_usb = 'libusb0.dll'
-        if bitness == '64bit':
-            lib_path = os.path.join(root_path, 'win64')
+    Returns
+    -------
+    path : str
+        Path of anc350v4.dll or libanc350v4.so in the package
+    '''
+    global _library_path
+    if _library_path is None:
+        if sys.platform == 'win32':
+            os_name, lib_name = 'win', 'anc350v4.dll'
+        elif sys.platform.startswith('linux'):
+            os_name, lib_name = 'linux', 'libanc350v4.so'
         else:
-            lib_path = os.path.join(root_path, 'win32')
-        libusb = os.path.join(lib_path, lib_name_usb)
+            raise RuntimeError('Running only on Windows or Linux OS')
+        # Pointer size of the interpreter, which is what
+        # platform.architecture() reports, without inspecting the
+        # executable
+        bitness = 8 * ctypes.sizeof(ctypes.c_void_p)
+        if bitness not in (64, 32):
+            raise RuntimeError('Can not determine OS bit-ness')
+        root_path = os.path.dirname(os.path.realpath(__file__))
+        _library_path = os.path.join(root_path, os_name + str(bitness),
+                                     lib_name)
+    return _library_path
+
+def _load_native_dll():
+    '''
+    Loads the vendor library for this platform, see load_ANC350dll.
+    '''
+    lib = library_path()
+    if sys.platform == 'win32':
+        # Note: MSVCP100.dll is required to work with the dll
+        libusb = os.path.join(os.path.dirname(lib), 'libusb0.dll')
         if not os.path.isfile(libusb):
-            raise FileNotFoundError('Error: can not find '
-                                    + lib_path + lib_name_usb)
-        lib = os.path.join(lib_path, lib_name + '.dll')
-        if not os.path.isfile(lib):
-            raise FileNotFoundError('Error: can not find '
-                                    + lib_path + lib_name + '.dll')
-        anc = ctypes.cdll.LoadLibrary(lib)
-    else:
-        if bitness == '64bit':
-            lib_path = os.path.join(root_path, 'linux64')
-        else:
-            lib_path = os.path.join(root_path, 'linux32')
-        lib = os.path.join(lib_path, lib_name + '.so')
-        if not os.path.isfile(lib):
-            raise FileNotFoundError('Error: can not find '
-                                    + lib_path + lib_name + '.so')
-        anc = ctypes.cdll.LoadLibrary(lib)
+            raise FileNotFoundError('Error: can not find ' + libusb)
+    if not os.path.isfile(lib):
+        raise FileNotFoundError('Error: can not find ' + lib)
+    return ctypes.cdll.LoadLibrary(lib)
+
+def function_table(anc):
+    '''
+    Returns the library functions with declared argtypes, restype and
+    errcheck. The table is built once per library and shared by all
+    Positioner_ANC350 instances.
+
+    Parameters
+    ----------
+    anc : ctypes
+        Library handle from load_ANC350dll
 
-    return anc
+    Returns
+    -------
+    table : dict
+        Maps the attribute names used by Positioner_ANC350, e.g.
+        '_getPosition_dll', to the function objects.
+    '''
+    table = _function_tables.get(anc)
+    if table is None:
+        table = {}
+        for name, argtypes in _PROTOTYPES:
+            try:
+                func = getattr(anc, name)
+            except AttributeError:
+                if name not in _OPTIONAL:
+                    raise
+                import warnings
+                warnings.warn('{} not available'.format(name))
+                continue
+            if argtypes is not None:
+                func.argtypes = argtypes
+            func.restype = ctypes.c_int
+            func.errcheck = ANC_errcheck
+            table['_' + name[4:] + '_dll'] = func
+        _function_tables[anc] = table
+    return table
+
+def enableModuleMetrics(enable=True):
+    '''
+    Enables or disables the call statistics of discover_ANC350,
+    registerExternalIp and getDeviceInfo, see ANC350.metrics.
+
+    Parameters
+    ----------
+    enable : bool
+        Enable (True) or disable (False) the statistics. Default: True
 
-def discover_ANC350(ifaces=3):
+    Returns
+    -------
+    metrics : ANC350.metrics.Metrics
+        Registry of the statistics, None if disabled
+    '''
+    global _module_metrics
+    if not enable:
+        _module_metrics = None
+    elif _module_metrics is None:
+        from .metrics import Metrics
+        _module_metrics = Metrics({'device': 'module'})
+    return _module_metrics
+
+def _module_function(backend, name):
+    func = function_table(load_ANC350dll(backend))['_' + name + '_dll']
+    if _module_metrics is not None:
+        func = _module_metrics.wrap(func, 'ANC_' + name)
+    return func
+
+def discover_ANC350(ifaces=3, backend=None, verbose=True):
     '''
     The function searches for connected ANC350RES devices on USB and LAN
     and initialises internal data structures per device. Devices that are
@@ -117,24 +444,26 @@ def discover_ANC350(ifaces=3):
     ifaces : int
         Interfaces where devices are to be searched.
         {None: 0, USB: 1, ethernet: 2, all: 3} Default: 3
+    backend : str or object
+        Library backend, see load_ANC350dll. Default: None
+    verbose : bool
+        Print the number of devices found (True) or only log it at debug
+        level (False). Default: True
 
     Returns
     -------
     devCount : int
         Number of devices found
     '''
-    anc = load_ANC350dll()
-
-    discover_dll = anc.ANC_discover
-    discover_dll.errcheck = ANC_errcheck
+    discover_dll = _module_function(backend, 'discover')
 
-    devCount = ctypes.c_int()
-    discover_dll(ctypes.c_int(ifaces),
+    devCount = ctypes.c_uint()
+    discover_dll(ctypes.c_uint(ifaces),
                  ctypes.byref(devCount))
-    print('{:} ANC350 devices found.'.format(devCount.value))
+    _report(verbose, '{:} ANC350 devices found.', devCount.value)
     return devCount.value
 
-def registerExternalIp(hostname):
+def registerExternalIp(hostname, backend=None):
     '''
     discover is able to find devices connected via TCP/IP
     in the same network segment, but it can't "look through" routers.
@@ -152,19 +481,60 @@ def registerExternalIp(hostname):
     hostname : str
         hostname or IP Address in dotted decimal notation of the device to
         register.
+    backend : str or object
+        Library backend, see load_ANC350dll. Default: None
     '''
-    anc = load_ANC350dll()
+    registerExternalIp_dll = _module_function(backend, 'registerExternalIp')
 
-    registerExternalIp_dll = anc.ANC_registerExternalIp
-    registerExternalIp_dll.errcheck = ANC_errcheck
+    registerExternalIp_dll(ctypes.c_char_p(hostname.encode('utf-8')))
 
-    registerExternalIp_dll(ctypes.c_char_p(hostname)) # @todo To check
+def getDeviceInfo(devNo=0, backend=None):
+    '''
+    Returns available information about a device found by the last
+    discover_ANC350 call without connecting it, see
+    Positioner_ANC350.getDeviceInfo.
+
+    Parameters
+    ----------
+    devNo : int
+        Sequence number of the device. Default: 0
+    backend : str or object
+        Library backend, see load_ANC350dll. Default: None
+
+    Returns
+    -------
+    info : DeviceInfo
+        Named tuple (dev_type, id, serial_no, address, connected)
+    '''
+    getDeviceInfo_dll = _module_function(backend, 'getDeviceInfo')
+    return _readDeviceInfo(getDeviceInfo_dll, devNo)
+
+def _readDeviceInfo(getDeviceInfo_dll, devNo):
+    devType = ctypes.c_int()
+    id_ = ctypes.c_int()
+    serialNo = ctypes.create_string_buffer(32)
+    address = ctypes.create_string_buffer(32)
+    connected = ctypes.c_int()
+
+    getDeviceInfo_dll(ctypes.c_uint(devNo),
+                      ctypes.byref(devType),
+                      ctypes.byref(id_),
+                      ctypes.byref(serialNo),
+                      ctypes.byref(address),
+                      ctypes.byref(connected))
+
+    return DeviceInfo(devType.value,
+                      id_.value,
+                      serialNo.value.decode('utf-8'),
+                      address.value.decode('utf-8'),
+                      connected.value)
 
 class Positioner_ANC350:
     '''
     Class of a positioner connected to the ANC350.
     '''
-    def __init__(self, devNo=0):
+    def __init__(self, devNo=0, backend=None, verbose=True, cache=False,
+                 metrics=False, threadSafe=False):
         '''
         Initialises the device.
 
@@ -172,116 +542,283 @@ class Positioner_ANC350:
         ----------
         devNo : int
             Device number to be initialised. Default: 0
-        '''
-        anc = load_ANC350dll()
-        # Aliases for the functions from the dll. For handling return
-        # values: '.errcheck' is an attribute from ctypes.
-        # Taken from anc350res.h,v 1.12 2017/08/04 13:59:18
-        self._configureAQuadBIn_dll = anc.ANC_configureAQuadBIn
-        self._configureAQuadBIn_dll.errcheck = ANC_errcheck
-        self._configureAQuadBOut_dll = anc.ANC_configureAQuadBOut
-        self._configureAQuadBOut_dll.errcheck = ANC_errcheck
-        self._configureExtTrigger_dll = anc.ANC_configureExtTrigger
-        self._configureExtTrigger_dll.errcheck = ANC_errcheck
-        self._configureNslTrigger_dll = anc.ANC_configureNslTrigger
-        self._configureNslTrigger_dll.errcheck = ANC_errcheck
-        self._configureNslTriggerAxis_dll = anc.ANC_configureNslTriggerAxis
-        self._configureNslTriggerAxis_dll.errcheck = ANC_errcheck
-        self._configureRngTrigger_dll = anc.ANC_configureRngTrigger
-        self._configureRngTrigger_dll.errcheck = ANC_errcheck
-        self._configureRngTriggerEps_dll = anc.ANC_configureRngTriggerEps
-        self._configureRngTriggerEps_dll.errcheck = ANC_errcheck
-        self._configureRngTriggerPol_dll = anc.ANC_configureRngTriggerPol
-        self._configureRngTriggerPol_dll.errcheck = ANC_errcheck
-        self._connect_dll = anc.ANC_connect
-        self._connect_dll.errcheck = ANC_errcheck
-        self._disconnect_dll = anc.ANC_disconnect
-        self._disconnect_dll.errcheck = ANC_errcheck
-        self._getActuatorName_dll = anc.ANC_getActuatorName
-        self._getActuatorName_dll.errcheck = ANC_errcheck
-        self._getActuatorType_dll = anc.ANC_getActuatorType
-        self._getActuatorType_dll.errcheck = ANC_errcheck
-        self._getAmplitude_dll = anc.ANC_getAmplitude
-        self._getAmplitude_dll.errcheck = ANC_errcheck
-        self._getAxisStatus_dll = anc.ANC_getAxisStatus
-        self._getAxisStatus_dll.errcheck = ANC_errcheck
-        self._getDcVoltage_dll = anc.ANC_getDcVoltage
-        self._getDcVoltage_dll.errcheck = ANC_errcheck
-        self._getDeviceConfig_dll = anc.ANC_getDeviceConfig
-        self._getDeviceConfig_dll.errcheck = ANC_errcheck
-        self._getDeviceInfo_dll = anc.ANC_getDeviceInfo
-        self._getDeviceInfo_dll.errcheck = ANC_errcheck
-        self._getFirmwareVersion_dll = anc.ANC_getFirmwareVersion
-        self._getFirmwareVersion_dll.errcheck = ANC_errcheck
-        self._getFrequency_dll = anc.ANC_getFrequency
-        self._getFrequency_dll.errcheck = ANC_errcheck
-        self._getPosition_dll = anc.ANC_getPosition
-        self._getPosition_dll.errcheck = ANC_errcheck
-        self._loadLutFile_dll = anc.ANC_loadLutFile
-        self._loadLutFile_dll.errcheck = ANC_errcheck
-        self._measureCapacitance_dll = anc.ANC_measureCapacitance
-        self._measureCapacitance_dll.errcheck = ANC_errcheck
-        self._saveParams_dll = anc.ANC_saveParams
-        self._saveParams_dll.errcheck = ANC_errcheck
-        self._selectActuator_dll = anc.ANC_selectActuator
-        self._selectActuator_dll.errcheck = ANC_errcheck
-        self._setAmplitude_dll = anc.ANC_setAmplitude
-        self._setAmplitude_dll.errcheck = ANC_errcheck
-        self._setAxisOutput_dll = anc.ANC_setAxisOutput
-        self._setAxisOutput_dll.errcheck = ANC_errcheck
-        self._setDcVoltage_dll = anc.ANC_setDcVoltage
-        self._setDcVoltage_dll.errcheck = ANC_errcheck
-        self._setFrequency_dll = anc.ANC_setFrequency
-        self._setFrequency_dll.errcheck = ANC_errcheck
-        try:
-            self._getLutName_dll = anc.ANC_getLutName
-            self._getLutName_dll.errcheck = ANC_errcheck
-        except:
-            warnings.warn('ANC_getLutName not available')
-        self._setTargetGround_dll = anc.ANC_setTargetGround
-        self._setTargetGround_dll.errcheck = ANC_errcheck
-        self._setTargetPosition_dll = anc.ANC_setTargetPosition
-        self._setTargetPosition_dll.errcheck = ANC_errcheck
-        self._setTargetRange_dll = anc.ANC_setTargetRange
-        self._setTargetRange_dll.errcheck = ANC_errcheck
-        self._startAutoMove_dll = anc.ANC_startAutoMove
-        self._startAutoMove_dll.errcheck = ANC_errcheck
-        self._startContinousMove_dll = anc.ANC_startContinousMove
-        self._startContinousMove_dll.errcheck = ANC_errcheck
-        self._startSingleStep_dll = anc.ANC_startSingleStep
-        self._startSingleStep_dll.errcheck = ANC_errcheck
-        # Method count: 35 without ANC_discover and ANC_registerExternalIp
-
-        # Not implemented -- start (found in non-res products):
-        self._configureDutyCycle_dll = anc.ANC_configureDutyCycle
-        self._configureDutyCycle_dll.errcheck = ANC_errcheck
-        self._enableRefAutoReset_dll = anc.ANC_enableRefAutoReset
-        self._enableRefAutoReset_dll.errcheck = ANC_errcheck
-        self._enableRefAutoUpdate_dll = anc.ANC_enableRefAutoUpdate
-        self._enableRefAutoUpdate_dll.errcheck = ANC_errcheck
-        self._enableSensor_dll = anc.ANC_enableSensor
-        self._enableSensor_dll.errcheck = ANC_errcheck
-        self._enableTrace_dll = anc.ANC_enableTrace
-        self._enableTrace_dll.errcheck = ANC_errcheck
-        self._getRefPosition_dll = anc.ANC_getRefPosition
-        self._getRefPosition_dll.errcheck = ANC_errcheck
-        self._moveReference_dll = anc.ANC_moveReference
-        self._moveReference_dll.errcheck = ANC_errcheck
-        self._resetPosition_dll = anc.ANC_resetPosition
-        self._resetPosition_dll.errcheck = ANC_errcheck
-        # Not implemented -- stop.
-
+        backend : str or object
+            Library backend, see load_ANC350dll. Default: None
+        verbose : bool
+            Print diagnostics such as status blocks (True) or only log
+            them at debug level (False). Default: True
+        cache : bool
+            Enable the parameter cache, see enableCache. Default: False
+        metrics : bool
+            Enable the call statistics, see enableMetrics. Default: False
+        threadSafe : bool
+            Serialize the dll calls on a worker thread, see
+            enableThreadSafety. Default: False
+        '''
+        # Aliases for the functions from the dll, e.g. self._getPosition_dll
+        # for ANC_getPosition. The function table is shared per library.
+        self._functions = function_table(load_ANC350dll(backend))
+        self.__dict__.update(self._functions)
+
+        self.verbose = verbose
         self.devNo = devNo
+        self.metrics = None
+        self.traceWriter = None
+        self.worker = None
+        self._poller = None
+        self._commands = None
+        if metrics:
+            self.enableMetrics()
+        if threadSafe:
+            self.enableThreadSafety()
         self.device = self.connect(self.devNo)
+        # Axis number -> digest of the LUT file loaded by loadLutFile
+        self._luts = {}
+        self._cache = {} if cache else None
+        self.cacheHits = 0
+        self.cacheMisses = 0
 
     def __enter__(self):
-        print('Enter __enter__')
+        _report(self.verbose, 'Enter __enter__')
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        print('Enter __exit__')
+        _report(self.verbose, 'Enter __exit__')
         self.disconnect()
 
+    def enableCache(self, enable=True):
+        '''
+        Enables or disables the write-through cache of parameters that the
+        device only changes when they are set: amplitude, frequency,
+        actuator selection and target range. With the cache enabled,
+        setters that would not change the cached value skip the dll call,
+        and getAmplitude, getFrequency, getActuatorName and getActuatorType
+        are answered from memory once read or set. Values are cached as
+        passed to the setters, without the device's internal rounding. The
+        DC voltage is not cached: the feedback controller overwrites it
+        during any move, including moves started by other instances or
+        applications, so setDcVoltage always calls the dll.
+
+        Call invalidateCache after the parameters may have been changed
+        outside of this instance, e.g. by another application or a power
+        cycle.
+
+        Parameters
+        ----------
+        enable : bool
+            Enable (True) or disable (False) the cache. Default: True
+        '''
+        if not enable:
+            self._cache = None
+        elif self._cache is None:
+            self._cache = {}
+
+    def enableMetrics(self, enable=True):
+        '''
+        Enables or disables the call statistics of the dll functions of
+        this instance: number of calls, errors by return code and latency
+        histograms, see ANC350.metrics. While disabled, the plain dll
+        functions are called without any overhead. Pollers created before
+        the statistics are enabled are not counted.
+
+        Parameters
+        ----------
+        enable : bool
+            Enable (True) or disable (False) the statistics. Default: True
+
+        Returns
+        -------
+        metrics : ANC350.metrics.Metrics
+            Registry of the statistics, None if disabled
+        '''
+        if not enable:
+            self.metrics = None
+        elif self.metrics is None:
+            from .metrics import Metrics
+            self.metrics = Metrics({'device': self.devNo})
+        self._bindFunctions()
+        return self.metrics
+
+    def recordTrace(self, trace):
+        '''
+        Starts or stops recording every dll call of this instance to a
+        binary trace, see ANC350.trace. Pollers created before the
+        recording starts are not recorded.
+
+        Parameters
+        ----------
+        trace : str or ANC350.trace.TraceWriter
+            File name of a new trace or a writer, which may be shared by
+            several devices. None stops the recording; the writer is not
+            closed.
+
+        Returns
+        -------
+        writer : ANC350.trace.TraceWriter
+            Writer of the trace, None if stopped
+        '''
+        if isinstance(trace, str):
+            from .trace import TraceWriter
+            trace = TraceWriter(trace)
+        self.traceWriter = trace
+        self._bindFunctions()
+        return trace
+
+    def enableThreadSafety(self, enable=True):
+        '''
+        Enables or disables the thread-safe mode, in which every dll call of
+        this instance, from whichever thread, is executed on a worker thread
+        owned by the device, see ANC350.worker. Calls of different devices
+        still run in parallel. Pollers created before the mode is enabled
+        are not serialized. Methods can be run on the worker as a whole
+        with submit.
+
+        Parameters
+        ----------
+        enable : bool
+            Enable (True) or disable (False) the mode. Default: True
+
+        Returns
+        -------
+        worker : ANC350.worker.DeviceWorker
+            Worker of the device, None if disabled
+        '''
+        if not enable:
+            worker, self.worker = self.worker, None
+            self._bindFunctions()
+            if worker is not None:
+                worker.close()
+        elif self.worker is None:
+            from .worker import DeviceWorker
+            self.worker = DeviceWorker('ANC350-device-{}'.format(self.devNo))
+            self._bindFunctions()
+        return self.worker
+
+    def submit(self, method, *args):
+        '''
+        Runs a method on the worker thread of the device in thread-safe
+        mode, so no calls of other threads interleave with its dll calls.
+        Calls of other threads wait until the method returns, so long
+        methods such as move_to hold them up for the whole move.
+
+        Parameters
+        ----------
+        method : str
+            Name of the method, e.g. 'move_to'
+        *args
+            Arguments of the method
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+            Result of the method
+        '''
+        if self.worker is None:
+            raise RuntimeError('Thread-safe mode is disabled, see '
+                               'enableThreadSafety')
+        return self.worker.submit(getattr(self, method), *args)
+
+    def workerStats(self):
+        '''
+        Returns the contention and queue wait statistics of the thread-safe
+        mode.
+
+        Returns
+        -------
+        stats : ANC350.worker.WorkerStats
+            Statistics of the worker, None if the mode is disabled
+        '''
+        if self.worker is None:
+            return None
+        return self.worker.stats()
+
+    def _bindFunctions(self):
+        # Binds the plain dll functions, wrapped by the enabled trace and
+        # metrics and dispatched to the worker in thread-safe mode
+        for key, func in self._functions.items():
+            # '_getPosition_dll' -> 'ANC_getPosition'
+            name = 'ANC' + key[:-4]
+            if self.traceWriter is not None:
+                func = self.traceWriter.wrap(func, name, self.devNo)
+            if self.metrics is not None:
+                func = self.metrics.wrap(func, name)
+            if self.worker is not None:
+                func = self.worker.wrap(func)
+            setattr(self, key, func)
+        self._poller = None
+
+    def stats(self):
+        '''
+        Returns the call statistics, see enableMetrics.
+
+        Returns
+        -------
+        stats : dict
+            Function name, e.g. 'ANC_getPosition' -> CallStats; empty if
+            the statistics are disabled
+        '''
+        if self.metrics is None:
+            return {}
+        return self.metrics.stats()
+
+    def invalidateCache(self, axisNo=None):
+        '''
+        Drops cached parameters.
+
+        Parameters
+        ----------
+        axisNo : int
+            Axis number (0 ... 2). Default: None, i.e. all axes
+        '''
+        if self._cache is None:
+            return
+        if axisNo is None:
+            self._cache.clear()
+        else:
+            for key in [key for key in self._cache if key[1] == axisNo]:
+                del self._cache[key]
+
+    def cacheStats(self):
+        '''
+        Returns the parameter cache statistics.
+
+        Returns
+        -------
+        stats : CacheStats
+            Number of hits, misses and cached entries
+        '''
+        entries = 0 if self._cache is None else len(self._cache)
+        return CacheStats(self.cacheHits, self.cacheMisses, entries)
+
+    def _cacheGet(self, key):
+        cache = self._cache
+        if cache is None:
+            return None
+        value = cache.get(key)
+        if value is None:
+            self.cacheMisses += 1
+        else:
+            self.cacheHits += 1
+        return value
+
+    def _cacheSkip(self, key, value):
+        cache = self._cache
+        if cache is None:
+            return False
+        if key in cache and cache[key] == value:
+            self.cacheHits += 1
+            return True
+        self.cacheMisses += 1
+        return False
+
+    def _cachePut(self, key, value):
+        if self._cache is not None:
+            self._cache[key] = value
+
+    def _cacheDrop(self, key):
+        if self._cache is not None:
+            self._cache.pop(key, None)
+
     def configureAQuadBIn(self, axisNo, enable, resolution):
         '''
         Enables and configures the A-Quad-B (quadrature) input for the target
@@ -430,15 +967,22 @@ class Positioner_ANC350:
         device = ctypes.c_void_p()
         self._connect_dll(devNo,
                           ctypes.byref(device))
-        print('ANC350 found at', device.value)
+        _report(self.verbose, 'ANC350 found at {}', device.value)
         return device
 
     def disconnect(self):
         '''
         Closes the connection to the device. The device handle becomes invalid.
+        Commands pending in the command queue are executed first.
         '''
-        print('Disconnecting ANC350 from', self.device.value)
+        if self._commands is not None:
+            self._commands.close()
+            self._commands = None
+        _report(self.verbose, 'Disconnecting ANC350 from {}',
+                self.device.value)
         self._disconnect_dll(self.device)
+        if self.worker is not None:
+            self.enableThreadSafety(False)
 
     def getActuatorName(self, axisNo):
         '''
@@ -454,10 +998,14 @@ class Positioner_ANC350:
         name : str
             Name of the actuator
         '''
+        cached = self._cacheGet(('actuatorName', axisNo))
+        if cached is not None:
+            return cached
         name = ctypes.create_string_buffer(32)
         self._getActuatorName_dll(self.device,
                                   ctypes.c_uint(axisNo),
                                   ctypes.byref(name))
+        self._cachePut(('actuatorName', axisNo), name.value.decode('utf-8'))
         return name.value.decode('utf-8')
 
     def getActuatorType(self, axisNo):
@@ -474,10 +1022,14 @@ class Positioner_ANC350:
         type_ : int
             Type of the actuator {0: linear, 1: goniometer, 2: rotator}
         '''
+        cached = self._cacheGet(('actuatorType', axisNo))
+        if cached is not None:
+            return cached
         type_ = ctypes.c_int()
         self._getActuatorType_dll(self.device,
                                   ctypes.c_uint(axisNo),
                                   ctypes.byref(type_))
+        self._cachePut(('actuatorType', axisNo), type_.value)
         return type_.value
 
     def getAmplitude(self, axisNo):
@@ -493,10 +1045,14 @@ class Positioner_ANC350:
         amplitude : float
             Amplitude in V
         '''
+        cached = self._cacheGet(('amplitude', axisNo))
+        if cached is not None:
+            return cached
         amplitude = ctypes.c_double()
         self._getAmplitude_dll(self.device,
                                ctypes.c_uint(axisNo),
                                ctypes.byref(amplitude))
+        self._cachePut(('amplitude', axisNo), amplitude.value)
         return amplitude.value
 
     def getAxisStatus(self, axisNo):
@@ -510,6 +1066,8 @@ class Positioner_ANC350:
 
         Returns
         -------
+        status : AxisStatus
+            Named tuple with the fields
         connected : int
             If the axis is connected to a sensor
         enabled : int
@@ -518,9 +1076,9 @@ class Positioner_ANC350:
             If the axis is moving
         target : int
             If the target is reached in automatic positioning
-        eotFwd : int
+        eot_fwd : int
             If end of travel detected in forward direction
-        eotBwd : int
+        eot_bwd : int
             If end of travel detected in backward direction
         error : int
             If the axis' sensor is in error state
@@ -543,26 +1101,37 @@ class Positioner_ANC350:
                                 ctypes.byref(eotBwd),
                                 ctypes.byref(error))
 
-        print('Status of device # {:}, axis {:}\n'
-              '----------------------------\n'
-              'Connected          {:}\n'
-              'Enabled            {:}\n'
-              'Moving             {:}\n'
-              'Target             {:}\n'
-              'End of travel (fw) {:}\n'
-              'End of travel (bw) {:}\n'
-              'Error state        {:}'.format(self.devNo,
-                                              axisNo,
-                                              connected.value,
-                                              enabled.value,
-                                              moving.value,
-                                              target.value,
-                                              eotFwd.value,
-                                              eotBwd.value,
-                                              error.value))
-
-        return connected.value, enabled.value, moving.value, \
-               target.value, eotFwd.value, eotBwd.value, error.value
+        status = AxisStatus(connected.value, enabled.value, moving.value,
+                            target.value, eotFwd.value, eotBwd.value,
+                            error.value)
+        _report(self.verbose,
+                'Status of device # {:}, axis {:}\n'
+                '----------------------------\n'
+                'Connected          {:}\n'
+                'Enabled            {:}\n'
+                'Moving             {:}\n'
+                'Target             {:}\n'
+                'End of travel (fw) {:}\n'
+                'End of travel (bw) {:}\n'
+                'Error state        {:}', self.devNo, axisNo, *status)
+
+        return status
+
+    def getAxisFlags(self, axisNo):
+        '''
+        Reads the status of an axis packed into flags, see getAxisStatus.
+
+        Parameters
+        ----------
+        axisNo : int
+            Axis number (0 ... 2)
+
+        Returns
+        -------
+        flags : AxisFlag
+            Set bits for the true fields of AxisStatus
+        '''
+        return AxisFlag(self.defaultPoller().getStatusBits(axisNo))
 
     def getDcVoltage(self, axisNo):
         '''
@@ -592,36 +1161,49 @@ class Positioner_ANC350:
 
         Returns
         -------
-        featureSync : int
+        config : DeviceConfig
+            Named tuple with the fields
+        sync : int
             'Sync': Ethernet enabled (1) or disabled (0)
-        featureLockin : int
+        lockin : int
             'Lockin': Low power loss measurement enabled (1) or disabled (0)
-        featureDuty : int
+        duty : int
             'Duty': Duty cycle enabled (1) or disabled (0)
-        featureApp : int
+        app : int
             'App': Control by IOS app enabled (1) or disabled (0)
         '''
-        features = ctypes.c_uint()
-        self._getDeviceConfig_dll(self.device,
-                                  ctypes.byref(features))
+        features = self.getDeviceFeatures()
+        featureSync = int(DeviceFeature.SYNC in features)
+        featureLockin = int(DeviceFeature.LOCKIN in features)
+        featureDuty = int(DeviceFeature.DUTY in features)
+        featureApp = int(DeviceFeature.APP in features)
+
+        _report(self.verbose,
+                'Configuration of device # {}\n'
+                '---------------------------\n'
+                'Sync   {:}\n'
+                'Lockin {:}\n'
+                'Duty   {:}\n'
+                'App    {:}\n', self.devNo,
+                featureSync, featureLockin, featureDuty, featureApp)
 
-        featureSync = 0x01 & features.value
-        featureLockin = int((0x02 & features.value) / 2)
-        featureDuty = int((0x04 & features.value) / 4)
-        featureApp = int((0x08 & features.value) / 8)
+        return DeviceConfig(featureSync, featureLockin, featureDuty,
+                            featureApp)
 
-        print('Configuration of device # {}\n'
-              '---------------------------\n'
-              'Sync   {:}\n'
-              'Lockin {:}\n'
-              'Duty   {:}\n'
-              'App    {:}\n'.format(self.devNo,
-                                    featureSync,
-                                    featureLockin,
-                                    featureDuty,
-                                    featureApp))
+    def getDeviceFeatures(self):
+        '''
+        Reads the feature bits of the static device configuration, see
+        getDeviceConfig.
 
-        return featureSync, featureLockin, featureDuty, featureApp
+        Returns
+        -------
+        features : DeviceFeature
+            Enabled features, e.g. DeviceFeature.SYNC | DeviceFeature.APP
+        '''
+        features = ctypes.c_uint()
+        self._getDeviceConfig_dll(self.device,
+                                  ctypes.byref(features))
+        return DeviceFeature(features.value)
 
     def getDeviceInfo(self):
         '''
@@ -632,12 +1214,14 @@ class Positioner_ANC350:
 
         Returns
         -------
-        devType : int
+        info : DeviceInfo
+            Named tuple with the fields
+        dev_type : int
             Type of the ANC350 device:
             {0: Anc350Res, 1: Anc350Num, 2: Anc350Fps, 3: Anc350None}
         id : int
             Hardware ID of the device
-        serialNo : str
+        serial_no : str
             The device's serial number.
         address : str
             The device's interface address if applicable. Returns the
@@ -646,37 +1230,17 @@ class Positioner_ANC350:
         connected : int
             If the device is already connected
         '''
-        devType = ctypes.c_int()
-        id_ = ctypes.c_int()
-        serialNo = ctypes.create_string_buffer(32)
-        address = ctypes.create_string_buffer(32)
-        connected = ctypes.c_int()
+        info = _readDeviceInfo(self._getDeviceInfo_dll, self.devNo)
+        _report(self.verbose,
+                'Info of device # {:}\n'
+                '------------------\n'
+                'Type        {:}\n'
+                'Hardware ID {:}\n'
+                'Serial No   {:}\n'
+                'Address     {:}\n'
+                'Connected   {:}', self.devNo, *info)
 
-        self._getDeviceInfo_dll(ctypes.c_uint(self.devNo),
-                                ctypes.byref(devType),
-                                ctypes.byref(id_),
-                                ctypes.byref(serialNo),
-                                ctypes.byref(address),
-                                ctypes.byref(connected))
-
-        print('Info of device # {:}\n'
-              '------------------\n'
-              'Type        {:}\n'
-              'Hardware ID {:}\n'
-              'Serial No   {:}\n'
-              'Address     {:}\n'
-              'Connected   {:}'.format(self.devNo,
-                                       devType.value,
-                                       id_.value,
-                                       serialNo.value.decode('utf-8'),
-                                       address.value.decode('utf-8'),
-                                       connected.value))
-
-        return devType.value, \
-               id_.value, \
-               serialNo.value.decode('utf-8'), \
-               address.value.decode('utf-8'), \
-               connected.value
+        return info
 
     def getFirmwareVersion(self):
         '''
@@ -706,10 +1270,14 @@ class Positioner_ANC350:
         frequency : float
             Frequency in Hz
         '''
+        cached = self._cacheGet(('frequency', axisNo))
+        if cached is not None:
+            return cached
         frequency = ctypes.c_double()
         self._getFrequency_dll(self.device,
                                ctypes.c_uint(axisNo),
                                ctypes.byref(frequency))
+        self._cachePut(('frequency', axisNo), frequency.value)
         return frequency.value
 
     def getLutName(self, axisNo):
@@ -754,21 +1322,88 @@ class Positioner_ANC350:
                               ctypes.byref(position))
         return position.value
 
-    def loadLutFile(self, axisNo, fileName):
+    def getPositions(self, axes=None, out=None):
+        '''
+        Retrieves the current positions of several axes into a NumPy array,
+        see ANC350.arrays.read_positions.
+
+        Parameters
+        ----------
+        axes : sequence of int
+            Axis numbers to be read. Default: None, i.e. all axes
+        out : numpy.ndarray
+            float64 array of shape (len(axes),) to be filled in place.
+            Default: None
+
+        Returns
+        -------
+        positions : numpy.ndarray
+            Current positions m or deg
+        '''
+        from .arrays import read_positions
+        return read_positions(self, axes, out)
+
+    def getStatusSnapshot(self, out=None):
+        '''
+        Reads the status of all axes into a NumPy structured array, see
+        ANC350.arrays.read_status.
+
+        Parameters
+        ----------
+        out : numpy.ndarray
+            Array of dtype ANC350.arrays.STATUS_DTYPE and shape (3,) to be
+            filled in place. Default: None
+
+        Returns
+        -------
+        status : numpy.ndarray
+            One record per axis with the fields of AxisStatus
+        '''
+        from .arrays import read_status
+        return read_status(self, None, out)
+
+    def loadLutFile(self, axisNo, fileName, force=False):
         '''
         Loads a sensor lookup table from a file into the device.
         The function is only available for ANC350Res devices.
 
+        The upload is skipped if the same file content was loaded into the
+        axis by this instance before and getLutName confirms that the LUT
+        is still active. Files are identified by
+        ANC350.lut.read_lut_header, which does not need NumPy.
+
         Parameters
         ----------
         axisNo : int
             Axis number (0 ... 2)
         fileName : str
             Name of the LUT file to import, optionally with path
+        force : bool
+            Upload the LUT in any case. Default: False
+
+        Returns
+        -------
+        loaded : bool
+            If the LUT has been uploaded
         '''
+        from .lut import read_lut_header
+        try:
+            lut = read_lut_header(fileName)
+        except (OSError, ValueError):
+            # Let the library report the file error
+            lut = None
+        if not force and lut is not None and \
+                self._luts.get(axisNo) == lut.digest and \
+                hasattr(self, '_getLutName_dll') and \
+                self.getLutName(axisNo) == lut.serial:
+            return False
+        self._luts.pop(axisNo, None)
         self._loadLutFile_dll(self.device,
                               ctypes.c_uint(axisNo),
                               ctypes.c_char_p(fileName.encode('utf-8')))
+        if lut is not None:
+            self._luts[axisNo] = lut.digest
+        return True
 
     def measureCapacitance(self, axisNo):
         '''
@@ -793,6 +1428,190 @@ class Positioner_ANC350:
                                      ctypes.byref(cap))
         return cap.value
 
+    def move_many(self, targets, tolerance=None, timeout=None,
+                  min_interval=1e-3, max_interval=0.1):
+        '''
+        Moves several axes to their targets in automatic mode at the same
+        time and blocks until all of them have finished.
+
+        The status is polled adaptively: from the velocity observed between
+        two polls the remaining travel time is estimated, and the next poll
+        is scheduled after half of it, limited to min_interval and
+        max_interval. Far from the target the polling backs off, close to it
+        the target flag is picked up quickly. The interval of an axis that
+        does not move doubles with every poll up to max_interval. The
+        polls go through defaultPoller. An axis reaching an end of
+        travel, reporting a sensor error or exceeding the timeout is
+        aborted by switching off automatic motion.
+
+        Parameters
+        ----------
+        targets : dict
+            Axis number -> target position m or deg
+        tolerance : float
+            Target range m or deg, see setTargetRange. Default: None, i.e.
+            the range set in the device
+        timeout : float
+            Maximum time in s. Default: None, i.e. no limit
+        min_interval : float
+            Shortest time between two polls in s. Default: 1e-3
+        max_interval : float
+            Longest time between two polls in s. Default: 0.1
+
+        Returns
+        -------
+        results : dict
+            Axis number -> MoveResult
+        '''
+        poller = self.defaultPoller()
+        if not set(targets) <= set(poller.axes):
+            poller = self.poller(tuple(targets))
+        start = time.monotonic()
+        for axisNo, target in targets.items():
+            if tolerance is not None:
+                self.setTargetRange(axisNo, tolerance)
+            self.setTargetPosition(axisNo, target)
+            self.startAutoMove(axisNo, 1, 0)
+
+        # Axis number -> [position, time, velocity, interval while not
+        # moving] of the last poll
+        pending = {axisNo: [None, start, 0.0, min_interval]
+                   for axisNo in targets}
+        results = {}
+        polls = 0
+        while pending:
+            polls += 1
+            interval = max_interval
+            for axisNo, last in list(pending.items()):
+                status = poller.getAxisStatus(axisNo)
+                position = poller.getPosition(axisNo)
+                now = time.monotonic()
+                reason = None
+                if status.target:
+                    reason = 'target'
+                elif status.eot_fwd:
+                    reason = 'eot_fwd'
+                elif status.eot_bwd:
+                    reason = 'eot_bwd'
+                elif status.error:
+                    reason = 'error'
+                elif timeout is not None and now - start >= timeout:
+                    reason = 'timeout'
+                if reason is not None:
+                    if reason != 'target':
+                        self.startAutoMove(axisNo, 0, 0)
+                    results[axisNo] = MoveResult(
+                        axisNo, targets[axisNo], position,
+                        reason == 'target', reason, now - start, polls)
+                    del pending[axisNo]
+                    continue
+
+                if last[0] is None:
+                    # No velocity yet
+                    interval = min_interval
+                elif now > last[1]:
+                    last[2] = abs(position - last[0]) / (now - last[1])
+                    if last[2] > 0:
+                        last[3] = min_interval
+                    else:
+                        last[3] = min(2 * last[3], max_interval)
+                last[0], last[1] = position, now
+                distance = abs(targets[axisNo] - position)
+                if last[2] > 0:
+                    interval = min(interval, 0.5 * distance / last[2])
+                else:
+                    interval = min(interval, last[3])
+            if pending:
+                interval = max(interval, min_interval)
+                if timeout is not None:
+                    interval = min(interval, max(
+                        start + timeout - time.monotonic(), 0.0))
+                time.sleep(interval)
+        return results
+
+    def move_to(self, axisNo, target, tolerance=None, timeout=None,
+                min_interval=1e-3, max_interval=0.1):
+        '''
+        Moves an axis to a target position in automatic mode and blocks
+        until the target is reached, the move is aborted or the timeout
+        expires. See move_many for the adaptive polling.
+
+        Parameters
+        ----------
+        axisNo : int
+            Axis number (0 ... 2)
+        target : float
+            Target position m or deg
+        tolerance : float
+            Target range m or deg, see setTargetRange. Default: None, i.e.
+            the range set in the device
+        timeout : float
+            Maximum time in s. Default: None, i.e. no limit
+        min_interval : float
+            Shortest time between two polls in s. Default: 1e-3
+        max_interval : float
+            Longest time between two polls in s. Default: 0.1
+
+        Returns
+        -------
+        result : MoveResult
+            Final position, reason and timing of the move
+        '''
+        return self.move_many({axisNo: target}, tolerance, timeout,
+                              min_interval, max_interval)[axisNo]
+
+    def poller(self, axes=(0, 1, 2)):
+        '''
+        Creates a poller with preallocated output buffers for reading
+        positions and axis status at high rates, see AxisPoller.
+
+        Parameters
+        ----------
+        axes : tuple of int
+            Axis numbers to be polled. Default: (0, 1, 2)
+
+        Returns
+        -------
+        poller : AxisPoller
+            Poller bound to this device
+        '''
+        return AxisPoller(self, axes)
+
+    def commandQueue(self, maxsize=None):
+        '''
+        Returns the asynchronous command queue of this instance, created on
+        the first call, see ANC350.commands.
+
+        Parameters
+        ----------
+        maxsize : int
+            Maximum number of pending commands of a new queue.
+            Default: None, i.e. no limit
+
+        Returns
+        -------
+        commands : ANC350.commands.CommandQueue
+            Command queue of the device
+        '''
+        if self._commands is None:
+            from .commands import CommandQueue
+            self._commands = CommandQueue(self, maxsize)
+        return self._commands
+
+    def defaultPoller(self):
+        '''
+        Returns the poller of all axes shared by the batched reads
+        getPositions and getStatusSnapshot. It is created on first use.
+
+        Returns
+        -------
+        poller : AxisPoller
+            Poller bound to this device
+        '''
+        if self._poller is None:
+            self._poller = AxisPoller(self)
+        return self._poller
+
     def saveParams(self):
         '''
         Saves parameters to persistent flash memory in the device. They will be
@@ -832,9 +1651,14 @@ class Positioner_ANC350:
             17: ANR(v)200/240
             18: ANR(v)220
         '''
+        if self._cacheSkip(('actuator', axisNo), actuator):
+            return
         self._selectActuator_dll(self.device,
                                  ctypes.c_uint(axisNo),
                                  ctypes.c_uint(actuator))
+        self._cachePut(('actuator', axisNo), actuator)
+        self._cacheDrop(('actuatorName', axisNo))
+        self._cacheDrop(('actuatorType', axisNo))
 
     def setAmplitude(self, axisNo, amplitude):
         '''
@@ -847,9 +1671,12 @@ class Positioner_ANC350:
         amplitude : float
             Amplitude in V, internal resolution is 1 mV
         '''
+        if self._cacheSkip(('amplitude', axisNo), amplitude):
+            return
         self._setAmplitude_dll(self.device,
                                ctypes.c_uint(axisNo),
                                ctypes.c_double(amplitude))
+        self._cachePut(('amplitude', axisNo), amplitude)
 
     def setAxisOutput(self, axisNo, enable, autoDisable):
         '''
@@ -898,9 +1725,12 @@ class Positioner_ANC350:
         frequency : float
             Frequency in Hz, internal resolution is 1 Hz
         '''
+        if self._cacheSkip(('frequency', axisNo), frequency):
+            return
         self._setFrequency_dll(self.device,
                                ctypes.c_uint(axisNo),
                                ctypes.c_double(frequency))
+        self._cachePut(('frequency', axisNo), frequency)
 
     def setTargetGround(self, axisNo, targetGnd):
         '''
@@ -949,9 +1779,12 @@ class Positioner_ANC350:
         targetRg : float
             Target range m or deg. Internal resulution is 1 nm or 1 µdeg.
         '''
+        if self._cacheSkip(('targetRange', axisNo), targetRg):
+            return
         self._setTargetRange_dll(self.device,
                                  ctypes.c_uint(axisNo),
                                  ctypes.c_double(targetRg))
+        self._cachePut(('targetRange', axisNo), targetRg)
 
     def startAutoMove(self, axisNo, enable, relative):
         '''
@@ -1006,6 +1839,108 @@ class Positioner_ANC350:
                                   ctypes.c_uint(axisNo),
                                   ctypes.c_int(backward))
 
+class AxisPoller:
+    '''
+    Fast path for polling getPosition and getAxisStatus of a positioner.
+
+    The output parameters and the argument tuples (including the byref
+    pointers) are allocated once per axis, so a call does not create any
+    ctypes objects. A poller is not thread-safe; create one per thread with
+    Positioner_ANC350.poller. The attribute axes holds the polled axis
+    numbers.
+    '''
+    __slots__ = ('axes', '_getPosition_dll', '_getAxisStatus_dll',
+                 '_position', '_status')
+
+    def __init__(self, positioner, axes=(0, 1, 2)):
+        '''
+        Parameters
+        ----------
+        positioner : Positioner_ANC350
+            Connected positioner
+        axes : tuple of int
+            Axis numbers to be polled. Default: (0, 1, 2)
+        '''
+        self.axes = tuple(axes)
+        self._getPosition_dll = positioner._getPosition_dll
+        self._getAxisStatus_dll = positioner._getAxisStatus_dll
+        self._position = {}
+        self._status = {}
+        for axisNo in axes:
+            axis = ctypes.c_uint(axisNo)
+            position = ctypes.c_double()
+            self._position[axisNo] = (position,
+                                      (positioner.device, axis,
+                                       ctypes.byref(position)))
+            flags = tuple(ctypes.c_int() for _ in range(7))
+            self._status[axisNo] = (flags,
+                                    (positioner.device, axis) +
+                                    tuple(ctypes.byref(f) for f in flags))
+
+    def getPosition(self, axisNo):
+        '''
+        Retrieves the current actuator position, see
+        Positioner_ANC350.getPosition.
+
+        Parameters
+        ----------
+        axisNo : int
+            Axis number, one of the polled axes
+
+        Returns
+        -------
+        position : float
+            Current position m or deg
+        '''
+        position, args = self._position[axisNo]
+        self._getPosition_dll(*args)
+        return position.value
+
+    def getAxisStatus(self, axisNo):
+        '''
+        Reads status information about an axis, see
+        Positioner_ANC350.getAxisStatus.
+
+        Parameters
+        ----------
+        axisNo : int
+            Axis number, one of the polled axes
+
+        Returns
+        -------
+        status : AxisStatus
+            connected, enabled, moving, target, eot_fwd, eot_bwd, error
+        '''
+        flags, args = self._status[axisNo]
+        self._getAxisStatus_dll(*args)
+        connected, enabled, moving, target, eotFwd, eotBwd, error = flags
+        return AxisStatus(connected.value, enabled.value, moving.value,
+                          target.value, eotFwd.value, eotBwd.value,
+                          error.value)
+
+    def getStatusBits(self, axisNo):
+        '''
+        Reads the status of an axis packed into an int with the bits of
+        AxisFlag, without creating a tuple.
+
+        Parameters
+        ----------
+        axisNo : int
+            Axis number, one of the polled axes
+
+        Returns
+        -------
+        bits : int
+            Status bits, see AxisFlag
+        '''
+        flags, args = self._status[axisNo]
+        self._getAxisStatus_dll(*args)
+        bits = 0
+        for bit, flag in zip(_AXIS_BITS, flags):
+            if flag.value:
+                bits |= bit
+        return bits
+
 if __name__ == '__main__':
 
     ANC350_devcount = discover_ANC350()
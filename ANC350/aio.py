@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+'''
+asyncio interface to Positioner_ANC350.
+
+Every AsyncPositioner owns a single-thread executor on which all dll calls
+of its device run, so calls to one device keep their order while the event
+loop and the other devices are not blocked. ctypes releases the GIL during
+the foreign calls, so several devices run truly in parallel.
+'''
+
+import asyncio
+import concurrent.futures
+import functools
+
+from .PylibANC350 import Positioner_ANC350
+
+
+class AsyncPositioner:
+    '''
+    Awaitable wrapper of a Positioner_ANC350.
+
+    Any public method of the positioner can be awaited under the same name,
+    e.g. await positioner.getPosition(0) or
+    await positioner.measureCapacitance(1).
+    '''
+    def __init__(self, positioner, executor=None):
+        '''
+        Parameters
+        ----------
+        positioner : Positioner_ANC350
+            Connected positioner
+        executor : concurrent.futures.Executor
+            Executor for the dll calls, which must run them one at a time.
+            Default: None, i.e. a new single-thread executor
+        '''
+        self.positioner = positioner
+        if executor is None:
+            executor = concurrent.futures.ThreadPoolExecutor(
+                1, thread_name_prefix='ANC350-{}'.format(positioner.devNo))
+        self._executor = executor
+
+    @classmethod
+    async def connect(cls, devNo=0, backend=None, verbose=False):
+        '''
+        Connects a device without blocking the event loop.
+
+        Parameters
+        ----------
+        devNo : int
+            Device number to be initialised. Default: 0
+        backend : str or object
+            Library backend, see load_ANC350dll. Default: None
+        verbose : bool
+            See Positioner_ANC350. Default: False
+
+        Returns
+        -------
+        positioner : AsyncPositioner
+            Wrapper of the connected device
+        '''
+        executor = concurrent.futures.ThreadPoolExecutor(
+            1, thread_name_prefix='ANC350-{}'.format(devNo))
+        loop = asyncio.get_running_loop()
+        try:
+            positioner = await loop.run_in_executor(
+                executor, functools.partial(Positioner_ANC350, devNo,
+                                            backend=backend,
+                                            verbose=verbose))
+        except BaseException:
+            executor.shutdown(wait=False)
+            raise
+        return cls(positioner, executor)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        '''
+        Disconnects the device and shuts down the executor.
+        '''
+        try:
+            await self.call(self.positioner.disconnect)
+        finally:
+            self._executor.shutdown(wait=False)
+
+    def call(self, func, *args, **kwargs):
+        '''
+        Runs func(*args, **kwargs) on the executor of the device.
+
+        Returns
+        -------
+        future : asyncio.Future
+            Result of the call
+        '''
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self._executor,
+                                    functools.partial(func, *args, **kwargs))
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        method = getattr(self.positioner, name)
+        if not callable(method):
+            return method
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            return self.call(method, *args, **kwargs)
+        return wrapper
+
+    async def wait_target(self, axisNo, timeout=None, interval=0.01):
+        '''
+        Waits until the axis reports that the target is reached, or that
+        it stopped at the end of travel or with a sensor error.
+
+        Parameters
+        ----------
+        axisNo : int
+            Axis number (0 ... 2)
+        timeout : float
+            Maximum waiting time in s. Default: None, i.e. no limit
+        interval : float
+            Time between two status reads in s. Default: 0.01
+
+        Returns
+        -------
+        status : AxisStatus
+            Last status read; check target, eot_fwd, eot_bwd and error
+
+        Raises
+        ------
+        asyncio.TimeoutError
+            If the timeout expires first
+        '''
+        return await asyncio.wait_for(self._wait(axisNo, interval), timeout)
+
+    def _getAxisStatus(self, axisNo):
+        # Looked up on every call, so the poller follows metrics, tracing
+        # and thread safety enabled on the positioner later
+        return self.positioner.defaultPoller().getAxisStatus(axisNo)
+
+    async def _wait(self, axisNo, interval):
+        while True:
+            status = await self.call(self._getAxisStatus, axisNo)
+            if status.target or status.eot_fwd or status.eot_bwd or \
+                    status.error:
+                return status
+            await asyncio.sleep(interval)
+
+    async def move_to(self, axisNo, target, tolerance=None, timeout=None,
+                      interval=0.01):
+        '''
+        Moves an axis to a target position in automatic mode and waits for
+        the result, see wait_target. On timeout or cancellation automatic
+        motion is switched off again.
+
+        Parameters
+        ----------
+        axisNo : int
+            Axis number (0 ... 2)
+        target : float
+            Target position m or deg
+        tolerance : float
+            Target range m or deg, see setTargetRange. Default: None, i.e.
+            the range set in the device
+        timeout : float
+            Maximum waiting time in s. Default: None, i.e. no limit
+        interval : float
+            Time between two status reads in s. Default: 0.01
+
+        Returns
+        -------
+        status : AxisStatus
+            Last status read; check target, eot_fwd, eot_bwd and error
+        '''
+        positioner = self.positioner
+        if tolerance is not None:
+            await self.call(positioner.setTargetRange, axisNo, tolerance)
+        await self.call(positioner.setTargetPosition, axisNo, target)
+        await self.call(positioner.startAutoMove, axisNo, 1, 0)
+        try:
+            return await self.wait_target(axisNo, timeout, interval)
+        except BaseException:
+            await asyncio.shield(
+                self.call(positioner.startAutoMove, axisNo, 0, 0))
+            raise
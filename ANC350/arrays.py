@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+'''
+Batched reads of positions and axis status into NumPy arrays.
+
+The readers work on one Positioner_ANC350 or on a sequence of them and use
+the preallocated AxisPoller of each positioner, so a snapshot of all axes
+fills one array instead of creating a Python object per value.
+
+Status histories are best stored packed, one uint8 of AxisFlag bits per
+axis and sample. pack_status, unpack_status and select_status convert and
+filter them vectorized, e.g. all samples that are moving and not on
+target:
+
+    select_status(bits, AxisFlag.MOVING, AxisFlag.TARGET)
+'''
+
+import numpy as np
+
+from .PylibANC350 import AxisStatus, Positioner_ANC350
+
+AXES = (0, 1, 2)
+
+# One record per axis, the fields of AxisStatus as booleans
+STATUS_DTYPE = np.dtype([(name, np.bool_) for name in AxisStatus._fields])
+# Packed status, the bits of AxisFlag
+STATUS_BITS_DTYPE = np.dtype(np.uint8)
+
+
+def _pollers(positioners, axes):
+    # The default poller covers AXES; other axis numbers get a poller of
+    # their own, so the device reports them, e.g. with ANCNoAxis
+    if set(axes) <= set(AXES):
+        poller = Positioner_ANC350.defaultPoller
+    else:
+        def poller(positioner):
+            return positioner.poller(axes)
+    if isinstance(positioners, Positioner_ANC350):
+        return False, (poller(positioners),)
+    return True, [poller(positioner) for positioner in positioners]
+
+
+def _output(out, shape, dtype):
+    dtype = np.dtype(dtype)
+    if out is None:
+        return np.empty(shape, dtype)
+    if out.shape != shape or out.dtype != dtype:
+        raise ValueError('out must have shape {} and dtype {}'.format(
+            shape, dtype))
+    return out
+
+
+def read_positions(positioners, axes=None, out=None):
+    '''
+    Reads the current positions of several axes.
+
+    Parameters
+    ----------
+    positioners : Positioner_ANC350 or sequence of Positioner_ANC350
+        Device(s) to be read
+    axes : sequence of int
+        Axis numbers to be read. Default: None, i.e. all axes (0, 1, 2)
+    out : numpy.ndarray
+        float64 array to be filled in place, of shape (len(axes),) for a
+        single positioner or (len(positioners), len(axes)) for a sequence.
+        Default: None, i.e. a new array is returned
+
+    Returns
+    -------
+    positions : numpy.ndarray
+        Positions in m or deg, shaped like out
+    '''
+    axes = AXES if axes is None else tuple(axes)
+    multi, pollers = _pollers(positioners, axes)
+    shape = (len(pollers), len(axes)) if multi else (len(axes),)
+    out = _output(out, shape, np.float64)
+    rows = out if multi else (out,)
+    for row, poller in zip(rows, pollers):
+        getPosition = poller.getPosition
+        for col, axisNo in enumerate(axes):
+            row[col] = getPosition(axisNo)
+    return out
+
+
+def read_status(positioners, axes=None, out=None):
+    '''
+    Reads the status flags of several axes into a structured array with
+    dtype STATUS_DTYPE (fields connected, enabled, moving, target, eot_fwd,
+    eot_bwd, error).
+
+    Parameters
+    ----------
+    positioners : Positioner_ANC350 or sequence of Positioner_ANC350
+        Device(s) to be read
+    axes : sequence of int
+        Axis numbers to be read. Default: None, i.e. all axes (0, 1, 2)
+    out : numpy.ndarray
+        STATUS_DTYPE array to be filled in place, of shape (len(axes),) for
+        a single positioner or (len(positioners), len(axes)) for a
+        sequence. Default: None, i.e. a new array is returned
+
+    Returns
+    -------
+    status : numpy.ndarray
+        Status records, shaped like out
+    '''
+    axes = AXES if axes is None else tuple(axes)
+    multi, pollers = _pollers(positioners, axes)
+    shape = (len(pollers), len(axes)) if multi else (len(axes),)
+    out = _output(out, shape, STATUS_DTYPE)
+    rows = out if multi else (out,)
+    for row, poller in zip(rows, pollers):
+        getAxisStatus = poller.getAxisStatus
+        for col, axisNo in enumerate(axes):
+            row[col] = getAxisStatus(axisNo)
+    return out
+
+
+def read_status_bits(positioners, axes=None, out=None):
+    '''
+    Reads the status of several axes packed into AxisFlag bits.
+
+    Parameters
+    ----------
+    positioners : Positioner_ANC350 or sequence of Positioner_ANC350
+        Device(s) to be read
+    axes : sequence of int
+        Axis numbers to be read. Default: None, i.e. all axes (0, 1, 2)
+    out : numpy.ndarray
+        uint8 array to be filled in place, of shape (len(axes),) for a
+        single positioner or (len(positioners), len(axes)) for a sequence.
+        Default: None, i.e. a new array is returned
+
+    Returns
+    -------
+    bits : numpy.ndarray
+        Status bits, shaped like out
+    '''
+    axes = AXES if axes is None else tuple(axes)
+    multi, pollers = _pollers(positioners, axes)
+    shape = (len(pollers), len(axes)) if multi else (len(axes),)
+    out = _output(out, shape, STATUS_BITS_DTYPE)
+    rows = out if multi else (out,)
+    for row, poller in zip(rows, pollers):
+        getStatusBits = poller.getStatusBits
+        for col, axisNo in enumerate(axes):
+            row[col] = getStatusBits(axisNo)
+    return out
+
+
+def pack_status(status):
+    '''
+    Packs status records into AxisFlag bits.
+
+    Parameters
+    ----------
+    status : numpy.ndarray
+        STATUS_DTYPE records of any shape
+
+    Returns
+    -------
+    bits : numpy.ndarray
+        uint8 array of the same shape
+    '''
+    bits = np.zeros(status.shape, STATUS_BITS_DTYPE)
+    for shift, name in enumerate(STATUS_DTYPE.names):
+        bits |= status[name].astype(np.uint8) << shift
+    return bits
+
+
+def unpack_status(bits):
+    '''
+    Unpacks AxisFlag bits into status records.
+
+    Parameters
+    ----------
+    bits : array_like
+        Integer status bits of any shape
+
+    Returns
+    -------
+    status : numpy.ndarray
+        STATUS_DTYPE records of the same shape
+    '''
+    bits = np.asarray(bits)
+    status = np.empty(bits.shape, STATUS_DTYPE)
+    for shift, name in enumerate(STATUS_DTYPE.names):
+        status[name] = (bits >> shift) & 1
+    return status
+
+
+def select_status(bits, on=0, off=0):
+    '''
+    Selects the samples of a status history with all flags of on set and
+    all flags of off cleared.
+
+    Parameters
+    ----------
+    bits : array_like
+        Integer status bits of any shape
+    on : AxisFlag or int
+        Flags that must be set. Default: 0
+    off : AxisFlag or int
+        Flags that must be cleared. Default: 0
+
+    Returns
+    -------
+    mask : numpy.ndarray
+        Boolean array of the same shape
+    '''
+    bits = np.asarray(bits)
+    return (bits & (int(on) | int(off))) == int(on)
@@ -0,0 +1,491 @@
+# -*- coding: utf-8 -*-
+'''
+Shared-memory broadcast of the latest positions and status of a device.
+
+A PositionBroadcast polls a Positioner_ANC350 on a background thread and
+publishes every update into a multiprocessing.shared_memory block. Any
+number of BroadcastReader instances, in any process on the host, map the
+block as NumPy arrays and read the latest values without any call to the
+device, so readers add no load on the controller.
+
+Layout
+------
+The block holds one structured array of layout(naxes): a header (MAGIC,
+FORMAT_VERSION, the number and the numbers of the axes, the number of
+updates published and a running flag) followed by two slots, each with a
+sequence number, time_ns (time.monotonic_ns() of the update), the position
+and the AxisFlag status bits of every axis.
+
+Update k is written to slot k % 2 as a seqlock: the slot sequence number is
+set to 2k - 1 (odd: being written), the data are written, the sequence
+number is set to 2k and then the header to published = k. A reader takes
+the slot of the latest update and accepts what it read if the sequence
+number was even and is unchanged afterwards. As the writer alternates the
+slots, the latest slot stays untouched for a whole update period, so
+readers practically never retry.
+'''
+
+import collections
+import os
+import threading
+import time
+
+import numpy as np
+
+from .PylibANC350 import AxisFlag
+
+MAGIC = b'ANC350BC'
+FORMAT_VERSION = 1
+
+BroadcastSample = collections.namedtuple(
+    'BroadcastSample', 'count time_ns position status')
+
+
+def layout(naxes):
+    '''
+    Returns the dtype of the shared-memory block for naxes axes.
+    '''
+    slot = np.dtype([('seq', '<u8'), ('time_ns', '<i8'),
+                     ('position', '<f8', (naxes,)),
+                     ('status', 'u1', (naxes,))], align=True)
+    return np.dtype([('magic', 'S8'), ('version', '<u4'),
+                     ('naxes', '<u4'), ('published', '<u8'),
+                     ('running', '<u8'), ('axes', '<i4', (naxes,)),
+                     ('slots', slot, (2,))], align=True)
+
+
+# Names of the blocks created in this process
+_created = set()
+
+
+def _own_tracker():
+    # Whether this process started the resource tracker it uses. Processes
+    # started by multiprocessing use the tracker of their parent: _pid is
+    # None after spawn, and the tracker is no child of a forked process.
+    from multiprocessing import resource_tracker
+    pid = resource_tracker._resource_tracker._pid
+    if pid is None:
+        return False
+    try:
+        os.waitpid(pid, os.WNOHANG)
+    except ChildProcessError:
+        return False
+    return True
+
+
+def _attach(name):
+    # Attaching must not leave the block registered with a resource tracker
+    # of the reader, which would unlink it when the reader exits
+    from multiprocessing import shared_memory
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        # Python < 3.13. The tracker keeps a set of names, so a tracker
+        # shared with the publisher must not be told to forget the block.
+        shm = shared_memory.SharedMemory(name)
+        if os.name == 'posix' and shm.name not in _created and \
+                _own_tracker():
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+class PositionBroadcast:
+    '''
+    Publisher of the positions and status of a Positioner_ANC350 in shared
+    memory, see the module description.
+
+    Example
+    -------
+    with PositionBroadcast(positioner, name='anc350-stage') as broadcast:
+        ...    # readers: BroadcastReader('anc350-stage')
+    '''
+    def __init__(self, positioner, name=None, axes=(0, 1, 2), rate=1000.0,
+                 status=True):
+        '''
+        Parameters
+        ----------
+        positioner : Positioner_ANC350
+            Connected positioner
+        name : str
+            Name of the shared-memory block. Default: None, i.e. a unique
+            name, see the attribute name
+        axes : tuple of int
+            Axis numbers to be published. Default: (0, 1, 2)
+        rate : float
+            Update rate in Hz. Default: 1000.0
+        status : bool
+            Read the axis status at every update (True) or publish the
+            positions only (False). Default: True
+        '''
+        from multiprocessing import shared_memory
+        self.positioner = positioner
+        self.axes = tuple(axes)
+        self.rate = rate
+        self.status = status
+        self.dtype = layout(len(self.axes))
+        self._shm = shared_memory.SharedMemory(name, create=True,
+                                               size=self.dtype.itemsize)
+        self.name = self._shm.name
+        _created.add(self.name)
+        data = np.ndarray((), self.dtype, buffer=self._shm.buf)
+        data[()] = np.zeros((), self.dtype)
+        data['magic'] = MAGIC
+        data['version'] = FORMAT_VERSION
+        data['naxes'] = len(self.axes)
+        data['axes'] = self.axes
+        self._data = data
+        self._poller = positioner.poller(self.axes)
+        self.count = 0
+        self.missed = 0
+        self.error = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start(self):
+        '''
+        Starts the publisher thread.
+        '''
+        if self._thread is not None and self._thread.is_alive():
+            raise RuntimeError('Broadcast is already running')
+        self._stop.clear()
+        self.error = None
+        self._data['running'] = 1
+        self._thread = threading.Thread(
+            target=self._run, daemon=True,
+            name='ANC350-broadcast-{}'.format(self.positioner.devNo))
+        self._thread.start()
+
+    def stop(self):
+        '''
+        Stops the publisher thread. Readers keep seeing the last update,
+        with BroadcastReader.running False.
+        '''
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._data is not None:
+            self._data['running'] = 0
+
+    def close(self):
+        '''
+        Stops publishing and removes the shared-memory block. Readers that
+        are attached keep their mapping until they close it.
+        '''
+        if self._shm is None:
+            return
+        self.stop()
+        self._data = None
+        self._shm.close()
+        self._shm.unlink()
+        _created.discard(self.name)
+        self._shm = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def publish(self, position, status=None, time_ns=None):
+        '''
+        Publishes one update. Called by the publisher thread; call it
+        directly to publish values from another source while the thread is
+        not running.
+
+        Parameters
+        ----------
+        position : sequence of float
+            Position m or deg of every axis, in the order of axes
+        status : sequence of int
+            AxisFlag bits of every axis. Default: None, i.e. unchanged
+        time_ns : int
+            time.monotonic_ns() of the values. Default: None, i.e. now
+        '''
+        data = self._data
+        k = self.count + 1
+        slot = data['slots'][k % 2, ...]
+        slot['seq'] = 2 * k - 1
+        slot['time_ns'] = time.monotonic_ns() if time_ns is None \
+            else time_ns
+        slot['position'] = position
+        slot['status'] = data['slots'][(k - 1) % 2, ...]['status'] \
+            if status is None else status
+        slot['seq'] = 2 * k
+        data['published'] = k
+        self.count = k
+
+    def _run(self):
+        poller = self._poller
+        getPosition = poller.getPosition
+        getStatusBits = poller.getStatusBits
+        axes = self.axes
+        naxes = len(axes)
+        data = self._data
+        slots = [data['slots'][i, ...] for i in (0, 1)]
+        positions = [slot['position'] for slot in slots]
+        statuses = [slot['status'] for slot in slots]
+        # Without status reads every update publishes the initial status
+        status = [getStatusBits(axisNo) for axisNo in axes]
+        readStatus = self.status
+        period = int(1e9 / self.rate)
+        monotonic_ns = time.monotonic_ns
+        sleep = time.sleep
+        stopped = self._stop.is_set
+        deadline = monotonic_ns()
+        try:
+            while not stopped():
+                k = self.count + 1
+                i = k % 2
+                slot = slots[i]
+                position = positions[i]
+                now = monotonic_ns()
+                values = [getPosition(axisNo) for axisNo in axes]
+                if readStatus:
+                    status = [getStatusBits(axisNo) for axisNo in axes]
+                # Only the writes are inside the seqlock
+                slot['seq'] = 2 * k - 1
+                slot['time_ns'] = now
+                for column in range(naxes):
+                    position[column] = values[column]
+                statuses[i][:] = status
+                slot['seq'] = 2 * k
+                data['published'] = k
+                self.count = k
+
+                deadline += period
+                now = monotonic_ns()
+                if now > deadline:
+                    skipped = (now - deadline) // period + 1
+                    self.missed += skipped
+                    deadline += skipped * period
+                sleep((deadline - now) * 1e-9)
+        except Exception as e:
+            self.error = e
+
+
+class BroadcastReader:
+    '''
+    Reader of a PositionBroadcast, in this or another process. The block is
+    mapped as NumPy arrays: view returns the latest slot without copying
+    anything, read and getPosition return consistent copies of a few
+    values. Nothing is sent to the device.
+
+    Example
+    -------
+    with BroadcastReader('anc350-stage') as reader:
+        x = reader.getPosition(0)
+        sample = reader.read()
+    '''
+    def __init__(self, name):
+        '''
+        Parameters
+        ----------
+        name : str
+            Name of the shared-memory block, PositionBroadcast.name
+        '''
+        self.name = name
+        self._shm = _attach(name)
+        head = np.ndarray((), layout(0), buffer=self._shm.buf)
+        if bytes(head['magic']) != MAGIC:
+            self.close()
+            raise ValueError('{} is not a position broadcast'.format(name))
+        if int(head['version']) != FORMAT_VERSION:
+            version = int(head['version'])
+            self.close()
+            raise ValueError('Unsupported broadcast version {}'.format(
+                version))
+        self.dtype = layout(int(head['naxes']))
+        data = np.ndarray((), self.dtype, buffer=self._shm.buf)
+        self.axes = tuple(int(axisNo) for axisNo in data['axes'])
+        self._column = {axisNo: column
+                        for column, axisNo in enumerate(self.axes)}
+        self._data = data
+        self._published = data['published']
+        self._slots = [data['slots'][i, ...] for i in (0, 1)]
+        self._seqs = [slot['seq'] for slot in self._slots]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        '''
+        Unmaps the block. Views returned before must not be used any more.
+        '''
+        if self._shm is None:
+            return
+        self._data = self._published = None
+        self._slots = self._seqs = None
+        self._shm.close()
+        self._shm = None
+
+    @property
+    def count(self):
+        '''
+        Number of updates published so far.
+        '''
+        return int(self._published)
+
+    @property
+    def running(self):
+        '''
+        Whether the publisher thread is running.
+        '''
+        return bool(self._data['running'])
+
+    def view(self):
+        '''
+        Returns the latest slot as a view into the shared memory, without
+        copying. The values are consistent only if unchanged(seq) is True
+        after they have been used.
+
+        Returns
+        -------
+        slot : numpy.ndarray
+            0-d structured array with the fields seq, time_ns, position and
+            status (AxisFlag bits), one column per axis in the order of axes
+        seq : int
+            Sequence number to be passed to unchanged
+        '''
+        k = int(self._published)
+        slot = self._slots[k % 2]
+        return slot, int(slot['seq'])
+
+    def unchanged(self, seq):
+        '''
+        Returns whether the slot of a view has not been overwritten since
+        it was taken, i.e. whether the values read from it are consistent.
+        '''
+        return not seq & 1 and int(self._seqs[(seq // 2) % 2]) == seq
+
+    def read(self, timeout=1.0):
+        '''
+        Reads a consistent copy of the latest update.
+
+        Parameters
+        ----------
+        timeout : float
+            Maximum time in s to retry while the publisher overwrites the
+            slot being read. Default: 1.0
+
+        Returns
+        -------
+        sample : BroadcastSample
+            count: number of the update (0 if none published yet),
+            time_ns: time.monotonic_ns() of the update, position and status
+            (AxisFlag bits) as arrays in the order of axes
+        '''
+        deadline = None
+        delay = 0.0
+        while True:
+            k = int(self._published)
+            slot = self._slots[k % 2]
+            seq = int(slot['seq'])
+            if not seq & 1:
+                time_ns = int(slot['time_ns'])
+                position = slot['position'].copy()
+                status = slot['status'].copy()
+                if int(slot['seq']) == seq:
+                    return BroadcastSample(seq // 2, time_ns, position,
+                                           status)
+            if deadline is None:
+                deadline = time.monotonic() + timeout
+                continue
+            if time.monotonic() > deadline:
+                raise TimeoutError('No consistent update of {}'.format(
+                    self.name))
+            # Yield, then back off, so the publisher can finish the update
+            # even if it shares the core with the reader
+            time.sleep(delay)
+            delay = min(2 * delay, 1e-3) if delay else 1e-5
+
+    def getPosition(self, axisNo):
+        '''
+        Returns the latest published position of an axis.
+
+        Parameters
+        ----------
+        axisNo : int
+            Axis number, one of the published axes
+
+        Returns
+        -------
+        position : float
+            Position m or deg
+        '''
+        column = self._column[axisNo]
+        k = int(self._published)
+        slot = self._slots[k % 2]
+        seq = int(slot['seq'])
+        position = float(slot['position'][column])
+        if not seq & 1 and int(slot['seq']) == seq:
+            return position
+        return float(self.read().position[column])
+
+    def getAxisFlags(self, axisNo):
+        '''
+        Returns the latest published status of an axis.
+
+        Parameters
+        ----------
+        axisNo : int
+            Axis number, one of the published axes
+
+        Returns
+        -------
+        flags : AxisFlag
+            Status bits, see Positioner_ANC350.getAxisFlags
+        '''
+        return AxisFlag(int(self.read().status[self._column[axisNo]]))
+
+    def age(self):
+        '''
+        Returns the time in s since the latest update, None if nothing has
+        been published yet.
+        '''
+        sample = self.read()
+        if sample.count == 0:
+            return None
+        return (time.monotonic_ns() - sample.time_ns) * 1e-9
+
+    def wait(self, count=None, timeout=None, interval=1e-4):
+        '''
+        Waits for an update newer than count.
+
+        Parameters
+        ----------
+        count : int
+            Number of the last update seen. Default: None, i.e. the current
+            one
+        timeout : float
+            Maximum time in s. Default: None, i.e. no limit
+        interval : float
+            Polling interval in s. Default: 1e-4
+
+        Returns
+        -------
+        sample : BroadcastSample
+            Newer update, see read
+
+        Raises
+        ------
+        TimeoutError
+            If no update is published within the timeout
+        '''
+        if count is None:
+            count = int(self._published)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while int(self._published) <= count:
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError('No update of {} within {} s'.format(
+                    self.name, timeout))
+            time.sleep(interval)
+        return self.read()
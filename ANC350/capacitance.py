@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+'''
+Concurrent capacitance measurements across axes and devices.
+
+measureCapacitance blocks for a few seconds per axis. The survey runs the
+measurements of different devices in parallel and keeps the results with
+timestamps, so recent values can be reused instead of measuring again.
+'''
+
+import atexit
+import collections
+import concurrent.futures
+import threading
+import time
+
+# device: key of the device (serial number or device number), axis: axis
+# number, capacitance: in F, timestamp: time.time() of the measurement
+CapacitanceResult = collections.namedtuple(
+    'CapacitanceResult', 'device axis capacitance timestamp')
+
+
+class CapacitanceSurvey:
+    '''
+    Scheduler and result store for capacitance measurements.
+
+    By default the measurements of one device run one after the other on
+    a thread of its own, since the device measures one motor at a time;
+    different devices are measured in parallel.
+    '''
+    def __init__(self, max_age=None, serialize=True, max_workers=None):
+        '''
+        Parameters
+        ----------
+        max_age : float
+            Default maximum age in s of stored results to be reused.
+            Default: None, i.e. always measure
+        serialize : bool
+            Run the measurements of one device one after the other.
+            Default: True
+        max_workers : int
+            Number of threads shared by all devices if serialize is False.
+            Default: None, i.e. the executor default
+        '''
+        self.max_age = max_age
+        self.serialize = serialize
+        self.max_workers = max_workers
+        self.results = {}
+        # (device, axis) -> future of a measurement not completed yet
+        self._pending = {}
+        self._executors = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        '''
+        Waits for pending measurements and shuts down the threads.
+        '''
+        with self._lock:
+            executors = list(self._executors.values())
+            self._executors.clear()
+        for executor in executors:
+            executor.shutdown()
+
+    def _executor(self, positioner):
+        key = positioner if self.serialize else None
+        with self._lock:
+            executor = self._executors.get(key)
+            if executor is None:
+                executor = self._executors[key] = \
+                    concurrent.futures.ThreadPoolExecutor(
+                        1 if self.serialize else self.max_workers,
+                        thread_name_prefix='ANC350-capacitance')
+        return executor
+
+    def cached(self, device, axisNo, max_age=None):
+        '''
+        Returns a stored result if it is not older than max_age.
+
+        Parameters
+        ----------
+        device : hashable
+            Key of the device
+        axisNo : int
+            Axis number (0 ... 2)
+        max_age : float
+            Maximum age in s. Default: None, i.e. the survey default
+
+        Returns
+        -------
+        result : CapacitanceResult or None
+            Stored result, None if there is none or it is too old
+        '''
+        max_age = self.max_age if max_age is None else max_age
+        result = self.results.get((device, axisNo))
+        if result is None or max_age is None or \
+                time.time() - result.timestamp > max_age:
+            return None
+        return result
+
+    def submit(self, positioner, axisNo, device=None, max_age=None):
+        '''
+        Schedules the measurement of one axis, unless a result not older
+        than max_age is stored. While a measurement of the axis is pending,
+        its future is returned instead of measuring again.
+
+        Parameters
+        ----------
+        positioner : Positioner_ANC350
+            Connected positioner
+        axisNo : int
+            Axis number (0 ... 2)
+        device : hashable
+            Key of the device in the results. Default: None, i.e. the
+            device number of the positioner
+        max_age : float
+            Maximum age in s of a stored result to be reused. Default: None,
+            i.e. the survey default
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+            Future of the CapacitanceResult
+        '''
+        device = positioner.devNo if device is None else device
+        result = self.cached(device, axisNo, max_age)
+        if result is not None:
+            future = concurrent.futures.Future()
+            future.set_result(result)
+            return future
+        key = (device, axisNo)
+        executor = self._executor(positioner)
+        with self._lock:
+            future = self._pending.get(key)
+            if future is not None:
+                return future
+            future = self._pending[key] = executor.submit(
+                self._measure, positioner, axisNo, device)
+        # Outside of the lock, as a completed future calls back at once
+        future.add_done_callback(lambda f: self._done(key, f))
+        return future
+
+    def _done(self, key, future):
+        with self._lock:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+
+    def measure_all(self, positioners, axes=(0, 1, 2), max_age=None,
+                    wait=True):
+        '''
+        Measures several axes of several devices.
+
+        Parameters
+        ----------
+        positioners : dict or sequence of Positioner_ANC350
+            Devices to be measured; a dict maps device keys, e.g. serial
+            numbers, to positioners
+        axes : tuple of int
+            Axis numbers. Default: (0, 1, 2)
+        max_age : float
+            Maximum age in s of stored results to be reused. Default: None,
+            i.e. the survey default
+        wait : bool
+            Wait for the results (True) or return the futures (False).
+            Default: True
+
+        Returns
+        -------
+        results : list of CapacitanceResult or dict
+            Result table in the order of devices and axes, or a dict
+            (device, axis) -> future if wait is False
+        '''
+        if not isinstance(positioners, dict):
+            positioners = {positioner.devNo: positioner
+                           for positioner in positioners}
+        futures = {(device, axisNo): self.submit(positioner, axisNo,
+                                                 device, max_age)
+                   for device, positioner in positioners.items()
+                   for axisNo in axes}
+        if not wait:
+            return futures
+        return [future.result() for future in futures.values()]
+
+    def _measure(self, positioner, axisNo, device):
+        capacitance = positioner.measureCapacitance(axisNo)
+        result = CapacitanceResult(device, axisNo, capacitance, time.time())
+        self.results[(device, axisNo)] = result
+        return result
+
+
+# Survey shared by measure_capacitance_all, closed by close_survey
+_survey = None
+_survey_lock = threading.Lock()
+
+
+def close_survey():
+    '''
+    Waits for the pending measurements of measure_capacitance_all and shuts
+    down its threads. The stored results are dropped; a later call starts
+    a new survey. Registered to run at interpreter exit.
+    '''
+    global _survey
+    with _survey_lock:
+        survey, _survey = _survey, None
+    if survey is not None:
+        survey.close()
+
+
+atexit.register(close_survey)
+
+
+def measure_capacitance_all(positioners, axes=(0, 1, 2), max_age=None,
+                            wait=True):
+    '''
+    Measures the capacitance of several axes of several devices in
+    parallel, using a shared CapacitanceSurvey whose stored results are
+    reused if they are not older than max_age. Its threads run until
+    close_survey is called or the interpreter exits; use a
+    CapacitanceSurvey as context manager to limit them to a block.
+
+    Parameters
+    ----------
+    positioners : dict or sequence of Positioner_ANC350
+        Devices to be measured; a dict maps device keys, e.g. serial
+        numbers, to positioners
+    axes : tuple of int
+        Axis numbers. Default: (0, 1, 2)
+    max_age : float
+        Maximum age in s of stored results to be reused. Default: None,
+        i.e. always measure
+    wait : bool
+        Wait for the results (True) or return the futures (False).
+        Default: True
+
+    Returns
+    -------
+    results : list of CapacitanceResult or dict
+        See CapacitanceSurvey.measure_all
+    '''
+    global _survey
+    with _survey_lock:
+        if _survey is None:
+            _survey = CapacitanceSurvey()
+        survey = _survey
+    return survey.measure_all(positioners, axes, max_age, wait)
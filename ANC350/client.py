@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+'''
+Client of the positioner server of ANC350.server.
+
+Requests are pipelined: submit sends a request and returns a future at
+once, and a reader thread completes the futures as the responses arrive,
+so many calls can be in flight on one connection. batch sends several
+calls in one request.
+
+Example
+-------
+with Client('127.0.0.1') as client:
+    positioner = client.positioner('L010001')
+    print(positioner.getPosition(0))
+    futures = [positioner.submit('getPosition', axisNo)
+               for axisNo in (0, 1, 2)]
+'''
+
+import concurrent.futures
+import itertools
+import socket
+import threading
+
+from .PylibANC350 import _ANC_EXCEPTIONS, ANCError
+from .server import (BATCH, CALL, DEFAULT_PORT, ERROR, FRAME, decode,
+                     encode, frame)
+
+
+class RemoteError(RuntimeError):
+    '''
+    Error raised on the server other than an ANCError, e.g. an unknown
+    method. type_name holds the name of the original exception type.
+    '''
+    def __init__(self, type_name, message):
+        super().__init__('{}: {}'.format(type_name, message))
+        self.type_name = type_name
+
+
+def _exception(error):
+    type_name, message, ret_code, func_name = error
+    if ret_code is not None:
+        return _ANC_EXCEPTIONS.get(ret_code, ANCError)(ret_code, func_name,
+                                                       ())
+    return RemoteError(type_name, message)
+
+
+class Client:
+    '''
+    Connection to a positioner server.
+    '''
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT, path=None,
+                 timeout=None):
+        '''
+        Parameters
+        ----------
+        host : str
+            Host of the server. Default: '127.0.0.1'
+        port : int
+            TCP port of the server. Default: 7350
+        path : str
+            Unix socket of the server, instead of host and port.
+            Default: None
+        timeout : float
+            Default timeout in s of call and batch. Default: None, i.e.
+            no limit
+        '''
+        if path is not None:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.connect(path)
+        else:
+            self._socket = socket.create_connection((host, port))
+            self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY,
+                                    1)
+        self.timeout = timeout
+        self._ids = itertools.count()
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read, daemon=True,
+                                        name='ANC350-client')
+        self._reader.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        '''
+        Closes the connection; pending futures fail with ConnectionError.
+        '''
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._socket.close()
+        self._reader.join()
+
+    def _send(self, kind, request):
+        future = concurrent.futures.Future()
+        payload = encode(request)
+        with self._lock:
+            requestId = next(self._ids) & 0xffffffff
+            self._futures[requestId] = future
+        # The reader must be able to complete futures while sendall blocks
+        # on a full socket, so frames are sent outside of _lock
+        try:
+            with self._send_lock:
+                self._socket.sendall(frame(requestId, kind, payload))
+        except OSError:
+            with self._lock:
+                self._futures.pop(requestId, None)
+            raise
+        return future
+
+    def _read(self):
+        stream = self._socket.makefile('rb')
+        try:
+            while True:
+                header = stream.read(FRAME.size)
+                if len(header) < FRAME.size:
+                    break
+                length, requestId, kind = FRAME.unpack(header)
+                value = decode(stream.read(length))
+                with self._lock:
+                    future = self._futures.pop(requestId, None)
+                if future is None:
+                    continue
+                if kind == ERROR:
+                    future.set_exception(_exception(value))
+                else:
+                    future.set_result(value)
+        except (OSError, ValueError):
+            pass
+        finally:
+            stream.close()
+            with self._lock:
+                futures, self._futures = self._futures, {}
+            for future in futures.values():
+                future.set_exception(ConnectionError('Connection closed'))
+
+    def submit(self, device, method, *args):
+        '''
+        Sends a call without waiting for the result.
+
+        Parameters
+        ----------
+        device : str
+            Key of the device on the server, e.g. the serial number
+        method : str
+            Name of the Positioner_ANC350 method
+        *args
+            Arguments of the method
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+            Result of the call; errors are raised as the ANCError subclass
+            of the server or as RemoteError
+        '''
+        return self._send(CALL, [device, method, list(args)])
+
+    def call(self, device, method, *args):
+        '''
+        Calls a method and waits for the result, see submit.
+        '''
+        return self.submit(device, method, *args).result(self.timeout)
+
+    def submit_batch(self, calls):
+        '''
+        Sends several calls in one request. Calls of one device run in
+        order, different devices in parallel.
+
+        Parameters
+        ----------
+        calls : iterable
+            (device, method, args) tuples
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+            List of (ok, value) pairs, value being the result or the error
+            if ok is False
+        '''
+        request = [[device, method, list(args)]
+                   for device, method, args in calls]
+        future = concurrent.futures.Future()
+        inner = self._send(BATCH, request)
+
+        def done(inner):
+            try:
+                results = inner.result()
+            except Exception as e:
+                future.set_exception(e)
+                return
+            future.set_result([(ok, value if ok else _exception(value))
+                               for ok, value in results])
+        inner.add_done_callback(done)
+        return future
+
+    def batch(self, calls, return_exceptions=False):
+        '''
+        Executes several calls in one request and waits for the results,
+        see submit_batch.
+
+        Parameters
+        ----------
+        calls : iterable
+            (device, method, args) tuples
+        return_exceptions : bool
+            Return errors as results (True) or raise the first one
+            (False). Default: False
+
+        Returns
+        -------
+        results : list
+            Results in the order of the calls
+        '''
+        results = []
+        for ok, value in self.submit_batch(calls).result(self.timeout):
+            if not ok and not return_exceptions:
+                raise value
+            results.append(value)
+        return results
+
+    def devices(self):
+        '''
+        Returns the keys of the devices served.
+        '''
+        return self.call(None, 'devices')
+
+    def positioner(self, device):
+        '''
+        Returns a proxy of a device, see RemotePositioner.
+        '''
+        return RemotePositioner(self, device)
+
+
+class RemotePositioner:
+    '''
+    Proxy calling the methods of a Positioner_ANC350 on the server under
+    the same names, e.g. remote.getPosition(0).
+    '''
+    def __init__(self, client, device):
+        self.client = client
+        self.device = device
+
+    def submit(self, method, *args):
+        '''
+        Sends a call without waiting, see Client.submit.
+        '''
+        return self.client.submit(self.device, method, *args)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def call(*args):
+            return self.client.call(self.device, name, *args)
+        call.__name__ = name
+        return call
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+'''
+Asynchronous command queue with coalescing of redundant setter calls.
+
+Producers such as GUI sliders enqueue commands without waiting for the
+device. A worker thread executes them in order. A setter that is still
+pending when a new value for the same (method, axis) arrives is updated in
+place instead of queued again, so only the latest value is sent.
+
+Ordering: commands run in the order they were enqueued, except that a
+coalesced setter runs at the position of its first pending call. Setters
+of different parameters are independent, so this does not change the
+outcome. Any other command, e.g. startAutoMove, is a barrier: setters
+enqueued after it are never merged into calls before it.
+'''
+
+import collections
+import concurrent.futures
+import queue
+import threading
+
+# Setters whose pending calls for the same axis are merged
+COALESCE = ('selectActuator', 'setAmplitude', 'setAxisOutput',
+            'setDcVoltage', 'setFrequency', 'setTargetGround',
+            'setTargetPosition', 'setTargetRange')
+
+# depth: pending commands, submitted: commands enqueued, executed: dll
+# commands run, coalesced: calls merged into a pending one, dropped: calls
+# rejected because the queue was full, errors: commands that raised
+CommandStats = collections.namedtuple(
+    'CommandStats', 'depth submitted executed coalesced dropped errors')
+
+
+class _Command:
+    __slots__ = ('name', 'args', 'kwargs', 'futures')
+
+    def __init__(self, name, args, kwargs, future):
+        self.name = name
+        self.args = args
+        self.kwargs = kwargs
+        self.futures = [future]
+
+
+class CommandQueue:
+    '''
+    Command queue of one Positioner_ANC350, see the module description.
+
+    Any public method of the positioner can be enqueued under its own name,
+    e.g. commands.setTargetPosition(0, 1e-3), which returns a
+    concurrent.futures.Future of the result. The futures of merged calls
+    complete together with the call that was sent. Once disconnect is
+    enqueued, further commands are rejected.
+    '''
+    def __init__(self, positioner, maxsize=None):
+        '''
+        Parameters
+        ----------
+        positioner : Positioner_ANC350
+            Connected positioner
+        maxsize : int
+            Maximum number of pending commands; further commands that can
+            not be merged are dropped. Default: None, i.e. no limit
+        '''
+        self.positioner = positioner
+        self.maxsize = maxsize
+        self._commands = collections.deque()
+        self._pending = {}
+        self._condition = threading.Condition()
+        self._busy = False
+        self._closed = False
+        self.submitted = 0
+        self.executed = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.errors = 0
+        self.error = None
+        self._thread = threading.Thread(
+            target=self._run, daemon=True,
+            name='ANC350-commands-{}'.format(positioner.devNo))
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if not callable(getattr(self.positioner, name)):
+            raise AttributeError(name)
+
+        def enqueue(*args, **kwargs):
+            return self.submit(name, *args, **kwargs)
+        enqueue.__name__ = name
+        return enqueue
+
+    @property
+    def depth(self):
+        '''
+        Number of pending commands.
+        '''
+        return len(self._commands)
+
+    def submit(self, name, *args, **kwargs):
+        '''
+        Enqueues a call of a positioner method without blocking.
+
+        Parameters
+        ----------
+        name : str
+            Name of the method, e.g. 'setTargetPosition'
+        *args
+            Arguments of the method, the axis number first for setters
+        **kwargs
+            Keyword arguments of the method
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+            Result of the call. If the command is dropped, the future holds
+            a queue.Full exception.
+
+        Raises
+        ------
+        RuntimeError
+            If the queue is closed or disconnect is enqueued
+        '''
+        future = concurrent.futures.Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError('Command queue is closed')
+            self.submitted += 1
+            key = (name, args[0]) if name in COALESCE and args else None
+            command = self._pending.get(key)
+            if command is not None:
+                command.args = args
+                command.kwargs = kwargs
+                command.futures.append(future)
+                self.coalesced += 1
+                return future
+            if self.maxsize is not None and \
+                    len(self._commands) >= self.maxsize:
+                self.dropped += 1
+                future.set_exception(queue.Full(
+                    'Command queue of device {} is full'.format(
+                        self.positioner.devNo)))
+                return future
+            command = _Command(name, args, kwargs, future)
+            self._commands.append(command)
+            if name == 'disconnect':
+                # Later commands would run against the closed handle
+                self._closed = True
+            if key is None:
+                # Barrier: later setters must not move before it
+                self._pending.clear()
+            else:
+                self._pending[key] = command
+            self._condition.notify()
+        return future
+
+    def stats(self):
+        '''
+        Returns the queue statistics.
+
+        Returns
+        -------
+        stats : CommandStats
+            Queue depth and counters
+        '''
+        with self._condition:
+            return CommandStats(len(self._commands), self.submitted,
+                                self.executed, self.coalesced, self.dropped,
+                                self.errors)
+
+    def flush(self, timeout=None):
+        '''
+        Waits until all pending commands are executed.
+
+        Parameters
+        ----------
+        timeout : float
+            Maximum waiting time in s. Default: None, i.e. no limit
+
+        Returns
+        -------
+        done : bool
+            False if the timeout expired first
+        '''
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: not self._commands and not self._busy, timeout)
+
+    def close(self):
+        '''
+        Executes the pending commands and stops the worker thread. Called
+        from a queued command, e.g. disconnect, the thread stops after it.
+        '''
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if threading.current_thread() is not self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._busy = False
+                self._condition.notify_all()
+                self._condition.wait_for(
+                    lambda: self._commands or self._closed)
+                if not self._commands:
+                    return
+                command = self._commands.popleft()
+                name, args = command.name, command.args
+                key = (name, args[0]) if name in COALESCE and args else None
+                if self._pending.get(key) is command:
+                    del self._pending[key]
+                self._busy = True
+            try:
+                result = getattr(self.positioner, name)(*args,
+                                                        **command.kwargs)
+            except Exception as e:
+                self.errors += 1
+                self.error = e
+                for future in command.futures:
+                    future.set_exception(e)
+            else:
+                for future in command.futures:
+                    future.set_result(result)
+            self.executed += 1
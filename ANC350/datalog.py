@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+'''
+Streaming of sampled positions to disk for long measurements.
+
+A PositionLogger drains a PositionSampler on a background thread and
+appends the samples to a file, so memory use is bounded by the ring
+buffer of the sampler however long the measurement runs. Two formats are
+supported:
+
+hdf5
+    Chunked, resizable dataset 'samples' in an HDF5 file opened in SWMR
+    (single writer, multiple readers) mode; requires h5py. The metadata is
+    stored as attributes of the dataset.
+raw
+    Flat binary file of whole records that grows by appending. The dtype
+    and the metadata are kept in a JSON file next to it (fileName +
+    '.json'); readers map the data with numpy.memmap.
+
+In both formats a reader can open the file with open_log while it is
+still being written and sees all samples flushed so far.
+'''
+
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from .PylibANC350 import ANCError
+
+
+class _RawStore:
+    def __init__(self, fileName, dtype, metadata):
+        self.fileName = fileName
+        self._file = open(fileName, 'wb')
+        self._header = {'dtype': _descr(dtype), 'metadata': metadata}
+        self._writeHeader()
+
+    def _writeHeader(self):
+        temp = self.fileName + '.json.tmp'
+        with open(temp, 'w') as f:
+            json.dump(self._header, f, indent=1)
+        os.replace(temp, self.fileName + '.json')
+
+    def append(self, samples):
+        self._file.write(samples.tobytes())
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class _HDF5Store:
+    def __init__(self, fileName, dtype, metadata, chunk):
+        try:
+            import h5py
+        except ImportError:
+            raise ImportError('The hdf5 format requires h5py') from None
+        self._file = h5py.File(fileName, 'w', libver='latest')
+        self._samples = self._file.create_dataset(
+            'samples', (0,), dtype, maxshape=(None,), chunks=(chunk,))
+        for key, value in metadata.items():
+            self._samples.attrs[key] = value if isinstance(
+                value, (int, float, str)) else json.dumps(value)
+        self._file.swmr_mode = True
+
+    def append(self, samples):
+        n = self._samples.shape[0]
+        self._samples.resize((n + len(samples),))
+        self._samples[n:] = samples
+
+    def flush(self):
+        self._samples.flush()
+
+    def close(self):
+        self._file.close()
+
+
+FORMATS = ('hdf5', 'raw')
+
+
+def _descr(dtype):
+    return [(name, dtype[name].base.str, dtype[name].shape)
+            for name in dtype.names]
+
+
+def device_metadata(positioner, axes=(0, 1, 2)):
+    '''
+    Collects the description of a device stored with a log: serial number,
+    address, type and hardware ID from getDeviceInfo and the LUT name of
+    every axis from getLutName, if available.
+
+    Returns
+    -------
+    metadata : dict
+        JSON-serialisable description
+    '''
+    info = positioner.getDeviceInfo()
+    metadata = {'serial_no': info.serial_no, 'address': info.address,
+                'dev_type': info.dev_type, 'id': info.id,
+                'axes': list(axes)}
+    luts = []
+    for axisNo in axes:
+        try:
+            luts.append(positioner.getLutName(axisNo))
+        except (ANCError, AttributeError):
+            luts.append('')
+    metadata['lut_names'] = luts
+    return metadata
+
+
+class PositionLogger:
+    '''
+    Background writer of the samples of a PositionSampler.
+
+    Example
+    -------
+    sampler = PositionSampler(positioner, rate=100)
+    with PositionLogger('drift.h5', sampler):
+        time.sleep(12 * 3600)
+    samples, metadata = open_log('drift.h5')
+    '''
+    def __init__(self, fileName, sampler, format=None, interval=0.5,
+                 chunk=4096, metadata=None):
+        '''
+        Parameters
+        ----------
+        fileName : str
+            Name of the log file, overwritten if it exists
+        sampler : PositionSampler
+            Source of the samples; started with the logger if it is not
+            running yet
+        format : str
+            'hdf5' or 'raw'. Default: None, i.e. 'hdf5' for the file
+            extensions .h5 and .hdf5, otherwise 'raw'
+        interval : float
+            Time between two writes in s; must be well below the time the
+            sampler takes to fill its ring buffer. Default: 0.5
+        chunk : int
+            Number of samples per HDF5 chunk; the raw format has no
+            chunks and is flushed at every write. Default: 4096
+        metadata : dict
+            Additional JSON-serialisable description. Default: None
+        '''
+        if format is None:
+            format = 'hdf5' if os.path.splitext(fileName)[1].lower() in \
+                ('.h5', '.hdf5') else 'raw'
+        if format not in FORMATS:
+            raise ValueError('Unknown format {!r}'.format(format))
+        self.fileName = fileName
+        self.sampler = sampler
+        self.format = format
+        self.interval = interval
+        self.metadata = device_metadata(sampler.positioner, sampler.axes)
+        self.metadata.update(rate=sampler.rate, created=time.time(),
+                             clock='time.monotonic_ns')
+        self.metadata.update(metadata or {})
+        if format == 'hdf5':
+            self._store = _HDF5Store(fileName, sampler.dtype, self.metadata,
+                                     chunk)
+        else:
+            self._store = _RawStore(fileName, sampler.dtype, self.metadata)
+        self._thread = None
+        self._stop = threading.Event()
+        self._ownsSampler = False
+        self._read = 0
+        self.written = 0
+        self.lost = 0
+        self.error = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start(self):
+        '''
+        Starts the writer thread, and the sampler if it is not running.
+        '''
+        if self._thread is not None and self._thread.is_alive():
+            raise RuntimeError('Logger is already running')
+        if self.sampler.running:
+            self._read = self.sampler.count
+        else:
+            self._read = 0
+            self.sampler.start()
+            self._ownsSampler = True
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name='ANC350-logger')
+        self._thread.start()
+
+    def stop(self):
+        '''
+        Stops the writer thread after writing the remaining samples, and
+        the sampler if it was started by the logger.
+        '''
+        if self._ownsSampler:
+            self.sampler.stop()
+            self._ownsSampler = False
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def close(self):
+        '''
+        Stops the logger and closes the file.
+        '''
+        self.stop()
+        self._store.close()
+
+    def _run(self):
+        try:
+            while True:
+                stopping = self._stop.wait(self.interval)
+                self._write()
+                if stopping:
+                    break
+        except Exception as e:
+            self.error = e
+
+    def _write(self):
+        samples, self._read, lost = self.sampler.since(self._read)
+        self.lost += lost
+        if len(samples):
+            self._store.append(samples)
+            self._store.flush()
+            self.written += len(samples)
+
+
+def open_log(fileName):
+    '''
+    Opens a position log for reading, also while it is being written.
+
+    Parameters
+    ----------
+    fileName : str
+        Name of the log file
+
+    Returns
+    -------
+    samples : numpy.memmap or h5py.Dataset
+        Samples with the fields time_ns and position, as flushed so far.
+        An HDF5 dataset is opened in SWMR mode; call its refresh method to
+        see samples written later.
+    metadata : dict
+        Description of the log
+    '''
+    if os.path.exists(fileName + '.json'):
+        with open(fileName + '.json') as f:
+            header = json.load(f)
+        dtype = np.dtype([(name, base, tuple(shape))
+                          for name, base, shape in header['dtype']])
+        count = os.path.getsize(fileName) // dtype.itemsize
+        if count == 0:
+            return np.empty(0, dtype), header['metadata']
+        return (np.memmap(fileName, dtype, 'r', shape=(count,)),
+                header['metadata'])
+
+    import h5py
+    samples = h5py.File(fileName, 'r', libver='latest', swmr=True)['samples']
+    metadata = {}
+    for key, value in samples.attrs.items():
+        if isinstance(value, str) and value.startswith(('[', '{')):
+            value = json.loads(value)
+        metadata[key] = value
+    return samples, metadata
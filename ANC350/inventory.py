@@ -0,0 +1,373 @@
+# -*- coding: utf-8 -*-
+'''
+Persistent inventory of discovered ANC350 devices.
+
+discover_ANC350 scans USB and the network from scratch, which takes seconds
+on a LAN, and it can not run while devices are connected. The inventory
+keeps serial number, address, hardware ID and type of every device found in
+a small JSON file. Lookups are answered from the file as long as it is
+younger than its time to live; only a stale inventory or a lookup miss
+triggers a new scan.
+
+Device numbers are only valid for the discovery run in the current process.
+Before connecting, the inventory therefore runs one discovery per process,
+restricted to the interfaces the devices of the inventory were last seen
+on. No discovery runs while devices connected through an inventory are
+open: lookups are answered from the inventory even if it is stale, and
+devices missing from it raise an error.
+'''
+
+import collections
+import json
+import os
+import threading
+import time
+
+from .PylibANC350 import (ANCError, Positioner_ANC350, discover_ANC350,
+                          getDeviceInfo, load_ANC350dll)
+
+# dev_no: device number in the scan that found the device, dev_type, id,
+# serial_no, address: see DeviceInfo, iface: interface the device was found
+# on {USB: 1, ethernet: 2}
+InventoryEntry = collections.namedtuple(
+    'InventoryEntry', 'dev_no dev_type id serial_no address iface')
+
+FORMAT_VERSION = 1
+
+# Library -> serial number -> device number of the last discovery run in
+# this process
+_discovered = {}
+# Library -> positioners connected by Inventory.connect in this process
+_opened = {}
+
+
+def default_path():
+    '''
+    Returns the inventory file used by default: the value of the environment
+    variable ANC350_INVENTORY, or anc350/inventory.json in the user's cache
+    directory.
+    '''
+    path = os.environ.get('ANC350_INVENTORY')
+    if path:
+        return path
+    cache = os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache, 'anc350', 'inventory.json')
+
+
+def discover(ifaces=3, backend=None):
+    '''
+    Runs discover_ANC350 and reads the information of all devices found,
+    without connecting them.
+
+    Parameters
+    ----------
+    ifaces : int
+        Interfaces where devices are to be searched.
+        {None: 0, USB: 1, ethernet: 2, all: 3} Default: 3
+    backend : str or object
+        Library backend, see load_ANC350dll. Default: None
+
+    Returns
+    -------
+    entries : list of InventoryEntry
+        Devices found, in the order of their device numbers
+    '''
+    anc = load_ANC350dll(backend)
+    devCount = discover_ANC350(ifaces, anc, verbose=False)
+    entries = []
+    for devNo in range(devCount):
+        info = getDeviceInfo(devNo, anc)
+        entries.append(InventoryEntry(devNo, info.dev_type, info.id,
+                                      info.serial_no, info.address,
+                                      1 if info.address == 'USB' else 2))
+    _discovered[anc] = {entry.serial_no: entry.dev_no for entry in entries}
+    return entries
+
+
+def connected(backend=None):
+    '''
+    Returns the positioners connected by Inventory.connect in this process
+    that are still open. While there are any, discover_ANC350 must not run.
+
+    Parameters
+    ----------
+    backend : str or object
+        Library backend, see load_ANC350dll. Default: None
+
+    Returns
+    -------
+    positioners : list of Positioner_ANC350
+        Open positioners
+    '''
+    anc = load_ANC350dll(backend)
+    positioners = []
+    for positioner in _opened.get(anc, ()):
+        # The device numbers stay valid as no discovery runs meanwhile
+        try:
+            if getDeviceInfo(positioner.devNo, anc).connected:
+                positioners.append(positioner)
+        except ANCError:
+            pass
+    _opened[anc] = positioners
+    return positioners
+
+
+def _not_while_connected(serialNo=None):
+    what = 'Scanning' if serialNo is None else \
+        'ANC350 {} is not in the inventory; scanning'.format(serialNo)
+    return RuntimeError('{} requires a discovery, which is not possible '
+                        'while devices are connected. Disconnect them '
+                        'first.'.format(what))
+
+
+def _backend_name(backend):
+    if backend is None:
+        backend = os.environ.get('ANC350_BACKEND', 'native')
+    if isinstance(backend, str):
+        return 'sim' if backend == 'simulator' else backend
+    return type(backend).__name__
+
+
+class Inventory:
+    '''
+    Device inventory backed by a JSON file with a time to live.
+
+    Example
+    -------
+    inventory = Inventory()
+    positioner = inventory.connect('L010001')
+    '''
+    def __init__(self, path=None, ttl=3600.0, ifaces=3, backend=None):
+        '''
+        Parameters
+        ----------
+        path : str
+            Inventory file. Default: None, i.e. default_path()
+        ttl : float
+            Time in s after which the inventory is scanned again.
+            Default: 3600
+        ifaces : int
+            Interfaces to be scanned.
+            {None: 0, USB: 1, ethernet: 2, all: 3} Default: 3
+        backend : str or object
+            Library backend, see load_ANC350dll. Default: None
+        '''
+        self.path = default_path() if path is None else path
+        self.ttl = ttl
+        self.ifaces = ifaces
+        self.backend = backend
+        self.timestamp = None
+        self.entries = {}
+        self.scans = 0
+        self._lock = threading.RLock()
+        self.load()
+
+    @property
+    def age(self):
+        '''
+        Time in s since the last scan, infinite if there was none.
+        '''
+        if self.timestamp is None:
+            return float('inf')
+        return time.time() - self.timestamp
+
+    @property
+    def stale(self):
+        '''
+        True if the inventory is older than its time to live.
+        '''
+        return self.age > self.ttl
+
+    def load(self):
+        '''
+        Reads the inventory file. Files of another format version, backend
+        or covering fewer interfaces are ignored.
+
+        Returns
+        -------
+        loaded : bool
+            If the file was read
+        '''
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if data['version'] != FORMAT_VERSION or \
+                    data['backend'] != _backend_name(self.backend) or \
+                    data['ifaces'] & self.ifaces != self.ifaces:
+                return False
+            entries = [InventoryEntry(**device) for device in data['devices']]
+            timestamp = float(data['timestamp'])
+        except (OSError, ValueError, TypeError, KeyError):
+            return False
+        with self._lock:
+            self.entries = {entry.serial_no: entry for entry in entries}
+            self.timestamp = timestamp
+        return True
+
+    def save(self):
+        '''
+        Writes the inventory file. The file is replaced atomically, so
+        concurrent readers never see a partial file.
+        '''
+        with self._lock:
+            data = {'version': FORMAT_VERSION,
+                    'backend': _backend_name(self.backend),
+                    'ifaces': self.ifaces,
+                    'timestamp': self.timestamp,
+                    'devices': [entry._asdict()
+                                for entry in self.entries.values()]}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        temp = '{}.{}.tmp'.format(self.path, os.getpid())
+        with open(temp, 'w') as f:
+            json.dump(data, f, indent=1)
+        os.replace(temp, self.path)
+
+    def scan(self):
+        '''
+        Discovers the devices, replaces the inventory and writes the file.
+        Like discover_ANC350, this must not be called while devices are
+        connected.
+
+        Returns
+        -------
+        entries : list of InventoryEntry
+            Devices found
+
+        Raises
+        ------
+        RuntimeError
+            If devices connected by connect are open
+        '''
+        with self._lock:
+            if connected(self.backend):
+                raise _not_while_connected()
+            entries = discover(self.ifaces, self.backend)
+            self.entries = {entry.serial_no: entry for entry in entries}
+            self.timestamp = time.time()
+            self.scans += 1
+            self.save()
+            return entries
+
+    def devices(self):
+        '''
+        Returns all devices, scanning first if the inventory is stale and
+        no devices connected by connect are open.
+
+        Returns
+        -------
+        entries : list of InventoryEntry
+            Devices of the inventory
+        '''
+        with self._lock:
+            if self.stale and not connected(self.backend):
+                self.scan()
+            return list(self.entries.values())
+
+    def lookup(self, serialNo):
+        '''
+        Returns the entry of a device, scanning first if the inventory is
+        stale or does not contain the device. While devices connected by
+        connect are open, the entry is taken from the inventory as it is.
+
+        Parameters
+        ----------
+        serialNo : str
+            Serial number of the device
+
+        Returns
+        -------
+        entry : InventoryEntry
+            Entry of the device
+
+        Raises
+        ------
+        KeyError
+            If the device is not found by a scan either
+        RuntimeError
+            If the device is not in the inventory and devices connected by
+            connect are open
+        '''
+        with self._lock:
+            if self.stale or serialNo not in self.entries:
+                if not connected(self.backend):
+                    self.scan()
+                elif serialNo not in self.entries:
+                    raise _not_while_connected(serialNo)
+            try:
+                return self.entries[serialNo]
+            except KeyError:
+                raise KeyError('ANC350 {} not found'.format(serialNo)) \
+                    from None
+
+    def resolve(self, serialNo):
+        '''
+        Returns the device number of a device for connecting it in this
+        process. If the library has not been discovered in this process
+        yet, only the interfaces the devices of the inventory were last
+        seen on are searched. A device missing there triggers a full scan,
+        unless devices connected by connect are open.
+
+        Parameters
+        ----------
+        serialNo : str
+            Serial number of the device
+
+        Returns
+        -------
+        devNo : int
+            Device number, see Positioner_ANC350
+
+        Raises
+        ------
+        KeyError
+            If the device is not found
+        RuntimeError
+            If the device was not found by the last discovery and devices
+            connected by connect are open
+        '''
+        with self._lock:
+            entry = self.lookup(serialNo)
+            anc = load_ANC350dll(self.backend)
+            devNos = _discovered.get(anc)
+            if devNos is None:
+                ifaces = entry.iface
+                for other in self.entries.values():
+                    ifaces |= other.iface
+                discover(ifaces & self.ifaces or entry.iface, anc)
+                devNos = _discovered[anc]
+            if serialNo not in devNos:
+                if connected(self.backend):
+                    raise _not_while_connected(serialNo)
+                self.scan()
+                devNos = _discovered[anc]
+            try:
+                return devNos[serialNo]
+            except KeyError:
+                raise KeyError('ANC350 {} not found'.format(serialNo)) \
+                    from None
+
+    def connect(self, serialNo, verbose=False, cache=False):
+        '''
+        Connects a device by serial number. No discovery runs as long as
+        positioners connected this way are open.
+
+        Parameters
+        ----------
+        serialNo : str
+            Serial number of the device
+        verbose, cache : bool
+            See Positioner_ANC350. Default: False
+
+        Returns
+        -------
+        positioner : Positioner_ANC350
+            Connected device
+        '''
+        with self._lock:
+            positioner = Positioner_ANC350(self.resolve(serialNo),
+                                           self.backend, verbose, cache)
+            _opened.setdefault(load_ANC350dll(self.backend), []).append(
+                positioner)
+            return positioner
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+'''
+Parser and cache for sensor lookup table (.LUT) files.
+
+A LUT file starts with a header of 'key value' lines, e.g.
+
+    serial ANPx101_01_123
+    ver 08.05.2019 10-27-09
+
+followed by the table as one integer per line. Parsed tables are cached by
+the SHA-256 digest of the file content, and the header and digest of a file
+are only read again when its size or modification time changes. Reading
+the header does not need NumPy, only parsing the table does.
+'''
+
+import collections
+import hashlib
+import os
+import threading
+
+# serial: name of the LUT as reported by getLutName, version: 'ver' header,
+# table: int64 array, digest: hex SHA-256 of the file content
+LookupTable = collections.namedtuple(
+    'LookupTable', 'serial version table digest')
+LutHeader = collections.namedtuple('LutHeader', 'serial version digest')
+
+_tables = {}
+_files = {}
+_lock = threading.Lock()
+
+
+def parse_lut(data):
+    '''
+    Parses the content of a LUT file.
+
+    Parameters
+    ----------
+    data : bytes
+        File content
+
+    Returns
+    -------
+    lut : LookupTable
+        Parsed table
+
+    Raises
+    ------
+    ValueError
+        If the content is not a LUT
+    '''
+    import numpy as np
+    header = {}
+    values = []
+    for line in data.decode('ascii').splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if values or line.lstrip('+-').isdigit():
+            values.append(int(line))
+        else:
+            key, _, value = line.partition(' ')
+            header[key] = value.strip()
+    if 'serial' not in header or not values:
+        raise ValueError('Not a LUT file')
+    table = np.array(values, dtype=np.int64)
+    table.flags.writeable = False
+    return LookupTable(header['serial'], header.get('ver', ''), table,
+                       hashlib.sha256(data).hexdigest())
+
+
+def _parse_header(data):
+    header = {}
+    for line in data.decode('ascii').splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.lstrip('+-').isdigit():
+            break
+        key, _, value = line.partition(' ')
+        header[key] = value.strip()
+    if 'serial' not in header:
+        raise ValueError('Not a LUT file')
+    return LutHeader(header['serial'], header.get('ver', ''),
+                     hashlib.sha256(data).hexdigest())
+
+
+def _read(fileName):
+    # Returns the path, the header through the cache and the file content,
+    # None if the header was cached
+    path = os.path.realpath(fileName)
+    stat = os.stat(path)
+    key = (stat.st_size, stat.st_mtime_ns)
+    with _lock:
+        known = _files.get(path)
+        if known is not None and known[0] == key:
+            return path, known[1], None
+    with open(path, 'rb') as f:
+        data = f.read()
+    header = _parse_header(data)
+    with _lock:
+        _files[path] = (key, header)
+    return path, header, data
+
+
+def read_lut_header(fileName):
+    '''
+    Reads the header and the digest of a LUT file through the cache,
+    without parsing the table.
+
+    Parameters
+    ----------
+    fileName : str
+        Name of the LUT file, optionally with path
+
+    Returns
+    -------
+    header : LutHeader
+        serial, version and digest, see LookupTable
+
+    Raises
+    ------
+    OSError
+        If the file can not be read
+    ValueError
+        If the file is not a LUT
+    '''
+    return _read(fileName)[1]
+
+
+def read_lut(fileName):
+    '''
+    Reads a LUT file through the cache.
+
+    Parameters
+    ----------
+    fileName : str
+        Name of the LUT file, optionally with path
+
+    Returns
+    -------
+    lut : LookupTable
+        Parsed table; the table array is read-only as it is shared
+
+    Raises
+    ------
+    OSError
+        If the file can not be read
+    ValueError
+        If the file is not a LUT
+    '''
+    path, header, data = _read(fileName)
+    with _lock:
+        lut = _tables.get(header.digest)
+    if lut is None:
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+        lut = parse_lut(data)
+        with _lock:
+            lut = _tables.setdefault(header.digest, lut)
+    return lut
+
+
+def clear_cache():
+    '''
+    Drops all cached tables.
+    '''
+    with _lock:
+        _tables.clear()
+        _files.clear()
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+'''
+Parallel management of several ANC350 devices.
+'''
+
+import concurrent.futures
+
+from .PylibANC350 import Positioner_ANC350, discover_ANC350
+from .capacitance import CapacitanceSurvey
+
+
+class DeviceManager:
+    '''
+    Connects all discovered devices in parallel and fans commands out to
+    them on a thread pool. Since ctypes releases the GIL during the dll
+    calls, the wall-clock time of a fan-out is that of the slowest device.
+    Devices are indexed by serial number.
+    '''
+    def __init__(self, backend=None, max_workers=None, verbose=False):
+        '''
+        Parameters
+        ----------
+        backend : str or object
+            Library backend, see load_ANC350dll. Default: None
+        max_workers : int
+            Number of threads. Default: None, i.e. the executor default
+        verbose : bool
+            See Positioner_ANC350. Default: False
+        '''
+        self.backend = backend
+        self.verbose = verbose
+        self.devices = {}
+        self.info = {}
+        self.capacitance = CapacitanceSurvey()
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers, thread_name_prefix='ANC350-manager')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __getitem__(self, serialNo):
+        return self.devices[serialNo]
+
+    def __iter__(self):
+        return iter(self.devices)
+
+    def __len__(self):
+        return len(self.devices)
+
+    def connect_all(self, ifaces=3):
+        '''
+        Discovers the devices and connects all of them in parallel. If a
+        connection fails, the devices connected so far are disconnected
+        again and the error is raised.
+
+        Parameters
+        ----------
+        ifaces : int
+            Interfaces where devices are to be searched.
+            {None: 0, USB: 1, ethernet: 2, all: 3} Default: 3
+
+        Returns
+        -------
+        devices : dict
+            Serial number -> Positioner_ANC350
+        '''
+        devCount = discover_ANC350(ifaces, self.backend, self.verbose)
+        futures = [self._executor.submit(self._open, devNo)
+                   for devNo in range(devCount)]
+        concurrent.futures.wait(futures)
+        error = None
+        for future in futures:
+            if future.exception() is not None:
+                error = error or future.exception()
+                continue
+            positioner, info = future.result()
+            self.devices[info.serial_no] = positioner
+            self.info[info.serial_no] = info
+        if error is not None:
+            self.disconnect_all()
+            raise error
+        return self.devices
+
+    def _open(self, devNo):
+        positioner = Positioner_ANC350(devNo, self.backend, self.verbose)
+        try:
+            return positioner, positioner.getDeviceInfo()
+        except BaseException:
+            positioner.disconnect()
+            raise
+
+    def map(self, func, serials=None, return_exceptions=False):
+        '''
+        Calls func(positioner) for several devices in parallel.
+
+        Parameters
+        ----------
+        func : callable
+            Function taking a Positioner_ANC350
+        serials : iterable of str
+            Serial numbers of the devices. Default: None, i.e. all devices
+        return_exceptions : bool
+            Return exceptions as results (True) or raise the first one
+            after all calls have finished (False). Default: False
+
+        Returns
+        -------
+        results : dict
+            Serial number -> return value of func
+        '''
+        serials = list(self.devices) if serials is None else list(serials)
+        futures = [self._executor.submit(func, self.devices[serialNo])
+                   for serialNo in serials]
+        concurrent.futures.wait(futures)
+        results = {}
+        for serialNo, future in zip(serials, futures):
+            error = future.exception()
+            if error is not None and not return_exceptions:
+                raise error
+            results[serialNo] = error if error is not None \
+                else future.result()
+        return results
+
+    def call(self, method, *args, serials=None):
+        '''
+        Calls a Positioner_ANC350 method with the same arguments on several
+        devices in parallel, e.g. call('getPosition', 0).
+
+        Parameters
+        ----------
+        method : str
+            Name of the method
+        *args
+            Arguments of the method
+        serials : iterable of str
+            Serial numbers of the devices. Default: None, i.e. all devices
+
+        Returns
+        -------
+        results : dict
+            Serial number -> return value
+        '''
+        return self.map(lambda positioner:
+                        getattr(positioner, method)(*args), serials)
+
+    def read_positions(self, axes=None):
+        '''
+        Reads the positions of all devices in parallel.
+
+        Parameters
+        ----------
+        axes : sequence of int
+            Axis numbers to be read. Default: None, i.e. all axes
+
+        Returns
+        -------
+        positions : dict
+            Serial number -> numpy.ndarray of positions m or deg
+        '''
+        return self.map(lambda positioner: positioner.getPositions(axes))
+
+    def ground_all(self, axes=(0, 1, 2)):
+        '''
+        Switches off the voltage output of all axes of all devices.
+
+        Parameters
+        ----------
+        axes : tuple of int
+            Axis numbers. Default: (0, 1, 2)
+        '''
+        def ground(positioner):
+            for axisNo in axes:
+                positioner.setAxisOutput(axisNo, 0, 0)
+        self.map(ground)
+
+    def measure_capacitance_all(self, axes=(0, 1, 2), max_age=None,
+                                wait=True):
+        '''
+        Measures the capacitance of all devices, in parallel across devices,
+        see ANC350.capacitance.CapacitanceSurvey.measure_all.
+
+        Parameters
+        ----------
+        axes : tuple of int
+            Axis numbers. Default: (0, 1, 2)
+        max_age : float
+            Maximum age in s of stored results to be reused. Default: None,
+            i.e. always measure
+        wait : bool
+            Wait for the results (True) or return the futures (False).
+            Default: True
+
+        Returns
+        -------
+        results : list of CapacitanceResult or dict
+            Result table keyed by serial number, or the futures
+        '''
+        return self.capacitance.measure_all(self.devices, axes, max_age, wait)
+
+    def disconnect_all(self):
+        '''
+        Disconnects all devices in parallel.
+        '''
+        self.map(lambda positioner: positioner.disconnect(),
+                 return_exceptions=True)
+        self.devices.clear()
+        self.info.clear()
+
+    def close(self):
+        '''
+        Disconnects all devices and shuts down the thread pools.
+        '''
+        self.capacitance.close()
+        self.disconnect_all()
+        self._executor.shutdown()
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+'''
+Opt-in call statistics of the dll functions.
+
+A Metrics registry wraps the dll functions and records per function the
+number of calls, the errors by ANC_RC code and a latency histogram with
+fixed log-spaced buckets. Disabled instrumentation leaves the plain dll
+functions in place, so it costs nothing.
+
+Example
+-------
+positioner = Positioner_ANC350(0, metrics=True)
+...
+print(positioner.stats()['ANC_getPosition'])
+print(prometheus_text(positioner.metrics))
+'''
+
+import bisect
+import collections
+import threading
+import time
+
+from .PylibANC350 import ANC_RC, ANCError
+
+# Upper bounds in s of the latency buckets, two per decade from 1 us to
+# 10 s; the last count of a histogram is for slower calls.
+BUCKETS = tuple(10.0 ** (exponent / 2) for exponent in range(-12, 3))
+
+# calls: number of calls, errors: dict ANC_RC code -> count, total: summed
+# latency in s, buckets: call counts per latency bucket (not cumulative),
+# the last one above BUCKETS[-1]
+CallStats = collections.namedtuple('CallStats',
+                                   'calls errors total buckets')
+
+
+class _Counter:
+    __slots__ = ('calls', 'errors', 'total', 'buckets')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = {}
+        self.total = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+
+class Metrics:
+    '''
+    Registry of call statistics for one device or for the module-level
+    functions.
+    '''
+    def __init__(self, labels=None):
+        '''
+        Parameters
+        ----------
+        labels : dict
+            Labels of the Prometheus samples, e.g. {'device': '0'}.
+            Default: None
+        '''
+        self.labels = dict(labels or {})
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def wrap(self, func, name):
+        '''
+        Returns func wrapped to record its calls under name.
+
+        Parameters
+        ----------
+        func : callable
+            dll function
+        name : str
+            Name of the function, e.g. 'ANC_getPosition'
+
+        Returns
+        -------
+        wrapper : callable
+            Function with the same signature and errors as func
+        '''
+        perf_counter = time.perf_counter
+        record = self.record
+
+        def wrapper(*args):
+            start = perf_counter()
+            try:
+                result = func(*args)
+            except ANCError as error:
+                record(name, perf_counter() - start, error.ret_code)
+                raise
+            record(name, perf_counter() - start, 0)
+            return result
+        wrapper.__name__ = name
+        wrapper.__wrapped__ = func
+        return wrapper
+
+    def record(self, name, elapsed, ret_code=0):
+        '''
+        Records one call.
+
+        Parameters
+        ----------
+        name : str
+            Name of the function
+        elapsed : float
+            Latency in s
+        ret_code : int
+            Return code of the call. Default: 0
+        '''
+        index = bisect.bisect_left(BUCKETS, elapsed)
+        with self._lock:
+            counter = self._counters.get(name)
+            if counter is None:
+                counter = self._counters[name] = _Counter()
+            counter.calls += 1
+            counter.total += elapsed
+            counter.buckets[index] += 1
+            if ret_code:
+                counter.errors[ret_code] = counter.errors.get(ret_code, 0) + 1
+
+    def stats(self):
+        '''
+        Returns a snapshot of the statistics.
+
+        Returns
+        -------
+        stats : dict
+            Function name -> CallStats
+        '''
+        with self._lock:
+            return {name: CallStats(counter.calls, dict(counter.errors),
+                                    counter.total, tuple(counter.buckets))
+                    for name, counter in sorted(self._counters.items())}
+
+    def reset(self):
+        '''
+        Drops all statistics.
+        '''
+        with self._lock:
+            self._counters.clear()
+
+    def prometheus(self):
+        '''
+        Returns the statistics in the Prometheus text exposition format,
+        see prometheus_text.
+        '''
+        return prometheus_text(self)
+
+
+def _labels(labels, **extra):
+    labels = dict(labels, **extra)
+    return '{' + ','.join('{}="{}"'.format(key, value)
+                          for key, value in labels.items()) + '}'
+
+
+def prometheus_text(*registries):
+    '''
+    Formats the statistics of several registries, e.g. of all devices, in
+    the Prometheus text exposition format. Samples of the registries are
+    told apart by their labels.
+
+    Returns
+    -------
+    text : str
+        Metric families anc350_calls_total, anc350_errors_total and the
+        histogram anc350_call_duration_seconds
+    '''
+    stats = [(registry.labels, registry.stats()) for registry in registries]
+    lines = ['# HELP anc350_calls_total Number of dll calls.',
+             '# TYPE anc350_calls_total counter']
+    for labels, functions in stats:
+        for name, entry in functions.items():
+            lines.append('anc350_calls_total{} {}'.format(
+                _labels(labels, function=name), entry.calls))
+    lines += ['# HELP anc350_errors_total Number of failed dll calls by '
+              'return code.',
+              '# TYPE anc350_errors_total counter']
+    for labels, functions in stats:
+        for name, entry in functions.items():
+            for code, count in sorted(entry.errors.items()):
+                lines.append('anc350_errors_total{} {}'.format(
+                    _labels(labels, function=name, code=code,
+                            error=ANC_RC.get(code, ANC_RC[-1])), count))
+    lines += ['# HELP anc350_call_duration_seconds Latency of the dll '
+              'calls.',
+              '# TYPE anc350_call_duration_seconds histogram']
+    for labels, functions in stats:
+        for name, entry in functions.items():
+            cumulative = 0
+            for bound, count in zip(BUCKETS + (float('inf'),),
+                                    entry.buckets):
+                cumulative += count
+                lines.append('anc350_call_duration_seconds_bucket{} {}'.format(
+                    _labels(labels, function=name,
+                            le='+Inf' if bound == float('inf')
+                            else '{:g}'.format(bound)), cumulative))
+            lines.append('anc350_call_duration_seconds_sum{} {!r}'.format(
+                _labels(labels, function=name), entry.total))
+            lines.append('anc350_call_duration_seconds_count{} {}'.format(
+                _labels(labels, function=name), entry.calls))
+    return '\n'.join(lines) + '\n'
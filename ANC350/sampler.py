@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+'''
+Background position sampling into a preallocated, timestamped ring buffer.
+'''
+
+import collections
+import threading
+import time
+
+import numpy as np
+
+SamplerStats = collections.namedtuple(
+    'SamplerStats', 'samples missed rate elapsed')
+
+
+class PositionSampler:
+    '''
+    Thread polling the positions of a Positioner_ANC350 at a fixed rate.
+
+    Every sample is stored as (time_ns, position) in a ring buffer, where
+    time_ns is time.monotonic_ns() at the start of the sample and position
+    holds one value per sampled axis. The buffer is allocated twice and
+    each sample is written to both halves, so the latest samples are always
+    a contiguous slice and can be returned as a view without copying.
+    '''
+    def __init__(self, positioner, axes=(0, 1, 2), rate=1000.0,
+                 capacity=65536):
+        '''
+        Parameters
+        ----------
+        positioner : Positioner_ANC350
+            Connected positioner
+        axes : tuple of int
+            Axis numbers to be sampled. Default: (0, 1, 2)
+        rate : float
+            Target sample rate in Hz. Default: 1000.0
+        capacity : int
+            Number of samples kept in the ring buffer. Default: 65536
+        '''
+        self.positioner = positioner
+        self.axes = tuple(axes)
+        self.rate = rate
+        self.capacity = capacity
+        self.dtype = np.dtype([('time_ns', np.int64),
+                               ('position', np.float64, (len(self.axes),))])
+        self._buffer = np.zeros(2 * capacity, self.dtype)
+        self._times = self._buffer['time_ns']
+        self._positions = self._buffer['position']
+        self._poller = positioner.poller(self.axes)
+        self._thread = None
+        self._stop = threading.Event()
+        self._first_ns = 0
+        self.count = 0
+        self.missed = 0
+        self.error = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        '''
+        Starts the sampler thread.
+        '''
+        if self._thread is not None and self._thread.is_alive():
+            raise RuntimeError('Sampler is already running')
+        self._stop.clear()
+        self.count = 0
+        self.missed = 0
+        self.error = None
+        self._thread = threading.Thread(
+            target=self._run, daemon=True,
+            name='ANC350-sampler-{}'.format(self.positioner.devNo))
+        self._thread.start()
+
+    def stop(self):
+        '''
+        Stops the sampler thread and waits for it to finish.
+        '''
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def latest(self, n=None):
+        '''
+        Returns the latest samples in chronological order as a view into the
+        ring buffer. The view is overwritten once the sampler has taken
+        capacity further samples; copy it to keep the data longer.
+
+        Parameters
+        ----------
+        n : int
+            Number of samples, at most capacity. Default: None, i.e. all
+            samples in the buffer
+
+        Returns
+        -------
+        samples : numpy.ndarray
+            Structured array with the fields time_ns and position
+        '''
+        count = self.count
+        available = min(count, self.capacity)
+        n = available if n is None else min(n, available)
+        return self._view(count, n)
+
+    def since(self, count):
+        '''
+        Returns the samples taken after the first count samples as a view,
+        see latest. Calling since repeatedly with the returned count reads
+        every sample once, as long as fewer than capacity samples are taken
+        between two calls.
+
+        Parameters
+        ----------
+        count : int
+            Number of samples read before, 0 at first
+
+        Returns
+        -------
+        samples : numpy.ndarray
+            Structured array with the fields time_ns and position
+        count : int
+            Number of samples taken so far, for the next call
+        lost : int
+            Number of samples overwritten before they could be read
+        '''
+        total = self.count
+        lost = max(total - count - self.capacity, 0)
+        return self._view(total, total - count - lost), total, lost
+
+    def _view(self, count, n):
+        end = count % self.capacity + self.capacity
+        return self._buffer[end - n:end]
+
+    def stats(self):
+        '''
+        Returns the sampling statistics.
+
+        Returns
+        -------
+        stats : SamplerStats
+            samples: number of samples taken, missed: number of sample
+            periods skipped because a deadline was missed, rate: achieved
+            rate in Hz, elapsed: time between first and latest sample in s
+        '''
+        count = self.count
+        if count < 2:
+            return SamplerStats(count, self.missed, 0.0, 0.0)
+        last = int(self._times[(count - 1) % self.capacity])
+        elapsed = (last - self._first_ns) * 1e-9
+        return SamplerStats(count, self.missed, (count - 1) / elapsed,
+                            elapsed)
+
+    def _run(self):
+        getPosition = self._poller.getPosition
+        axes = tuple(enumerate(self.axes))
+        times = self._times
+        positions = self._positions
+        capacity = self.capacity
+        period = int(1e9 / self.rate)
+        monotonic_ns = time.monotonic_ns
+        sleep = time.sleep
+        stopped = self._stop.is_set
+        deadline = self._first_ns = monotonic_ns()
+        try:
+            while not stopped():
+                now = monotonic_ns()
+                index = self.count % capacity
+                mirror = index + capacity
+                times[index] = times[mirror] = now
+                for column, axisNo in axes:
+                    positions[index, column] = positions[mirror, column] = \
+                        getPosition(axisNo)
+                self.count += 1
+
+                deadline += period
+                now = monotonic_ns()
+                if now > deadline:
+                    skipped = (now - deadline) // period + 1
+                    self.missed += skipped
+                    deadline += skipped * period
+                sleep((deadline - now) * 1e-9)
+        except Exception as e:
+            self.error = e
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+'''
+Trajectory generation and a point-by-point scan engine.
+
+Trajectories are plain NumPy arrays of shape (n_points, n_axes) together
+with a line index per point, so they can be generated, inspected and
+modified with NumPy before running them.
+'''
+
+import collections
+import time
+
+import numpy as np
+
+# Result of ScanEngine.run. commanded and achieved have shape
+# (n_points, n_axes), times (n_points,) in s since the start of the scan,
+# reached (n_points,) bool. line_stats is a structured array with one record
+# (line, points, duration, rate) per line.
+ScanResult = collections.namedtuple(
+    'ScanResult', 'commanded achieved times reached lines line_stats')
+
+LINE_STATS_DTYPE = np.dtype([('line', np.int64),
+                             ('points', np.int64),
+                             ('duration', np.float64),
+                             ('rate', np.float64)])
+
+
+def raster(x, y, serpentine=False):
+    '''
+    Grid trajectory stepping along x first, then y. With serpentine=True
+    every second line runs backwards, so the fast axis never jumps back.
+
+    Parameters
+    ----------
+    x : array_like
+        Positions of the fast axis
+    y : array_like
+        Positions of the slow axis, one line each
+    serpentine : bool
+        Reverse every second line. Default: False
+
+    Returns
+    -------
+    points : numpy.ndarray
+        Positions of shape (len(x) * len(y), 2)
+    lines : numpy.ndarray
+        Line index of every point
+    '''
+    x = np.asarray(x, np.float64)
+    y = np.asarray(y, np.float64)
+    xx = np.tile(x, (len(y), 1))
+    if serpentine:
+        xx[1::2] = xx[1::2, ::-1]
+    yy = np.repeat(y, len(x)).reshape(len(y), len(x))
+    points = np.column_stack((xx.ravel(), yy.ravel()))
+    lines = np.repeat(np.arange(len(y)), len(x))
+    return points, lines
+
+
+def serpentine(x, y):
+    '''
+    Grid trajectory with every second line reversed, see raster.
+    '''
+    return raster(x, y, serpentine=True)
+
+
+def raster3d(x, y, z, serpentine=True):
+    '''
+    3D grid trajectory: one (serpentine) raster of x and y per z plane.
+    With serpentine=True the planes alternate direction as well.
+
+    Returns
+    -------
+    points : numpy.ndarray
+        Positions of shape (len(x) * len(y) * len(z), 3)
+    lines : numpy.ndarray
+        Line index of every point: plane index * len(y) + index of the y
+        row the point lies on
+    '''
+    plane, plane_lines = raster(x, y, serpentine)
+    planes = []
+    lines = []
+    for i, zi in enumerate(np.asarray(z, np.float64)):
+        points, rows = plane, plane_lines
+        if serpentine and i % 2:
+            points, rows = plane[::-1], plane_lines[::-1]
+        planes.append(np.column_stack((points, np.full(len(points), zi))))
+        lines.append(rows + i * len(y))
+    return np.concatenate(planes), np.concatenate(lines)
+
+
+def spiral(center, radius, pitch, points_per_turn=32):
+    '''
+    Archimedean spiral around center out to radius. Every turn counts as
+    one line.
+
+    Parameters
+    ----------
+    center : tuple of float
+        Center (x, y)
+    radius : float
+        Outer radius
+    pitch : float
+        Radial distance between two turns
+    points_per_turn : int
+        Number of points per turn. Default: 32
+
+    Returns
+    -------
+    points : numpy.ndarray
+        Positions of shape (n_points, 2)
+    lines : numpy.ndarray
+        Turn index of every point
+    '''
+    turns = radius / pitch
+    n = int(np.ceil(turns * points_per_turn)) + 1
+    phi = np.linspace(0.0, 2 * np.pi * turns, n)
+    r = pitch * phi / (2 * np.pi)
+    points = np.column_stack((center[0] + r * np.cos(phi),
+                              center[1] + r * np.sin(phi)))
+    return points, np.arange(n) // points_per_turn
+
+
+def point_list(points):
+    '''
+    Arbitrary trajectory; every point is its own line.
+
+    Returns
+    -------
+    points : numpy.ndarray
+        Positions of shape (n_points, n_axes)
+    lines : numpy.ndarray
+        Line index of every point
+    '''
+    points = np.atleast_2d(np.asarray(points, np.float64))
+    return points, np.arange(len(points))
+
+
+class ScanEngine:
+    '''
+    Runs trajectories on a Positioner_ANC350, one axis per trajectory
+    column. At every point the axes are moved with move_many, the achieved
+    positions are read and an optional callback is invoked, e.g. to acquire
+    a measurement.
+    '''
+    def __init__(self, positioner, axes=(0, 1), tolerance=None,
+                 timeout=None):
+        '''
+        Parameters
+        ----------
+        positioner : Positioner_ANC350
+            Connected positioner
+        axes : tuple of int
+            Axis numbers, one per trajectory column. Default: (0, 1)
+        tolerance : float
+            Target range m or deg, set once before the scan. Default: None,
+            i.e. the range set in the device
+        timeout : float
+            Maximum time per point in s. Default: None, i.e. no limit
+        '''
+        self.positioner = positioner
+        self.axes = tuple(axes)
+        self.tolerance = tolerance
+        self.timeout = timeout
+
+    def run(self, points, lines=None, callback=None, out=None):
+        '''
+        Runs a trajectory.
+
+        Parameters
+        ----------
+        points : array_like
+            Positions of shape (n_points, len(axes)), or a (points, lines)
+            tuple as returned by the trajectory generators
+        lines : array_like
+            Line index of every point. Default: None, i.e. taken from the
+            tuple or one line for the whole trajectory
+        callback : callable
+            Called as callback(index, achieved) at every point, where
+            achieved is a view of the achieved positions. Returning True
+            stops the scan. Default: None
+        out : ScanResult
+            Result of a previous run with the same number of points and
+            axes whose arrays are reused. Default: None
+
+        Returns
+        -------
+        result : ScanResult
+            Commanded and achieved positions, times and line statistics.
+            After a stop the arrays cover the points run so far.
+        '''
+        if isinstance(points, tuple):
+            points, lines = points
+        points = np.asarray(points, np.float64)
+        n, n_axes = points.shape
+        if n_axes != len(self.axes):
+            raise ValueError('Trajectory has {} columns for {} axes'.format(
+                n_axes, len(self.axes)))
+        lines = np.zeros(n, np.int64) if lines is None \
+            else np.asarray(lines, np.int64)
+
+        if out is None:
+            achieved = np.empty_like(points)
+            times = np.empty(n)
+            reached = np.empty(n, np.bool_)
+        else:
+            achieved, times, reached = out.achieved, out.times, out.reached
+            if achieved.shape != points.shape:
+                raise ValueError('out does not match the trajectory')
+
+        positioner = self.positioner
+        if self.tolerance is not None:
+            for axisNo in self.axes:
+                positioner.setTargetRange(axisNo, self.tolerance)
+        move_many = positioner.move_many
+        axes = self.axes
+        timeout = self.timeout
+        start = time.monotonic()
+        done = n
+        for index in range(n):
+            results = move_many(dict(zip(axes, points[index])),
+                                timeout=timeout)
+            row = achieved[index]
+            ok = True
+            for column, axisNo in enumerate(axes):
+                result = results[axisNo]
+                row[column] = result.position
+                ok = ok and result.reached
+            times[index] = time.monotonic() - start
+            reached[index] = ok
+            if callback is not None and callback(index, row):
+                done = index + 1
+                break
+
+        return ScanResult(points[:done], achieved[:done], times[:done],
+                          reached[:done], lines[:done],
+                          line_stats(lines[:done], times[:done]))
+
+
+def line_stats(lines, times):
+    '''
+    Computes the number of points, the duration and the point rate of every
+    line of a scan.
+
+    Parameters
+    ----------
+    lines : numpy.ndarray
+        Line index of every point
+    times : numpy.ndarray
+        Completion time of every point in s since the start of the scan
+
+    Returns
+    -------
+    stats : numpy.ndarray
+        LINE_STATS_DTYPE records (line, points, duration, rate), one per
+        line in the order of the scan
+    '''
+    if len(lines) == 0:
+        return np.empty(0, LINE_STATS_DTYPE)
+    starts = np.flatnonzero(np.r_[True, lines[1:] != lines[:-1]])
+    ends = np.r_[starts[1:], len(lines)]
+    previous = np.r_[0.0, times][starts]
+    stats = np.empty(len(starts), LINE_STATS_DTYPE)
+    stats['line'] = lines[starts]
+    stats['points'] = ends - starts
+    stats['duration'] = times[ends - 1] - previous
+    with np.errstate(divide='ignore'):
+        stats['rate'] = stats['points'] / stats['duration']
+    return stats
@@ -0,0 +1,436 @@
+# -*- coding: utf-8 -*-
+'''
+asyncio server sharing connected positioners with client processes.
+
+A device handle can only be owned by one process. The server owns the
+Positioner_ANC350 connections and exposes their methods over TCP or a Unix
+socket to any number of clients, see ANC350.client.
+
+Protocol
+--------
+Every message is a frame: a header of FRAME.size bytes (payload length
+uint32, request id uint32, kind uint8, little-endian) followed by the
+payload, a value in the tagged binary encoding of encode/decode.
+
+Requests are of kind CALL, payload [device, method, args], or BATCH,
+payload a list of such calls. Responses carry the id of their request and
+are of kind OK, payload the result (for a batch a list of [ok, value]
+pairs), or ERROR, payload [type, message, ret_code, func_name].
+
+Clients may pipeline requests without waiting for responses. Calls to one
+device are executed in order on a thread of the device, different devices
+in parallel, so responses may arrive out of order across devices. Calls
+arriving while the thread of a device is busy are queued and executed by
+its next job together, which amortizes the thread hand-off under load.
+'''
+
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import json
+import struct
+
+from . import PylibANC350
+from .PylibANC350 import ANCError
+
+FRAME = struct.Struct('<IIB')
+CALL = 1
+BATCH = 2
+OK = 0
+ERROR = 1
+
+DEFAULT_PORT = 7350
+
+# Method name prefixes a client may call; everything else, e.g. disconnect
+# or recordTrace, stays with the server
+ALLOWED = ('configure', 'get', 'load', 'measure', 'move_', 'save',
+           'select', 'set', 'start', 'cacheStats', 'stats', 'workerStats')
+
+# Maximum number of queued requests of a device executed by one job
+DRAIN = 256
+
+# Default maximum payload length of a request frame in bytes; the
+# connection of a client sending a larger frame is closed
+MAX_FRAME = 16 << 20
+
+# Named tuples restored by name on decoding
+RECORDS = {record.__name__: record for record in (
+    PylibANC350.AxisStatus, PylibANC350.CacheStats,
+    PylibANC350.DeviceConfig, PylibANC350.DeviceInfo,
+    PylibANC350.MoveResult)}
+
+_INT = struct.Struct('<q')
+_FLOAT = struct.Struct('<d')
+_COUNT = struct.Struct('<I')
+
+
+def encode(value):
+    '''
+    Encodes a value: None, bool, int, float, str, bytes, list, tuple,
+    named tuple, dict, NumPy array or scalar, nested arbitrarily.
+
+    Returns
+    -------
+    data : bytearray
+        Encoded value
+    '''
+    out = bytearray()
+    _encode(value, out)
+    return out
+
+
+def _encode(value, out):
+    if value is None:
+        out += b'N'
+    elif value is True:
+        out += b'T'
+    elif value is False:
+        out += b'F'
+    elif isinstance(value, int):
+        out += b'i'
+        out += _INT.pack(value)
+    elif isinstance(value, float):
+        out += b'd'
+        out += _FLOAT.pack(value)
+    elif isinstance(value, str):
+        data = value.encode('utf-8')
+        out += b's'
+        out += _COUNT.pack(len(data))
+        out += data
+    elif isinstance(value, (bytes, bytearray)):
+        out += b'b'
+        out += _COUNT.pack(len(value))
+        out += value
+    elif isinstance(value, tuple) and hasattr(value, '_fields'):
+        out += b'n'
+        _encode(type(value).__name__, out)
+        _encode(tuple(value), out)
+    elif isinstance(value, (list, tuple)):
+        out += b'l'
+        out += _COUNT.pack(len(value))
+        for item in value:
+            _encode(item, out)
+    elif isinstance(value, dict):
+        out += b'm'
+        out += _COUNT.pack(len(value))
+        for key, item in value.items():
+            _encode(key, out)
+            _encode(item, out)
+    elif type(value).__module__ == 'numpy':
+        import numpy as np
+        if isinstance(value, np.generic):
+            _encode(value.item(), out)
+            return
+        value = np.ascontiguousarray(value)
+        out += b'a'
+        _encode(json.dumps(np.lib.format.dtype_to_descr(value.dtype)), out)
+        _encode(list(value.shape), out)
+        _encode(value.tobytes(), out)
+    else:
+        raise TypeError('Can not encode {}'.format(type(value).__name__))
+
+
+def decode(data):
+    '''
+    Decodes a value encoded by encode.
+    '''
+    value, _ = _decode(memoryview(data), 0)
+    return value
+
+
+def _decode(data, index):
+    tag = data[index]
+    index += 1
+    if tag == 0x4e:    # N
+        return None, index
+    if tag == 0x54:    # T
+        return True, index
+    if tag == 0x46:    # F
+        return False, index
+    if tag == 0x69:    # i
+        return _INT.unpack_from(data, index)[0], index + 8
+    if tag == 0x64:    # d
+        return _FLOAT.unpack_from(data, index)[0], index + 8
+    if tag in (0x73, 0x62):    # s, b
+        n = _COUNT.unpack_from(data, index)[0]
+        index += 4
+        value = bytes(data[index:index + n])
+        return (value.decode('utf-8') if tag == 0x73 else value), index + n
+    if tag == 0x6c:    # l
+        n = _COUNT.unpack_from(data, index)[0]
+        index += 4
+        items = []
+        for _ in range(n):
+            item, index = _decode(data, index)
+            items.append(item)
+        return items, index
+    if tag == 0x6d:    # m
+        n = _COUNT.unpack_from(data, index)[0]
+        index += 4
+        items = {}
+        for _ in range(n):
+            key, index = _decode(data, index)
+            items[key], index = _decode(data, index)
+        return items, index
+    if tag == 0x6e:    # n
+        name, index = _decode(data, index)
+        items, index = _decode(data, index)
+        record = RECORDS.get(name)
+        return (tuple(items) if record is None else record(*items)), index
+    if tag == 0x61:    # a
+        import numpy as np
+        descr, index = _decode(data, index)
+        shape, index = _decode(data, index)
+        raw, index = _decode(data, index)
+        dtype = np.lib.format.descr_to_dtype(json.loads(descr))
+        return np.frombuffer(raw, dtype).reshape(shape).copy(), index
+    raise ValueError('Unknown tag {!r}'.format(chr(tag)))
+
+
+def frame(requestId, kind, payload):
+    '''
+    Returns a message of the protocol.
+    '''
+    return FRAME.pack(len(payload), requestId, kind) + payload
+
+
+def _error(e):
+    if isinstance(e, ANCError):
+        return [type(e).__name__, str(e), e.ret_code, e.func_name]
+    return [type(e).__name__, str(e), None, None]
+
+
+class PositionerServer:
+    '''
+    Server exposing the methods of connected positioners.
+
+    Example
+    -------
+    server = PositionerServer({'L010001': positioner})
+    asyncio.run(server.serve_forever())
+    '''
+    def __init__(self, positioners, host='127.0.0.1', port=DEFAULT_PORT,
+                 path=None, max_frame=MAX_FRAME):
+        '''
+        Parameters
+        ----------
+        positioners : dict
+            Device key, e.g. serial number -> connected Positioner_ANC350
+        host : str
+            Interface to listen on. Default: '127.0.0.1'
+        port : int
+            TCP port, 0 for any free port. Default: 7350
+        path : str
+            Listen on this Unix socket instead of TCP. Default: None
+        max_frame : int
+            Maximum payload length of a request in bytes; the connection
+            of a client sending a larger frame is closed. Default:
+            MAX_FRAME, i.e. 16 MiB
+        '''
+        self.positioners = {str(key): positioner
+                            for key, positioner in positioners.items()}
+        self.host = host
+        self.port = port
+        self.path = path
+        self.max_frame = max_frame
+        self.requests = 0
+        self._server = None
+        self._executors = {
+            key: concurrent.futures.ThreadPoolExecutor(
+                1, thread_name_prefix='ANC350-server-{}'.format(key))
+            for key in self.positioners}
+        # Device -> queued (calls, future); devices with a job scheduled
+        self._queues = {key: collections.deque() for key in self.positioners}
+        self._scheduled = set()
+
+    @property
+    def address(self):
+        '''
+        Address listened on: the socket path or (host, port).
+        '''
+        if self.path is not None:
+            return self.path
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def start(self):
+        '''
+        Starts listening.
+        '''
+        if self.path is not None:
+            self._server = await asyncio.start_unix_server(self._handle,
+                                                           self.path)
+        else:
+            self._server = await asyncio.start_server(self._handle,
+                                                      self.host, self.port)
+
+    async def serve_forever(self):
+        '''
+        Starts listening, if not done yet, and serves until cancelled.
+        '''
+        if self._server is None:
+            await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            self.close()
+
+    def close(self):
+        '''
+        Stops listening and shuts down the device threads. The positioners
+        stay connected.
+        '''
+        if self._server is not None:
+            self._server.close()
+        for executor in self._executors.values():
+            executor.shutdown(wait=False)
+
+    def _method(self, device, method):
+        if device is None and method == 'devices':
+            return lambda: list(self.positioners)
+        if method.startswith('_') or not method.startswith(ALLOWED):
+            raise AttributeError('Method {!r} is not available'.format(
+                method))
+        return getattr(self.positioners[device], method)
+
+    def _run(self, calls):
+        # Executes calls of one device on its thread
+        results = []
+        for call in calls:
+            try:
+                device, method, args = call
+                results.append([True, self._method(device, method)(*args)])
+            except Exception as e:
+                results.append([False, _error(e)])
+        return results
+
+    def _submit(self, loop, device, calls):
+        future = loop.create_future()
+        queue = self._queues.get(device)
+        if queue is None:
+            future.set_result(self._run(calls))
+            return future
+        queue.append((calls, future))
+        if device not in self._scheduled:
+            self._scheduled.add(device)
+            self._executors[device].submit(self._drain, loop, device)
+        return future
+
+    def _drain(self, loop, device):
+        # Runs on the thread of the device
+        queue = self._queues[device]
+        done = []
+        while queue and len(done) < DRAIN:
+            calls, future = queue.popleft()
+            done.append((future, self._run(calls)))
+        loop.call_soon_threadsafe(self._complete, loop, device, done)
+
+    def _complete(self, loop, device, done):
+        for future, results in done:
+            if not future.cancelled():
+                future.set_result(results)
+        self._scheduled.discard(device)
+        if self._queues[device]:
+            self._scheduled.add(device)
+            self._executors[device].submit(self._drain, loop, device)
+
+    async def _handle(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        transport = writer.transport
+        try:
+            while True:
+                header = await reader.readexactly(FRAME.size)
+                length, requestId, kind = FRAME.unpack(header)
+                if length > self.max_frame:
+                    # The rest of the stream can not be trusted
+                    break
+                payload = await reader.readexactly(length)
+                self.requests += 1
+                # A malformed request is answered with an error, the
+                # connection and the requests in flight stay intact
+                try:
+                    self._dispatch(loop, transport, requestId, kind,
+                                   decode(payload))
+                except (ValueError, TypeError, KeyError, IndexError,
+                        RecursionError, struct.error) as e:
+                    transport.write(frame(requestId, ERROR,
+                                          encode(_error(e))))
+                if transport.get_write_buffer_size() > 1 << 20:
+                    await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def _dispatch(self, loop, transport, requestId, kind, request):
+        if kind == CALL:
+            device, method, args = request
+            future = self._submit(loop, device, [(device, method, args)])
+            future.add_done_callback(
+                lambda f: self._respond(transport, requestId, f, False))
+        elif kind == BATCH:
+            if not isinstance(request, list):
+                raise TypeError('Batch request must be a list of calls')
+            # Consecutive calls of one device run as one job
+            runs = []
+            for call in request:
+                if not isinstance(call, list) or len(call) != 3:
+                    raise ValueError('Call must be [device, method, args]')
+                if runs and runs[-1][0] == call[0]:
+                    runs[-1][1].append(call)
+                else:
+                    runs.append((call[0], [call]))
+            future = asyncio.gather(*(self._submit(loop, device, calls)
+                                      for device, calls in runs))
+            future.add_done_callback(
+                lambda f: self._respond(transport, requestId, f, True))
+        else:
+            raise ValueError('Unknown request kind')
+
+    def _respond(self, transport, requestId, future, batch):
+        if transport.is_closing():
+            return
+        try:
+            results = future.result()
+            if batch:
+                results = [result for run in results for result in run]
+                payload = encode(results)
+                kind = OK
+            else:
+                ok, value = results[0]
+                payload = encode(value)
+                kind = OK if ok else ERROR
+        except Exception as e:
+            payload = encode(_error(e))
+            kind = ERROR
+        transport.write(frame(requestId, kind, payload))
+
+
+def main(argv=None):
+    '''
+    Connects all discovered devices and serves them, keyed by serial
+    number:
+
+        python -m ANC350.server --backend sim --port 7350
+    '''
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--backend', default=None)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--path', default=None,
+                        help='Unix socket instead of TCP')
+    args = parser.parse_args(argv)
+
+    from .manager import DeviceManager
+    with DeviceManager(args.backend) as manager:
+        manager.connect_all()
+        server = PositionerServer(manager.devices, args.host, args.port,
+                                  args.path)
+        try:
+            asyncio.run(server.serve_forever())
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
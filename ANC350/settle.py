@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+'''
+Fastest-settle move strategy.
+
+The closed-loop automatic mode approaches the target at a reduced speed,
+which makes long moves slow. FastSettle covers most of the travel in
+continuous mode at full speed and stops predictively, using the velocity
+learned from the getPosition history and the measured latency of the stop
+command, a short distance before the target. The closed-loop automatic
+mode then settles on the target. With single steps enabled, automatic mode
+hands over to them once it stalls or is within a few step widths of the
+target, and they correct what is left.
+'''
+
+import time
+
+from .PylibANC350 import MoveResult
+
+
+class FastSettle:
+    '''
+    Move strategy for the axes of one Positioner_ANC350. The velocity and
+    the step width of every axis and the stop latency are learned from the
+    moves and kept for later ones.
+
+    Example
+    -------
+    settle = FastSettle(positioner)
+    result = settle.move_to(0, 1e-3, tolerance=50e-9)
+    '''
+    def __init__(self, positioner, handover=0.05, min_distance=None,
+                 steps=0, stall=0.1, step_range=3.0, min_interval=1e-3,
+                 max_interval=0.05, smoothing=0.3):
+        '''
+        Parameters
+        ----------
+        positioner : Positioner_ANC350
+            Connected positioner
+        handover : float
+            Travel time in s at full speed before the target at which
+            continuous motion hands over to automatic mode. Default: 0.05
+        min_distance : float
+            Moves shorter than this (m or deg) skip the continuous phase.
+            Default: None, i.e. twice the handover distance
+        steps : int
+            Maximum number of single steps once automatic mode stalls or
+            is within step_range step widths of the target. Without
+            tolerance they stop within half a step of the target.
+            Default: 0, i.e. automatic mode only
+        stall : float
+            Time in s without progress towards the target after which
+            automatic mode counts as stalled. Default: 0.1
+        step_range : float
+            Distance to the target in learned step widths below which
+            automatic mode hands over to single steps. Default: 3.0
+        min_interval, max_interval : float
+            Shortest and longest time between two polls in s.
+            Default: 1e-3, 0.05
+        smoothing : float
+            Weight of a new measurement in the learned values (0 ... 1).
+            Default: 0.3
+        '''
+        self.positioner = positioner
+        self.handover = handover
+        self.min_distance = min_distance
+        self.steps = steps
+        self.stall = stall
+        self.step_range = step_range
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.smoothing = smoothing
+        # Axis number -> learned velocity m/s or deg/s and step width
+        self.velocity = {}
+        self.stepWidth = {}
+        # Learned latency of the stop command in s
+        self.latency = 0.0
+        # Duration in s of the phases of the last move
+        self.phases = {}
+
+    def _learn(self, values, key, value):
+        old = values.get(key)
+        values[key] = value if old is None else \
+            old + self.smoothing * (value - old)
+
+    def move_to(self, axisNo, target, tolerance=None, timeout=None):
+        '''
+        Moves an axis to a target position and blocks until it has settled,
+        the move is aborted or the timeout expires.
+
+        Parameters
+        ----------
+        axisNo : int
+            Axis number (0 ... 2)
+        target : float
+            Target position m or deg
+        tolerance : float
+            Target range m or deg, see setTargetRange. Default: None, i.e.
+            the range set in the device
+        timeout : float
+            Maximum time in s. Default: None, i.e. no limit
+
+        Returns
+        -------
+        result : MoveResult
+            Final position, reason and timing of the whole move; polls
+            counts the polls of all phases. Single steps that end without
+            settling report 'timeout'.
+        '''
+        positioner = self.positioner
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+        self.phases = {}
+
+        polls, reason = self._coarse(axisNo, target, deadline)
+        now = time.monotonic()
+        self.phases['coarse'] = now - start
+        if reason is not None:
+            return MoveResult(axisNo, target, positioner.getPosition(axisNo),
+                              False, reason, now - start, polls)
+
+        position, reason, fine = self._fine(axisNo, target, tolerance,
+                                            deadline)
+        polls += fine
+        self.phases['fine'] = time.monotonic() - now
+        if reason == 'stalled':
+            now = time.monotonic()
+            position, reason, steps = self._step(axisNo, target, tolerance,
+                                                 position, deadline)
+            polls += steps
+            self.phases['steps'] = time.monotonic() - now
+        return MoveResult(axisNo, target, position, reason == 'target',
+                          reason, time.monotonic() - start, polls)
+
+    def _coarse(self, axisNo, target, deadline):
+        # Continuous motion up to the handover point. Returns the number
+        # of polls and the reason of an abort, None if the move goes on.
+        positioner = self.positioner
+        poller = positioner.defaultPoller()
+        getPosition = poller.getPosition
+        getAxisStatus = poller.getAxisStatus
+        monotonic = time.monotonic
+        position = getPosition(axisNo)
+        last = monotonic()
+        sign = 1.0 if target >= position else -1.0
+        backward = int(sign < 0)
+
+        velocity = self.velocity.get(axisNo)
+        handover = 0.0 if velocity is None else velocity * self.handover
+        min_distance = 2 * handover if self.min_distance is None \
+            else self.min_distance
+        if velocity is not None and abs(target - position) <= min_distance:
+            return 0, None
+
+        polls = 0
+        reason = None
+        interval = self.min_interval
+        positioner.startContinuousMove(axisNo, 1, backward)
+        try:
+            while True:
+                time.sleep(interval)
+                polls += 1
+                now = monotonic()
+                new = getPosition(axisNo)
+                if now > last and (new - position) * sign > 0:
+                    self._learn(self.velocity, axisNo,
+                                (new - position) * sign / (now - last))
+                position, last = new, now
+                status = getAxisStatus(axisNo)
+                if status.eot_fwd or status.eot_bwd or status.error:
+                    reason = 'eot_fwd' if status.eot_fwd else \
+                        'eot_bwd' if status.eot_bwd else 'error'
+                    break
+                if deadline is not None and now >= deadline:
+                    reason = 'timeout'
+                    break
+                velocity = self.velocity.get(axisNo)
+                if velocity is None:
+                    # Not moving: leave it to automatic mode
+                    if polls * self.min_interval >= self.max_interval:
+                        break
+                    continue
+                handover = velocity * self.handover
+                remaining = (target - position) * sign - handover
+                if remaining <= 0:
+                    break
+                # Time until the stop command must be issued
+                eta = remaining / velocity - self.latency
+                if eta <= self.max_interval:
+                    time.sleep(max(eta, 0.0))
+                    break
+                interval = min(self.max_interval,
+                               max(self.min_interval, 0.5 * eta))
+        finally:
+            sent = monotonic()
+            positioner.startContinuousMove(axisNo, 0, backward)
+            self.latency += self.smoothing * (monotonic() - sent -
+                                              self.latency)
+        return polls, reason
+
+    def _fine(self, axisNo, target, tolerance, deadline):
+        # Automatic mode until the target flag, an abort, the deadline or,
+        # with single steps enabled, a stall. Returns the position, the
+        # reason ('stalled' to go on with single steps) and the polls.
+        positioner = self.positioner
+        poller = positioner.defaultPoller()
+        getPosition = poller.getPosition
+        getAxisStatus = poller.getAxisStatus
+        monotonic = time.monotonic
+        if tolerance is not None:
+            positioner.setTargetRange(axisNo, tolerance)
+        positioner.setTargetPosition(axisNo, target)
+        positioner.startAutoMove(axisNo, 1, 0)
+
+        polls = 0
+        position = last = velocity = best = None
+        progress = monotonic()
+        while True:
+            status = getAxisStatus(axisNo)
+            new = getPosition(axisNo)
+            now = monotonic()
+            polls += 1
+            if position is not None and now > last:
+                velocity = abs(new - position) / (now - last)
+            position, last = new, now
+            error = abs(target - position)
+            if best is None or error < 0.9 * best:
+                best, progress = error, now
+            width = self.stepWidth.get(axisNo)
+
+            reason = 'target' if status.target else \
+                'eot_fwd' if status.eot_fwd else \
+                'eot_bwd' if status.eot_bwd else \
+                'error' if status.error else None
+            if reason is None and deadline is not None and now >= deadline:
+                reason = 'timeout'
+            if reason is None and self.steps and (
+                    now - progress >= self.stall or
+                    (width is not None and
+                     error <= self.step_range * width)):
+                reason = 'stalled'
+            if reason is not None:
+                if reason != 'target':
+                    positioner.startAutoMove(axisNo, 0, 0)
+                return position, reason, polls
+
+            interval = self.max_interval if not velocity else \
+                min(self.max_interval,
+                    max(self.min_interval, 0.5 * error / velocity))
+            if self.steps:
+                interval = min(interval, self.stall)
+            if deadline is not None:
+                interval = min(interval, max(deadline - now, 0.0))
+            time.sleep(interval)
+
+    def _step(self, axisNo, target, tolerance, position, deadline):
+        # Single steps towards the target until it is settled, the steps
+        # are used up or the deadline passes. Returns the position, the
+        # reason and the polls.
+        positioner = self.positioner
+        polls = 0
+
+        def settled():
+            # Within the tolerance, or as close as single steps get
+            error = abs(target - position)
+            width = self.stepWidth.get(axisNo)
+            return (tolerance is not None and error <= tolerance) or \
+                (width is not None and error < 0.5 * width)
+
+        for _ in range(self.steps):
+            if settled() or (deadline is not None and
+                             time.monotonic() >= deadline):
+                break
+            error = target - position
+            positioner.startSingleStep(axisNo, int(error < 0))
+            time.sleep(self.min_interval)
+            new = positioner.getPosition(axisNo)
+            polls += 1
+            if new != position:
+                self._learn(self.stepWidth, axisNo, abs(new - position))
+            position = new
+        return position, 'target' if settled() else 'timeout', polls
@@ -0,0 +1,746 @@
+# -*- coding: utf-8 -*-
+'''
+In-process simulation of the ANC350 library (libanc350v4.so / anc350v4.dll).
+
+A SimulatedANC350 instance exposes every ANC_* symbol bound by
+Positioner_ANC350 as a real ctypes function pointer, so the wrapper runs
+unchanged on top of it (including .errcheck/.argtypes handling and the GIL
+release around foreign calls). The simulated devices model axis motion,
+the status flags returned by ANC_getAxisStatus, LUT loading and the ANC_RC
+return codes. A configurable per-call latency reproduces USB or LAN
+round-trip times.
+
+Select it with load_ANC350dll(backend='sim'), with the environment variable
+ANC350_BACKEND=sim or by passing an instance as backend=.
+'''
+
+import collections
+import ctypes
+import itertools
+import math
+import os
+import threading
+import time
+
+# Return codes, from anc350res.h
+ANC_Ok = 0
+ANC_Error = -1
+ANC_Timeout = 1
+ANC_NotConnected = 2
+ANC_DriverError = 3
+ANC_DeviceLocked = 7
+ANC_Unknown = 8
+ANC_NoDevice = 9
+ANC_NoAxis = 10
+ANC_OutOfRange = 11
+ANC_NotAvailable = 12
+ANC_FileError = 13
+
+
+_FUNCTION = ctypes.CFUNCTYPE(ctypes.c_int)
+# Exception raised by the simulation in the current thread, see _SimFunction
+_pending = threading.local()
+
+
+def _reraise(result, func, args):
+    exc = getattr(_pending, 'exc', None)
+    if exc is not None:
+        _pending.exc = None
+        raise exc
+    return result
+
+
+class _SimFunction(_FUNCTION):
+    # Simulated functions report errors by their return code, an exception
+    # is a bug of the simulation. Exceptions can not pass the C callback of
+    # a simulated function, so the callback keeps them per thread and errcheck, which runs in the caller
+    # after the call, re-raises them before any errcheck set by the user.
+    _flags_ = _FUNCTION._flags_
+    _restype_ = ctypes.c_int
+
+    @property
+    def errcheck(self):
+        return _FUNCTION.errcheck.__get__(self)
+
+    @errcheck.setter
+    def errcheck(self, errcheck):
+        def check(result, func, args):
+            _reraise(result, func, args)
+            return errcheck(result, func, args)
+        _FUNCTION.errcheck.__set__(self, check)
+
+
+# Per-call latencies in s. 'default' applies to every function not listed.
+LATENCY_PROFILES = {
+    'none': {},
+    'usb': {'default': 250e-6,
+            'ANC_discover': 0.3,
+            'ANC_connect': 0.05,
+            'ANC_loadLutFile': 0.1,
+            'ANC_saveParams': 0.2,
+            'ANC_measureCapacitance': 2.0},
+    'lan': {'default': 1.2e-3,
+            'ANC_discover': 2.0,
+            'ANC_connect': 0.2,
+            'ANC_loadLutFile': 0.3,
+            'ANC_saveParams': 0.2,
+            'ANC_measureCapacitance': 2.0},
+}
+
+# Actuator presets as listed in Positioner_ANC350.selectActuator:
+# (name, type {0: linear, 1: goniometer, 2: rotator})
+ACTUATORS = [
+    ('ANPx51', 0), ('ANPz51', 0), ('ANPz51ext', 0), ('ANPx101', 0),
+    ('ANPz101', 0), ('ANPz102', 0), ('ANPz101ext', 0), ('ANPz111', 0),
+    ('ANPx111', 0), ('ANPx121', 0), ('ANPx311', 0), ('ANPx321', 0),
+    ('ANPx341', 0), ('ANGt101', 1), ('ANGp101', 1), ('ANR101', 2),
+    ('ANR51', 2), ('ANR200', 2), ('ANR220', 2)]
+
+# Step width at 30 V amplitude and travel range per actuator type, in m or
+# deg. Rotators have endless travel.
+_STEP_30V = (50e-9, 50e-6, 500e-6)
+_TRAVEL = ((-2.5e-3, 2.5e-3), (-5.0, 5.0), None)
+
+# Closed loop (auto move) runs at a fraction of the open loop speed and
+# approaches the target with a first order decay of rate _AUTO_GAIN [1/s].
+_AUTO_SPEED = 0.5
+_AUTO_GAIN = 20.0
+
+
+class _SimAxis:
+    '''
+    State and motion model of one positioner axis.
+    '''
+    def __init__(self, axisNo):
+        self.actuator = 3
+        self.position = 0.0
+        self.target = 0.0
+        self.targetRange = 100e-9
+        self.targetGround = False
+        self.amplitude = 30.0
+        self.frequency = 1000.0
+        self.dcVoltage = 0.0
+        self.output = False
+        self.autoDisable = False
+        self.auto = False
+        self.reached = False
+        self.continuous = 0
+        self.eotFwd = False
+        self.eotBwd = False
+        self.sensor = True
+        self.error = False
+        self.capacitance = 1.0e-6 + 0.1e-6 * axisNo
+        self.lutName = ''
+        self.time = time.monotonic()
+
+    @property
+    def actuatorType(self):
+        return ACTUATORS[self.actuator][1]
+
+    def stepWidth(self):
+        return _STEP_30V[self.actuatorType] * self.amplitude / 30.0
+
+    def velocity(self):
+        return self.stepWidth() * self.frequency
+
+    def advance(self, now):
+        '''
+        Integrates the motion from the last update up to now.
+        '''
+        dt = now - self.time
+        self.time = now
+        if dt <= 0 or not self.output:
+            return
+        if self.continuous:
+            self._moveTo(self.position +
+                         self.continuous * self.velocity() * dt)
+        elif self.auto and not self.reached:
+            distance = self.target - self.position
+            sign = 1.0 if distance >= 0 else -1.0
+            distance = abs(distance)
+            speed = _AUTO_SPEED * self.velocity()
+            knee = speed / _AUTO_GAIN
+            if distance > knee:
+                t_knee = (distance - knee) / speed
+                if dt <= t_knee:
+                    distance -= speed * dt
+                else:
+                    distance = knee * math.exp(-_AUTO_GAIN * (dt - t_knee))
+            else:
+                distance *= math.exp(-_AUTO_GAIN * dt)
+            self._moveTo(self.target - sign * distance)
+            if abs(self.target - self.position) <= self.targetRange:
+                self.reached = True
+                if self.targetGround:
+                    self.auto = False
+                    self.dcVoltage = 0.0
+
+    def step(self, direction):
+        if self.output:
+            self._moveTo(self.position + direction * self.stepWidth())
+
+    def moving(self):
+        return bool(self.output and (self.continuous or
+                                     (self.auto and not self.reached)))
+
+    def _moveTo(self, position):
+        travel = _TRAVEL[self.actuatorType]
+        self.eotFwd = self.eotBwd = False
+        if travel is not None:
+            if position >= travel[1]:
+                position = travel[1]
+                self.eotFwd = True
+            elif position <= travel[0]:
+                position = travel[0]
+                self.eotBwd = True
+            if self.eotFwd or self.eotBwd:
+                self.continuous = 0
+                if self.autoDisable:
+                    self.output = False
+        else:
+            position %= 360.0
+        self.position = position
+
+
+class _SimDevice:
+    '''
+    State of one simulated ANC350 controller.
+    '''
+    def __init__(self, serialNo, address='USB', devType=0, id_=0,
+                 features=0x0F, firmware=0x0200):
+        self.serialNo = serialNo
+        self.address = address
+        self.devType = devType
+        self.id = id_
+        self.features = features
+        self.firmware = firmware
+        self.handle = None
+        self.axes = [_SimAxis(axisNo) for axisNo in range(3)]
+        self.lock = threading.Lock()
+
+    @property
+    def usb(self):
+        return self.address == 'USB'
+
+
+class SimulatedANC350:
+    '''
+    Stand-in for the ctypes library handle returned by load_ANC350dll.
+
+    Parameters
+    ----------
+    devices : int or list of dict
+        Number of simulated devices, or one dict of _SimDevice keyword
+        arguments (serialNo, address, devType, id_, features, firmware) per
+        device. Default: 1
+    latency : str, float or dict
+        Per-call latency: a key of LATENCY_PROFILES ('none', 'usb', 'lan'),
+        a time in s applied to every call, or a dict mapping function names
+        (and 'default') to times in s. Default: 'none'
+    lutSupport : bool
+        If the ANC_getLutName symbol is exported, as in recent libraries.
+        Default: True
+    '''
+    # Function signatures for decoding the arguments in the simulation.
+    # Out strings are passed as plain addresses.
+    _SIGNATURES = {
+        'ANC_configureAQuadBIn': (ctypes.c_void_p, ctypes.c_uint,
+                                  ctypes.c_int, ctypes.c_double),
+        'ANC_configureAQuadBOut': (ctypes.c_void_p, ctypes.c_uint,
+                                   ctypes.c_int, ctypes.c_double,
+                                   ctypes.c_double),
+        'ANC_configureExtTrigger': (ctypes.c_void_p, ctypes.c_uint,
+                                    ctypes.c_uint),
+        'ANC_configureNslTrigger': (ctypes.c_void_p, ctypes.c_int),
+        'ANC_configureNslTriggerAxis': (ctypes.c_void_p, ctypes.c_uint),
+        'ANC_configureRngTrigger': (ctypes.c_void_p, ctypes.c_uint,
+                                    ctypes.c_uint, ctypes.c_uint),
+        'ANC_configureRngTriggerEps': (ctypes.c_void_p, ctypes.c_uint,
+                                       ctypes.c_uint),
+        'ANC_configureRngTriggerPol': (ctypes.c_void_p, ctypes.c_uint,
+                                       ctypes.c_uint),
+        'ANC_connect': (ctypes.c_uint, ctypes.POINTER(ctypes.c_void_p)),
+        'ANC_disconnect': (ctypes.c_void_p,),
+        'ANC_discover': (ctypes.c_uint, ctypes.POINTER(ctypes.c_uint)),
+        'ANC_getActuatorName': (ctypes.c_void_p, ctypes.c_uint,
+                                ctypes.c_void_p),
+        'ANC_getActuatorType': (ctypes.c_void_p, ctypes.c_uint,
+                                ctypes.POINTER(ctypes.c_int)),
+        'ANC_getAmplitude': (ctypes.c_void_p, ctypes.c_uint,
+                             ctypes.POINTER(ctypes.c_double)),
+        'ANC_getAxisStatus': (ctypes.c_void_p, ctypes.c_uint) +
+                             (ctypes.POINTER(ctypes.c_int),) * 7,
+        'ANC_getDcVoltage': (ctypes.c_void_p, ctypes.c_uint,
+                             ctypes.POINTER(ctypes.c_double)),
+        'ANC_getDeviceConfig': (ctypes.c_void_p,
+                                ctypes.POINTER(ctypes.c_uint)),
+        'ANC_getDeviceInfo': (ctypes.c_uint, ctypes.POINTER(ctypes.c_int),
+                              ctypes.POINTER(ctypes.c_int), ctypes.c_void_p,
+                              ctypes.c_void_p, ctypes.POINTER(ctypes.c_int)),
+        'ANC_getFirmwareVersion': (ctypes.c_void_p,
+                                   ctypes.POINTER(ctypes.c_int)),
+        'ANC_getFrequency': (ctypes.c_void_p, ctypes.c_uint,
+                             ctypes.POINTER(ctypes.c_double)),
+        'ANC_getLutName': (ctypes.c_void_p, ctypes.c_uint, ctypes.c_void_p),
+        'ANC_getPosition': (ctypes.c_void_p, ctypes.c_uint,
+                            ctypes.POINTER(ctypes.c_double)),
+        'ANC_loadLutFile': (ctypes.c_void_p, ctypes.c_uint, ctypes.c_char_p),
+        'ANC_measureCapacitance': (ctypes.c_void_p, ctypes.c_uint,
+                                   ctypes.POINTER(ctypes.c_double)),
+        'ANC_registerExternalIp': (ctypes.c_char_p,),
+        'ANC_saveParams': (ctypes.c_void_p,),
+        'ANC_selectActuator': (ctypes.c_void_p, ctypes.c_uint,
+                               ctypes.c_uint),
+        'ANC_setAmplitude': (ctypes.c_void_p, ctypes.c_uint, ctypes.c_double),
+        'ANC_setAxisOutput': (ctypes.c_void_p, ctypes.c_uint, ctypes.c_int,
+                              ctypes.c_int),
+        'ANC_setDcVoltage': (ctypes.c_void_p, ctypes.c_uint, ctypes.c_double),
+        'ANC_setFrequency': (ctypes.c_void_p, ctypes.c_uint, ctypes.c_double),
+        'ANC_setTargetGround': (ctypes.c_void_p, ctypes.c_uint, ctypes.c_int),
+        'ANC_setTargetPosition': (ctypes.c_void_p, ctypes.c_uint,
+                                  ctypes.c_double),
+        'ANC_setTargetRange': (ctypes.c_void_p, ctypes.c_uint,
+                               ctypes.c_double),
+        'ANC_startAutoMove': (ctypes.c_void_p, ctypes.c_uint, ctypes.c_int,
+                              ctypes.c_int),
+        'ANC_startContinousMove': (ctypes.c_void_p, ctypes.c_uint,
+                                   ctypes.c_int, ctypes.c_int),
+        'ANC_startSingleStep': (ctypes.c_void_p, ctypes.c_uint,
+                                ctypes.c_int),
+    }
+
+    # Found in non-res products, answered with ANC_NotAvailable
+    _NOT_AVAILABLE = ('ANC_configureDutyCycle', 'ANC_enableRefAutoReset',
+                      'ANC_enableRefAutoUpdate', 'ANC_enableSensor',
+                      'ANC_enableTrace', 'ANC_getRefPosition',
+                      'ANC_moveReference', 'ANC_resetPosition')
+
+    def __init__(self, devices=1, latency='none', lutSupport=True):
+        if isinstance(devices, int):
+            devices = [{'serialNo': 'L{:06d}'.format(10001 + i),
+                        'id_': 10001 + i}
+                       for i in range(devices)]
+        self.devices = [_SimDevice(**spec) for spec in devices]
+        self.setLatency(latency)
+        self.calls = collections.Counter()
+        self._found = []
+        self._registered = []
+        self._handles = {}
+        self._nextHandle = itertools.count(0x1000, 0x10)
+        self._faults = {}
+        self._lock = threading.Lock()
+        # The callbacks must stay referenced as long as the pointers exist
+        self._callbacks = []
+
+        for name, argtypes in self._SIGNATURES.items():
+            if name == 'ANC_getLutName' and not lutSupport:
+                continue
+            self._export(name, argtypes, getattr(self, '_' + name[4:]))
+        for name in self._NOT_AVAILABLE:
+            self._export(name, (ctypes.c_void_p,), self._notAvailable)
+
+    def setLatency(self, latency):
+        '''
+        Changes the simulated per-call latency, see SimulatedANC350.
+        '''
+        if isinstance(latency, str):
+            latency = LATENCY_PROFILES[latency]
+        elif not isinstance(latency, dict):
+            latency = {'default': float(latency)}
+        self.latency = dict(latency)
+
+    def injectError(self, name, retCode, count=1):
+        '''
+        Makes the next count calls of function name return retCode without
+        any effect on the simulated devices.
+        '''
+        self._faults[name] = (retCode, count)
+
+    def _export(self, name, argtypes, impl):
+        takesHandle = argtypes[0] is ctypes.c_void_p
+        takesDevNo = name in ('ANC_connect', 'ANC_getDeviceInfo')
+
+        def thunk(*args):
+            self.calls[name] += 1
+            try:
+                # Calls are serialized per device, others library-wide
+                if takesHandle:
+                    device = self._handles.get(args[0])
+                elif takesDevNo and args[0] < len(self._found):
+                    device = self._found[args[0]]
+                else:
+                    device = None
+                lock = device.lock if device is not None else self._lock
+                with lock:
+                    delay = self.latency.get(name,
+                                             self.latency.get('default', 0.0))
+                    if delay:
+                        time.sleep(delay)
+                    fault = self._faults.get(name)
+                    if fault is not None:
+                        retCode, count = fault
+                        if count <= 1:
+                            del self._faults[name]
+                        else:
+                            self._faults[name] = (retCode, count - 1)
+                        return retCode
+                    return impl(*args)
+            except Exception as e:
+                _pending.exc = e
+                return ANC_Error
+
+        callback = ctypes.CFUNCTYPE(ctypes.c_int, *argtypes)(thunk)
+        func = _SimFunction(ctypes.cast(callback, ctypes.c_void_p).value)
+        func.errcheck = _reraise
+        func.__name__ = name
+        self._callbacks.append(callback)
+        setattr(self, name, func)
+
+    def _device(self, handle):
+        return self._handles.get(handle)
+
+    def _axis(self, handle, axisNo):
+        device = self._handles.get(handle)
+        if device is None:
+            return None, ANC_NoDevice
+        if axisNo > 2:
+            return None, ANC_NoAxis
+        axis = device.axes[axisNo]
+        axis.advance(time.monotonic())
+        return axis, ANC_Ok
+
+    @staticmethod
+    def _putString(address, value, size=16):
+        if address:
+            data = value.encode('utf-8')[:size - 1] + b'\0'
+            ctypes.memmove(address, data, len(data))
+
+    def _notAvailable(self, *args):
+        return ANC_NotAvailable
+
+    # Library functions, in the order of anc350res.h
+
+    def _discover(self, ifaces, devCount):
+        if self._handles:
+            return ANC_Error
+        self._found = [device for device in self.devices
+                       if (device.usb and ifaces & 1) or
+                       (not device.usb and ifaces & 2)]
+        if devCount:
+            devCount[0] = len(self._found)
+        return ANC_Ok
+
+    def _registerExternalIp(self, hostname):
+        if not hostname:
+            return ANC_NoDevice
+        self._registered.append(hostname.decode('utf-8'))
+        return ANC_Ok
+
+    def _getDeviceInfo(self, devNo, devType, id_, serialNo, address,
+                       connected):
+        if devNo >= len(self._found):
+            return ANC_NoDevice
+        device = self._found[devNo]
+        if devType:
+            devType[0] = device.devType
+        if id_:
+            id_[0] = device.id
+        self._putString(serialNo, device.serialNo)
+        self._putString(address, device.address)
+        if connected:
+            connected[0] = int(device.handle is not None)
+        return ANC_Ok
+
+    def _connect(self, devNo, handle):
+        if devNo >= len(self._found):
+            return ANC_NoDevice
+        device = self._found[devNo]
+        if device.handle is not None:
+            return ANC_DeviceLocked
+        device.handle = next(self._nextHandle)
+        self._handles[device.handle] = device
+        handle[0] = device.handle
+        return ANC_Ok
+
+    def _disconnect(self, handle):
+        device = self._handles.pop(handle, None)
+        if device is None:
+            return ANC_NoDevice
+        device.handle = None
+        return ANC_Ok
+
+    def _getDeviceConfig(self, handle, features):
+        device = self._device(handle)
+        if device is None:
+            return ANC_NoDevice
+        features[0] = device.features
+        return ANC_Ok
+
+    def _getAxisStatus(self, handle, axisNo, connected, enabled, moving,
+                       target, eotFwd, eotBwd, error):
+        axis, rc = self._axis(handle, axisNo)
+        if axis is None:
+            return rc
+        for ptr, value in ((connected, axis.sensor),
+                           (enabled, axis.output),
+                           (moving, axis.moving()),
+                           (target, axis.reached),
+                           (eotFwd, axis.eotFwd),
+                           (eotBwd, axis.eotBwd),
+                           (error, axis.error)):
+            if ptr:
+                ptr[0] = int(value)
+        return ANC_Ok
+
+    def _setAxisOutput(self, handle, axisNo, enable, autoDisable):
+        axis, rc = self._axis(handle, axisNo)
+        if axis is None:
+            return rc
+        axis.output = bool(enable)
+        axis.autoDisable = bool(autoDisable)
+        return ANC_Ok
+
+    def _setAmplitude(self, handle, axisNo, amplitude):
+        axis, rc = self._axis(handle, axisNo)
+        if axis is None:
+            return rc
+        if not 0.0 <= amplitude <= 70.0:
+            return ANC_OutOfRange
+        axis.amplitude = round(amplitude, 3)
+        return ANC_Ok
+
+    def _setFrequency(self, handle, axisNo, frequency):
+        axis, rc = self._axis(handle, axisNo)
+        if axis is None:
+            return rc
+        if not 1.0 <= frequency <= 5000.0:
+            return ANC_OutOfRange
+        axis.frequency = float(round(frequency))
+        return ANC_Ok
+
+    def _setDcVoltage(self, handle, axisNo, voltage):
+        axis, rc = self._axis(handle, axisNo)
+        if axis is None:
+            return rc
+        if not 0.0 <= voltage <= 60.0:
+            return ANC_OutOfRange
+        axis.dcVoltage = round(voltage, 3)
+        return ANC_Ok
+
+    def _getAmplitude(self, handle, axisNo, amplitude):
+        axis, rc = self._axis(handle, axisNo)
+        if axis is None:
+            return rc
+        amplitude[0] = axis.amplitude
+        return ANC_Ok
+
+    def _getFrequency(self, handle, axisNo, frequency):
+        axis, rc = self._axis(handle, axisNo)
+        if axis is None:
+            return rc
+        frequency[0] = axis.frequency
+        return ANC_Ok
+
+    def _startSingleStep(self, handle, axisNo, backward):
+        axis, rc = self._axis(handle, axisNo)
+        if axis is None:
+            return rc
+        axis.auto = False
+        axis.continuous = 0
+        axis.step(-1 if backward else 1)
+        return ANC_Ok
+
+    def _startContinousMove(self, handle, axisNo, start, backward):
+        axis, rc = self._axis(handle, axisNo)
+        if axis is None:
+            return rc
+        axis.auto = False
+        axis.continuous = (-1 if backward else 1) if start else 0
+        return ANC_Ok
+
+    def _startAutoMove(self, handle, axisNo, enable, relative):
+        axis, rc = self._axis(handle, axisNo)
+        if axis is None:
+            return rc
+        axis.continuous = 0
+        axis.auto = bool(enable)
+        axis.reached = False
+        if enable and relative:
+            axis.target += axis.position
+        return ANC_Ok
+
+    def _setTargetPosition(self, handle, axisNo, target):
+        axis, rc = self._axis(handle, axisNo)
+        if axis is None:
+            return rc
+        axis.target = target
+        axis.reached = False
+        return ANC_Ok
+
+    def _setTargetRange(self, handle, axisNo, targetRg):
+        axis, rc = self._axis(handle, axisNo)
+        if axis is None:
+            return rc
+        if targetRg < 0:
+            return ANC_OutOfRange
+        axis.targetRange = targetRg
+        return ANC_Ok
+
+    def _getPosition(self, handle, axisNo, position):
+        axis, rc = self._axis(handle, axisNo)
+        if axis is None:
+            return rc
+        position[0] = axis.position
+        return ANC_Ok
+
+    def _getFirmwareVersion(self, handle, version):
+        device = self._device(handle)
+        if device is None:
+            return ANC_NoDevice
+        version[0] = device.firmware
+        return ANC_Ok
+
+    def _configureExtTrigger(self, handle, axisNo, mode):
+        axis, rc = self._axis(handle, axisNo)
+        if axis is None:
+            return rc
+        return ANC_Ok if mode <= 2 else ANC_OutOfRange
+
+    def _configureAQuadBIn(self, handle, axisNo, enable, resolution):
+        axis, rc = self._axis(handle, axisNo)
+        return rc
+
+    def _configureAQuadBOut(self, handle, axisNo, enable, resolution, clock):
+        axis, rc = self._axis(handle, axisNo)
+        if axis is None:
+            return rc
+        return ANC_Ok if 40e-9 <= clock <= 1.3e-3 else ANC_OutOfRange
+
+    def _configureRngTriggerPol(self, handle, axisNo, polarity):
+        axis, rc = self._axis(handle, axisNo)
+        return rc
+
+    def _configureRngTrigger(self, handle, axisNo, lower, upper):
+        axis, rc = self._axis(handle, axisNo)
+        return rc
+
+    def _configureRngTriggerEps(self, handle, axisNo, epsilon):
+        axis, rc = self._axis(handle, axisNo)
+        return rc
+
+    def _configureNslTrigger(self, handle, enable):
+        return ANC_Ok if self._device(handle) is not None else ANC_NoDevice
+
+    def _configureNslTriggerAxis(self, handle, axisNo):
+        axis, rc = self._axis(handle, axisNo)
+        return rc
+
+    def _selectActuator(self, handle, axisNo, actuator):
+        axis, rc = self._axis(handle, axisNo)
+        if axis is None:
+            return rc
+        if actuator >= len(ACTUATORS):
+            return ANC_OutOfRange
+        axis.actuator = actuator
+        return ANC_Ok
+
+    def _getActuatorName(self, handle, axisNo, name):
+        axis, rc = self._axis(handle, axisNo)
+        if axis is None:
+            return rc
+        self._putString(name, ACTUATORS[axis.actuator][0], size=20)
+        return ANC_Ok
+
+    def _getActuatorType(self, handle, axisNo, type_):
+        axis, rc = self._axis(handle, axisNo)
+        if axis is None:
+            return rc
+        type_[0] = axis.actuatorType
+        return ANC_Ok
+
+    def _measureCapacitance(self, handle, axisNo, cap):
+        axis, rc = self._axis(handle, axisNo)
+        if axis is None:
+            return rc
+        cap[0] = axis.capacitance
+        return ANC_Ok
+
+    def _saveParams(self, handle):
+        return ANC_Ok if self._device(handle) is not None else ANC_NoDevice
+
+    def _setTargetGround(self, handle, axisNo, targetGnd):
+        axis, rc = self._axis(handle, axisNo)
+        if axis is None:
+            return rc
+        axis.targetGround = bool(targetGnd)
+        return ANC_Ok
+
+    def _getDcVoltage(self, handle, axisNo, dcvolt):
+        axis, rc = self._axis(handle, axisNo)
+        if axis is None:
+            return rc
+        dcvolt[0] = axis.dcVoltage
+        return ANC_Ok
+
+    def _loadLutFile(self, handle, axisNo, fileName):
+        axis, rc = self._axis(handle, axisNo)
+        if axis is None:
+            return rc
+        if self._handles[handle].devType != 0:
+            return ANC_NotAvailable
+        # 'key value' header lines, e.g. serial and ver, followed by one
+        # integer per line, see ANC350.lut
+        header = {}
+        values = []
+        try:
+            with open(fileName.decode('utf-8')) as lut:
+                for line in lut:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    if values or line.lstrip('+-').isdigit():
+                        values.append(int(line))
+                    else:
+                        key, _, value = line.partition(' ')
+                        header[key] = value.strip()
+        except (OSError, ValueError):
+            return ANC_FileError
+        if not header.get('serial') or not values:
+            return ANC_FileError
+        axis.lutName = header['serial']
+        return ANC_Ok
+
+    def _getLutName(self, handle, axisNo, name):
+        axis, rc = self._axis(handle, axisNo)
+        if axis is None:
+            return rc
+        if self._handles[handle].devType != 0:
+            return ANC_NotAvailable
+        self._putString(name, axis.lutName, size=20)
+        return ANC_Ok
+
+
+_default = None
+
+
+def default_simulator():
+    '''
+    Returns the process-wide simulator used for backend='sim'. It is created
+    on first use from the environment variables ANC350_SIM_DEVICES (number
+    of devices, default 1) and ANC350_SIM_LATENCY (profile name or time in
+    s, default 'none').
+
+    Returns
+    -------
+    sim : SimulatedANC350
+        Shared simulator instance
+    '''
+    global _default
+    if _default is None:
+        latency = os.environ.get('ANC350_SIM_LATENCY', 'none')
+        if latency not in LATENCY_PROFILES:
+            latency = float(latency)
+        _default = SimulatedANC350(
+            devices=int(os.environ.get('ANC350_SIM_DEVICES', '1')),
+            latency=latency)
+    return _default
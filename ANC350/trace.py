@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+'''
+Record and replay of the dll traffic of Positioner_ANC350.
+
+A trace file starts with a header naming the functions, followed by
+fixed-size little-endian records of RECORD_SIZE bytes:
+
+    function id    uint16  index into the function names of the header
+    return code    int16
+    device         uint16  device number of the positioner
+    inputs         uint8   number of input arguments
+    outputs        uint8   number of output values
+    start, end     int64   monotonic time in ns since the trace started
+    args           4 x float64  input arguments without the device handle
+    values         7 x float64  output values after the call
+
+Strings, e.g. actuator or file names, are stored once in string records
+(function id STRING_ID) and referenced by their number. Records are
+streamed through a buffered file, so the trace can be read, and replayed
+against another backend, while it is still being recorded.
+
+Example
+-------
+positioner.recordTrace('session.anctrace')
+...
+positioner.traceWriter.close()
+replay('session.anctrace', backend=SimulatedANC350(), speed=10)
+'''
+
+import collections
+import ctypes
+import json
+import struct
+import threading
+import time
+
+from .PylibANC350 import (_DEVHDL, _PROTOTYPES, ANCError, discover_ANC350,
+                          function_table, load_ANC350dll)
+
+MAGIC = b'ANC350TR'
+VERSION = 1
+STRING_ID = 0xFFFF
+
+_HEADER = struct.Struct('<8sHHI')
+_RECORD = struct.Struct('<HhHBBqq4d7d')
+# String chunk: function id, 0, chunk index, chunk length, 0, string
+# number, string length, chunk
+_STRING = struct.Struct('<HhHBBqq88s')
+RECORD_SIZE = _RECORD.size
+
+_FUNCTIONS = tuple(name for name, argtypes in _PROTOTYPES)
+_ARGTYPES = dict(_PROTOTYPES)
+_NAN = float('nan')
+_CArgObject = type(ctypes.byref(ctypes.c_int()))
+
+# functions: function names by id, records: numpy structured array
+# without the string records, strings: list of str by number, info: dict
+# of the header
+Trace = collections.namedtuple('Trace', 'functions records strings info')
+# calls: number of calls replayed, errors: calls that raised, mismatches:
+# calls whose return code differs from the trace, elapsed: replay time in
+# s, duration: time span of the trace in s
+ReplayResult = collections.namedtuple(
+    'ReplayResult', 'calls errors mismatches elapsed duration')
+
+
+def _trace_dtype():
+    import numpy as np
+    return np.dtype([('func', '<u2'), ('ret_code', '<i2'),
+                     ('device', '<u2'), ('inputs', 'u1'), ('outputs', 'u1'),
+                     ('start', '<i8'), ('end', '<i8'),
+                     ('args', '<f8', (4,)), ('values', '<f8', (7,))])
+
+
+class TraceWriter:
+    '''
+    Writer of a trace file, shared by all positioners recording to it.
+    '''
+    def __init__(self, fileName, info=None):
+        '''
+        Parameters
+        ----------
+        fileName : str
+            Name of the trace file, overwritten if it exists
+        info : dict
+            JSON-serialisable description stored in the header.
+            Default: None
+        '''
+        header = json.dumps({'functions': _FUNCTIONS,
+                             'created': time.time(),
+                             'info': info or {}}).encode('utf-8')
+        self.fileName = fileName
+        self.records = 0
+        self._file = open(fileName, 'wb')
+        self._file.write(_HEADER.pack(MAGIC, VERSION, RECORD_SIZE,
+                                      len(header)))
+        self._file.write(header)
+        self._ids = {name: funcId for funcId, name in enumerate(_FUNCTIONS)}
+        self._strings = {}
+        self._lock = threading.Lock()
+        self._start = time.perf_counter_ns()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def flush(self):
+        '''
+        Writes the buffered records to the file.
+        '''
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        '''
+        Flushes and closes the file. Calls of wrapped functions after
+        closing are no longer recorded.
+        '''
+        with self._lock:
+            self._file.close()
+
+    def wrap(self, func, name, device=0):
+        '''
+        Returns func wrapped to record its calls.
+
+        Parameters
+        ----------
+        func : callable
+            dll function
+        name : str
+            Name of the function, e.g. 'ANC_getPosition'
+        device : int
+            Device number stored in the records. Default: 0
+
+        Returns
+        -------
+        wrapper : callable
+            Function with the same signature and errors as func
+        '''
+        funcId = self._ids[name]
+        argtypes = _ARGTYPES[name]
+        skip = 1 if argtypes and argtypes[0] is _DEVHDL else 0
+        clock = time.perf_counter_ns
+        record = self._record
+
+        def wrapper(*args):
+            start = clock()
+            try:
+                result = func(*args)
+            except ANCError as error:
+                record(funcId, error.ret_code, device, start, clock(),
+                       args[skip:])
+                raise
+            record(funcId, 0, device, start, clock(), args[skip:])
+            return result
+        wrapper.__name__ = name
+        wrapper.__wrapped__ = func
+        return wrapper
+
+    def _record(self, funcId, ret_code, device, start, end, args):
+        inputs = []
+        values = []
+        with self._lock:
+            if self._file.closed:
+                return
+            for arg in args:
+                if isinstance(arg, _CArgObject):
+                    values.append(self._value(arg._obj.value))
+                else:
+                    inputs.append(self._value(getattr(arg, 'value', arg)))
+            n_inputs, n_values = len(inputs), len(values)
+            inputs += [_NAN] * (4 - n_inputs)
+            values += [_NAN] * (7 - n_values)
+            self._file.write(_RECORD.pack(funcId, ret_code, device, n_inputs,
+                                          n_values, start - self._start,
+                                          end - self._start, *inputs,
+                                          *values))
+            self.records += 1
+
+    def _value(self, value):
+        # Numbers are stored as float, strings by number
+        if value is None:
+            return _NAN
+        if not isinstance(value, bytes):
+            return float(value)
+        number = self._strings.get(value)
+        if number is None:
+            number = self._strings[value] = len(self._strings)
+            for index in range(0, max(len(value), 1), 88):
+                chunk = value[index:index + 88]
+                self._file.write(_STRING.pack(STRING_ID, 0, index // 88,
+                                              len(chunk), 0, number,
+                                              len(value), chunk))
+        return float(number)
+
+
+def read_trace(fileName):
+    '''
+    Reads a trace file. A partly written last record of a trace still
+    being recorded is ignored.
+
+    Parameters
+    ----------
+    fileName : str
+        Name of the trace file
+
+    Returns
+    -------
+    trace : Trace
+        Function names, call records, strings and header
+    '''
+    import numpy as np
+    with open(fileName, 'rb') as f:
+        data = f.read()
+    magic, version, recordSize, length = _HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION or recordSize != RECORD_SIZE:
+        raise ValueError('{} is not a version {} ANC350 trace'.format(
+            fileName, VERSION))
+    info = json.loads(data[_HEADER.size:_HEADER.size + length])
+    offset = _HEADER.size + length
+    count = (len(data) - offset) // RECORD_SIZE
+    records = np.frombuffer(data, _trace_dtype(), count, offset)
+
+    chunks = {}
+    isString = records['func'] == STRING_ID
+    for index in np.flatnonzero(isString):
+        _, _, chunk, size, _, number, _, payload = _STRING.unpack_from(
+            data, offset + index * RECORD_SIZE)
+        chunks.setdefault(number, []).append((chunk, payload[:size]))
+    strings = [b''.join(payload for _, payload in sorted(chunks[number]))
+               .decode('utf-8', 'replace') for number in sorted(chunks)]
+    return Trace(tuple(info['functions']), records[~isString], strings,
+                 info)
+
+
+def replay(fileName, backend=None, speed=1.0, discover=True):
+    '''
+    Replays the calls of a trace against a backend, e.g. a simulator, with
+    the original timing or accelerated. Device handles are taken from the
+    replayed ANC_connect calls; devices whose trace starts after the
+    connection are connected before their first call.
+
+    Parameters
+    ----------
+    fileName : str
+        Name of the trace file
+    backend : str or object
+        Library backend, see load_ANC350dll. Default: None
+    speed : float
+        Speed-up relative to the original timing, None to replay as fast
+        as possible. Default: 1.0
+    discover : bool
+        Run discover_ANC350 first, as a traced session starts after it.
+        Default: True
+
+    Returns
+    -------
+    result : ReplayResult
+        Number of calls, errors and return code mismatches, and timing
+    '''
+    trace = read_trace(fileName)
+    anc = load_ANC350dll(backend)
+    table = function_table(anc)
+    if discover:
+        discover_ANC350(3, anc, verbose=False)
+
+    handles = {}
+    calls = errors = mismatches = 0
+    start = time.perf_counter()
+    for record in trace.records:
+        name = trace.functions[record['func']]
+        func = table.get('_' + name[4:] + '_dll')
+        argtypes = _ARGTYPES.get(name)
+        if func is None or argtypes is None:
+            continue
+        if speed:
+            delay = start + record['start'] * 1e-9 / speed - \
+                time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        device = int(record['device'])
+        if argtypes[0] is _DEVHDL and device not in handles:
+            handle = _DEVHDL()
+            table['_connect_dll'](device, ctypes.byref(handle))
+            handles[device] = handle
+        args, outputs = _replay_args(argtypes, record, trace.strings,
+                                     handles)
+        try:
+            func(*args)
+            ret_code = 0
+        except ANCError as error:
+            ret_code = error.ret_code
+            errors += 1
+        calls += 1
+        if ret_code != record['ret_code']:
+            mismatches += 1
+        if name == 'ANC_connect' and ret_code == 0:
+            handles[device] = outputs[0]
+        elif name == 'ANC_disconnect':
+            handles.pop(device, None)
+    duration = 0.0 if len(trace.records) == 0 else \
+        (trace.records['end'].max() - trace.records['start'].min()) * 1e-9
+    return ReplayResult(calls, errors, mismatches,
+                        time.perf_counter() - start, float(duration))
+
+
+def _replay_args(argtypes, record, strings, handles):
+    args = []
+    outputs = []
+    inputs = iter(record['args'][:record['inputs']])
+    for index, argtype in enumerate(argtypes):
+        if index == 0 and argtype is _DEVHDL:
+            args.append(handles[int(record['device'])])
+        elif argtype is ctypes.c_void_p:
+            output = ctypes.create_string_buffer(256)
+            outputs.append(output)
+            args.append(ctypes.byref(output))
+        elif hasattr(argtype, '_type_') and \
+                isinstance(argtype._type_, type):
+            output = argtype._type_()
+            outputs.append(output)
+            args.append(ctypes.byref(output))
+        elif argtype is ctypes.c_char_p:
+            args.append(strings[int(next(inputs))].encode('utf-8'))
+        elif argtype is ctypes.c_double:
+            args.append(float(next(inputs)))
+        else:
+            args.append(int(next(inputs)))
+    return args, outputs
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+'''
+Per-device worker thread serializing the dll calls of a positioner.
+
+It is not documented whether the vendor library is reentrant for one
+device handle. In the thread-safe mode of Positioner_ANC350 every dll call
+of the device is therefore executed on the worker thread of the device,
+whichever thread issued it. Different devices have different workers, and
+ctypes releases the GIL during the foreign calls, so they still run in
+parallel.
+'''
+
+import bisect
+import collections
+import concurrent.futures
+import queue
+import threading
+import time
+
+from .metrics import BUCKETS
+
+# calls: calls executed, contended: calls that had to wait for other calls,
+# wait_total, wait_max: time in s between submission and start,
+# busy_total: time in s spent executing calls, wait_buckets: wait times per
+# bucket of ANC350.metrics.BUCKETS (not cumulative), the last one above
+# BUCKETS[-1]
+WorkerStats = collections.namedtuple(
+    'WorkerStats',
+    'calls contended wait_total wait_max busy_total wait_buckets')
+
+
+class DeviceWorker:
+    '''
+    Worker thread executing calls one at a time in submission order.
+    Calls made on the worker thread itself, e.g. dll calls of a method
+    submitted to the worker, are executed directly.
+    '''
+    def __init__(self, name='ANC350-worker'):
+        '''
+        Parameters
+        ----------
+        name : str
+            Name of the thread. Default: 'ANC350-worker'
+        '''
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._closed = False
+        self._calls = 0
+        self._contended = 0
+        self._waitTotal = 0.0
+        self._waitMax = 0.0
+        self._busyTotal = 0.0
+        self._waitBuckets = [0] * (len(BUCKETS) + 1)
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name=name)
+        self._thread.start()
+        self._ident = self._thread.ident
+
+    def submit(self, func, *args):
+        '''
+        Schedules func(*args) on the worker thread. Raises RuntimeError if
+        the worker is closed.
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+            Result of the call
+        '''
+        future = concurrent.futures.Future()
+        if threading.get_ident() == self._ident:
+            try:
+                future.set_result(func(*args))
+            except BaseException as e:
+                future.set_exception(e)
+            return future
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('Worker is closed')
+            if self._pending:
+                self._contended += 1
+            self._pending += 1
+            # Queued under the lock so no call can follow the sentinel of
+            # close
+            self._queue.put((future, func, args, time.perf_counter()))
+        return future
+
+    def call(self, func, *args):
+        '''
+        Executes func(*args) on the worker thread and waits for the result.
+        '''
+        if threading.get_ident() == self._ident:
+            return func(*args)
+        return self.submit(func, *args).result()
+
+    def wrap(self, func):
+        '''
+        Returns func wrapped to run on the worker thread.
+        '''
+        call = self.call
+
+        def wrapper(*args):
+            return call(func, *args)
+        wrapper.__name__ = getattr(func, '__name__', 'wrapper')
+        wrapper.__wrapped__ = func
+        return wrapper
+
+    def stats(self):
+        '''
+        Returns the contention and queue wait statistics.
+
+        Returns
+        -------
+        stats : WorkerStats
+            Counters and times
+        '''
+        with self._lock:
+            return WorkerStats(self._calls, self._contended,
+                               self._waitTotal, self._waitMax,
+                               self._busyTotal, tuple(self._waitBuckets))
+
+    def close(self):
+        '''
+        Executes the pending calls and stops the worker thread. Later
+        calls from other threads raise RuntimeError.
+        '''
+        with self._lock:
+            if not self._closed:
+                self._closed = True
+                self._queue.put(None)
+        if threading.get_ident() != self._ident:
+            self._thread.join()
+
+    def _run(self):
+        perf_counter = time.perf_counter
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            future, func, args, submitted = item
+            start = perf_counter()
+            if future.set_running_or_notify_cancel():
+                try:
+                    result = func(*args)
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+            end = perf_counter()
+            wait = start - submitted
+            with self._lock:
+                self._pending -= 1
+                self._calls += 1
+                self._waitTotal += wait
+                self._waitMax = max(self._waitMax, wait)
+                self._busyTotal += end - start
+                self._waitBuckets[bisect.bisect_left(BUCKETS, wait)] += 1
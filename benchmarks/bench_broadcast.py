@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark of the shared-memory position broadcast.
+
+Publishes a simulated device at 1 kHz and measures the cost of the reader
+methods in this process, then runs groups of reader processes calling
+getPosition as fast as they can. The device calls per second never exceed
+those of the publisher, whatever the number of readers:
+
+    python benchmarks/bench_broadcast.py
+'''
+
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ANC350 import PylibANC350
+from ANC350.broadcast import BroadcastReader, PositionBroadcast
+from ANC350.simulator import SimulatedANC350
+
+N = 100000
+DURATION = 1.0
+READERS = (1, 8, 64)
+
+
+def per_call(function, n=N):
+    start = time.perf_counter()
+    for _ in range(n):
+        function()
+    return 1e6 * (time.perf_counter() - start) / n
+
+
+def reader(name, start, results):
+    with BroadcastReader(name) as broadcast:
+        getPosition = broadcast.getPosition
+        while time.time() < start:
+            time.sleep(1e-3)
+        reads = 0
+        end = start + DURATION
+        while time.time() < end:
+            for _ in range(100):
+                getPosition(0)
+            reads += 100
+    results.put(reads)
+
+
+def device_calls(positioner):
+    return sum(stats.calls for stats in positioner.stats().values())
+
+
+def main():
+    sim = SimulatedANC350()
+    PylibANC350.discover_ANC350(backend=sim, verbose=False)
+    positioner = PylibANC350.Positioner_ANC350(0, backend=sim, verbose=False,
+                                               metrics=True)
+    print('in-process positioner.getPosition: {:.2f} us'.format(
+        per_call(lambda: positioner.getPosition(0))))
+
+    with PositionBroadcast(positioner, rate=1000.0) as broadcast:
+        with BroadcastReader(broadcast.name) as broadcast_reader:
+            broadcast_reader.wait(timeout=1.0)
+            print('reader.getPosition: {:.2f} us'.format(
+                per_call(lambda: broadcast_reader.getPosition(0))))
+            print('reader.read:        {:.2f} us'.format(
+                per_call(broadcast_reader.read)))
+
+            def view():
+                slot, seq = broadcast_reader.view()
+                return broadcast_reader.unchanged(seq)
+            print('reader.view:        {:.2f} us'.format(per_call(view)))
+
+        print('\n{:>8} {:>16} {:>18}'.format('readers', 'reads /s',
+                                              'device calls /s'))
+        for count in READERS:
+            results = multiprocessing.Queue()
+            start = time.time() + 0.5 + 0.02 * count
+            processes = [multiprocessing.Process(
+                target=reader, args=(broadcast.name, start, results))
+                for _ in range(count)]
+            for process in processes:
+                process.start()
+            while time.time() < start:
+                time.sleep(1e-3)
+            calls = device_calls(positioner)
+            time.sleep(DURATION)
+            calls = (device_calls(positioner) - calls) / DURATION
+            reads = sum(results.get() for _ in processes) / DURATION
+            for process in processes:
+                process.join()
+            print('{:8d} {:16,.0f} {:18,.0f}'.format(count, reads, calls))
+    positioner.disconnect()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark of library loading and Positioner_ANC350 construction.
+
+Compares the per-instance binding of all ANC_* functions, as done before
+the shared function table, with the cached table. Runs on the simulated
+backend, so no controller is needed:
+
+    python benchmarks/bench_construction.py
+'''
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ANC350 import PylibANC350
+from ANC350.simulator import SimulatedANC350
+
+
+def bind_per_instance(anc):
+    '''
+    Per-instance binding as in the original Positioner_ANC350.__init__.
+    '''
+    functions = {}
+    for name, _ in PylibANC350._PROTOTYPES:
+        func = getattr(anc, name)
+        func.errcheck = PylibANC350.ANC_errcheck
+        functions['_' + name[4:] + '_dll'] = func
+    return functions
+
+
+def report(label, seconds, number):
+    print('{:<40} {:10.2f} us'.format(label, 1e6 * seconds / number))
+
+
+def main():
+    try:
+        number = 20
+        t = min(timeit.repeat(PylibANC350._load_native_dll,
+                              number=number, repeat=3))
+        report('native library load (uncached)', t, number)
+    except OSError as e:
+        print('native library not available: {}'.format(e))
+
+    sim = SimulatedANC350()
+    PylibANC350.discover_ANC350(backend=sim, verbose=False)
+
+    number = 20000
+    t = min(timeit.repeat(lambda: bind_per_instance(sim),
+                          number=number, repeat=5))
+    report('bind all functions per instance', t, number)
+    t = min(timeit.repeat(lambda: PylibANC350.function_table(sim),
+                          number=number, repeat=5))
+    report('shared function table lookup', t, number)
+    t = min(timeit.repeat(lambda: PylibANC350.load_ANC350dll(sim),
+                          number=number, repeat=5))
+    report('load_ANC350dll (cached)', t, number)
+
+    def construct():
+        positioner = PylibANC350.Positioner_ANC350(0, backend=sim,
+                                                   verbose=False)
+        positioner.disconnect()
+
+    number = 2000
+    t = min(timeit.repeat(construct, number=number, repeat=5))
+    report('Positioner_ANC350() + disconnect()', t, number)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark and round-trip check of the position logger.
+
+Logs a simulated device sampled at 5 kHz for a few seconds in every
+available format, reads the file back with open_log while the logger is
+running and after closing it, and checks that the samples and metadata
+match what was written. The hdf5 format is skipped if h5py is not
+installed:
+
+    python benchmarks/bench_datalog.py
+'''
+
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from ANC350 import PylibANC350
+from ANC350.datalog import PositionLogger, open_log
+from ANC350.sampler import PositionSampler
+from ANC350.simulator import SimulatedANC350
+
+DURATION = 3.0
+RATE = 5000.0
+
+
+def check(positioner, fileName, format):
+    sampler = PositionSampler(positioner, rate=RATE, capacity=1 << 16)
+    logger = PositionLogger(fileName, sampler, format=format, interval=0.2,
+                            metadata={'run': format})
+    start = time.perf_counter()
+    with logger:
+        time.sleep(DURATION / 2)
+        # Readable while being written
+        live, _ = open_log(fileName)
+        live_count = len(live)
+        del live
+        time.sleep(DURATION / 2)
+    elapsed = time.perf_counter() - start
+    if logger.error is not None:
+        raise logger.error
+
+    samples, metadata = open_log(fileName)
+    samples = np.asarray(samples[:])
+    expected = sampler.latest(min(sampler.count, sampler.capacity))
+    assert logger.lost == 0, logger.lost
+    assert len(samples) == logger.written == sampler.count, \
+        (len(samples), logger.written, sampler.count)
+    assert 0 < live_count <= len(samples), live_count
+    assert np.array_equal(samples[-len(expected):], expected)
+    assert np.all(np.diff(samples['time_ns']) > 0)
+    assert metadata['run'] == format
+    assert list(metadata['axes']) == list(sampler.axes)
+    size = os.path.getsize(fileName)
+    print('{:<5} {:>9,} samples {:>9,.0f} /s {:>8.1f} kB  round trip ok'
+          .format(format, len(samples), len(samples) / elapsed,
+                  size / 1e3))
+
+
+def main():
+    sim = SimulatedANC350()
+    PylibANC350.discover_ANC350(backend=sim, verbose=False)
+    positioner = PylibANC350.Positioner_ANC350(0, backend=sim, verbose=False)
+    directory = tempfile.mkdtemp()
+    check(positioner, os.path.join(directory, 'log.bin'), 'raw')
+    if importlib.util.find_spec('h5py') is None:
+        print('hdf5  skipped: h5py is not installed')
+    else:
+        check(positioner, os.path.join(directory, 'log.h5'), 'hdf5')
+    positioner.disconnect()
+
+
+if __name__ == '__main__':
+    main()
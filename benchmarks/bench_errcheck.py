@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark of the errcheck path run after every dll call.
+
+Reports the per-call overhead of ANC_errcheck on success and on failure,
+compared with the original implementation that rebuilt the return code
+table and checked the function type on each call:
+
+    python benchmarks/bench_errcheck.py
+'''
+
+import ctypes
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ANC350 import PylibANC350
+from ANC350.simulator import SimulatedANC350, ANC_Timeout
+
+
+def errcheck_original(ret_code, func, args):
+    '''
+    ANC_errcheck as it was before the precomputed success path.
+    '''
+    ANC_RC = {
+        0 : "No error",
+        -1 : "Unknown / other error",
+        1 : "Timeout during data retrieval",
+        2 : "No contact with the positioner via USB",
+        3 : "Error in the driver response",
+        7 : "A connection attempt failed because the device is already in use",
+        8 : "Unknown error",
+        9 : "Invalid device number used in call",
+        10 : "Invalid axis number in function call",
+        11 : "Parameter in call is out of range",
+        12 : "Function not available for device type",
+        13 : "Error opening or interpreting a file"}
+
+    assert isinstance(func, ctypes._CFuncPtr)
+
+    if ret_code != 0:
+        raise RuntimeError('Error: {:} '.format(ANC_RC[ret_code]) +
+                           str(func.__name__) +
+                           ' with parameters: ' + str(args))
+    return ANC_RC[ret_code]
+
+
+def per_call(func, number=200000):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+def raising(errcheck, func, args, exc_type):
+    def call():
+        try:
+            errcheck(ANC_Timeout, func, args)
+        except exc_type:
+            pass
+    return call
+
+
+def main():
+    sim = SimulatedANC350()
+    func = PylibANC350.function_table(sim)['_getPosition_dll']
+    args = (ctypes.c_void_p(0x1000), ctypes.c_uint(0),
+            ctypes.byref(ctypes.c_double()))
+
+    cases = [
+        ('original, success',
+         per_call(lambda: errcheck_original(0, func, args))),
+        ('ANC_errcheck, success',
+         per_call(lambda: PylibANC350.ANC_errcheck(0, func, args))),
+        ('original, timeout',
+         per_call(raising(errcheck_original, func, args, RuntimeError),
+                  number=20000)),
+        ('ANC_errcheck, timeout',
+         per_call(raising(PylibANC350.ANC_errcheck, func, args,
+                          PylibANC350.ANCTimeout), number=20000)),
+    ]
+    for label, t in cases:
+        print('{:<28} {:8.3f} us/call'.format(label, 1e6 * t))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark of getPosition / getAxisStatus polling.
+
+Compares the Positioner_ANC350 methods with the preallocated AxisPoller
+fast path, and getPosition with the call statistics enabled.
+
+The Python-side cost is measured against a no-op library whose ANC_*
+functions all point to the C function labs, which returns 0 (ANC_Ok) for
+the device number 0 and the NULL handle passed as first argument. The
+overhead per call is the time of a method minus that of a raw foreign call
+of labs with the same prebuilt arguments, without argtypes and errcheck.
+The cases are timed in interleaved rounds and the best round of each is
+kept, so drifts of the clock rate affect all of them alike. Calls per
+second on the simulated backend are listed as well; there the Python
+callback of the simulator dominates and hides the difference:
+
+    python benchmarks/bench_polling.py
+'''
+
+import ctypes
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ANC350 import PylibANC350
+from ANC350.simulator import SimulatedANC350
+
+REPEAT = 15
+LABELS = ('getPosition', 'AxisPoller.getPosition', 'getAxisStatus',
+          'AxisPoller.getAxisStatus', 'getPosition with metrics')
+
+
+class NoopLibrary:
+    '''
+    Library backend whose functions do nothing in C and return 0.
+    '''
+    def __init__(self):
+        libc = ctypes.cdll.msvcrt if os.name == 'nt' else ctypes.CDLL(None)
+        self.address = ctypes.cast(libc.labs, ctypes.c_void_p).value
+
+    def raw(self):
+        '''
+        Returns a plain function object of labs, without argtypes and
+        errcheck.
+        '''
+        return ctypes.CFUNCTYPE(ctypes.c_int)(self.address)
+
+    def __getattr__(self, name):
+        if not name.startswith('ANC_'):
+            raise AttributeError(name)
+        # One function object per name, as function_table sets argtypes
+        func = self.raw()
+        setattr(self, name, func)
+        return func
+
+
+def best(funcs, number=20000):
+    # Best time per call of every function over interleaved rounds
+    times = [float('inf')] * len(funcs)
+    for _ in range(REPEAT):
+        for i, func in enumerate(funcs):
+            times[i] = min(times[i], timeit.timeit(func, number=number))
+    return [t / number for t in times]
+
+
+def measure(positioner, raw=None):
+    # Time per call of every case of LABELS and, if raw is given, of the
+    # raw foreign call with the arguments of the case
+    axis = ctypes.c_uint(0)
+    position = ctypes.c_double()
+    position_args = (positioner.device, axis, ctypes.byref(position))
+    flags = [ctypes.c_int() for _ in range(7)]
+    status_args = (positioner.device, axis) + tuple(ctypes.byref(f)
+                                                    for f in flags)
+    baselines = [] if raw is None else [lambda: raw(*position_args),
+                                        lambda: raw(*status_args)]
+    poller = positioner.poller()
+    times = best([lambda: positioner.getPosition(0),
+                  lambda: poller.getPosition(0),
+                  lambda: positioner.getAxisStatus(0),
+                  lambda: poller.getAxisStatus(0)] + baselines)
+    # Pollers bind the dll functions when created, so the statistics are
+    # timed in rounds of their own
+    positioner.enableMetrics()
+    metrics = best([lambda: positioner.getPosition(0)] + baselines[:1])
+    positioner.enableMetrics(False)
+    cases = times[:4] + metrics[:1]
+    if raw is None:
+        return cases, None
+    bare_position, bare_status = times[4:]
+    return cases, [bare_position, bare_position, bare_status, bare_status,
+                   metrics[1]]
+
+
+def main():
+    library = NoopLibrary()
+    noop = PylibANC350.Positioner_ANC350(0, backend=library, verbose=False)
+    sim = SimulatedANC350()
+    PylibANC350.discover_ANC350(backend=sim, verbose=False)
+    simulated = PylibANC350.Positioner_ANC350(0, backend=sim, verbose=False)
+
+    times, bares = measure(noop, library.raw())
+    times_sim, _ = measure(simulated)
+    print('raw foreign call of labs: {:.3f} us with 3 arguments, {:.3f} us '
+          'with 9'.format(1e6 * bares[0], 1e6 * bares[2]))
+    print('{:<28} {:>14} {:>16} {:>16}'.format(
+        '', 'calls/s', 'overhead/call', 'calls/s (sim)'))
+    for label, t, bare, t_sim in zip(LABELS, times, bares, times_sim):
+        print('{:<28} {:14,.0f} {:13.3f} us {:16,.0f}'.format(
+            label, 1 / t, 1e6 * (t - bare), 1 / t_sim))
+    noop.disconnect()
+    simulated.disconnect()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark of the positioner server on localhost.
+
+Serves one simulated device (no latency) over TCP and a Unix socket and
+measures the round-trip latency of sequential getPosition calls and the
+throughput of pipelined and batched calls:
+
+    python benchmarks/bench_server.py
+'''
+
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ANC350 import PylibANC350
+from ANC350.client import Client
+from ANC350.server import PositionerServer
+from ANC350.simulator import SimulatedANC350
+
+N = 20000
+BATCH = 100
+
+
+def start_server(server):
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(server.start())
+        started.set()
+        loop.run_forever()
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    started.wait()
+    return loop
+
+
+def measure(client, label):
+    remote = client.positioner('dev')
+    for _ in range(1000):
+        remote.getPosition(0)
+
+    n = N // 4
+    start = time.perf_counter()
+    for _ in range(n):
+        remote.getPosition(0)
+    sequential = (time.perf_counter() - start) / n
+
+    start = time.perf_counter()
+    futures = [remote.submit('getPosition', 0) for _ in range(N)]
+    for future in futures:
+        future.result()
+    pipelined = N / (time.perf_counter() - start)
+
+    calls = [('dev', 'getPosition', (0,))] * BATCH
+    start = time.perf_counter()
+    futures = [client.submit_batch(calls) for _ in range(N // BATCH)]
+    for future in futures:
+        future.result()
+    batched = N / (time.perf_counter() - start)
+
+    print('{:<6} {:10.1f} us {:12,.0f} /s {:12,.0f} /s'.format(
+        label, 1e6 * sequential, pipelined, batched))
+
+
+def main():
+    sim = SimulatedANC350()
+    PylibANC350.discover_ANC350(backend=sim, verbose=False)
+    positioner = PylibANC350.Positioner_ANC350(0, backend=sim, verbose=False)
+    start = time.perf_counter()
+    for _ in range(N):
+        positioner.getPosition(0)
+    print('in-process getPosition: {:.1f} us'.format(
+        1e6 * (time.perf_counter() - start) / N))
+
+    print('{:<6} {:>13} {:>15} {:>15}'.format('', 'round trip',
+                                               'pipelined', 'batched'))
+    tcp = PositionerServer({'dev': positioner}, port=0)
+    loop = start_server(tcp)
+    host, port = tcp.address
+    with Client(host, port) as client:
+        measure(client, 'TCP')
+    loop.call_soon_threadsafe(tcp.close)
+
+    if hasattr(asyncio, 'start_unix_server'):
+        path = os.path.join(tempfile.mkdtemp(), 'anc350.sock')
+        unix = PositionerServer({'dev': positioner}, path=path)
+        loop = start_server(unix)
+        with Client(path=path) as client:
+            measure(client, 'Unix')
+        loop.call_soon_threadsafe(unix.close)
+    positioner.disconnect()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark of the time to settle on a target.
+
+Compares plain automatic mode (Positioner_ANC350.move_to) with the
+FastSettle strategy over several travel distances on the simulated
+backend with USB latencies. The axis runs at 5 kHz so the benchmark takes
+about half a minute:
+
+    python benchmarks/bench_settle.py
+'''
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ANC350 import PylibANC350
+from ANC350.settle import FastSettle
+from ANC350.simulator import SimulatedANC350
+
+DISTANCES = (20e-6, 100e-6, 500e-6, 2e-3)
+TOLERANCE = 50e-9
+
+
+def main():
+    sim = SimulatedANC350(latency='usb')
+    PylibANC350.discover_ANC350(backend=sim, verbose=False)
+    positioner = PylibANC350.Positioner_ANC350(0, backend=sim, verbose=False)
+    positioner.setAxisOutput(0, 1, 0)
+    positioner.setFrequency(0, 5000)
+    settle = FastSettle(positioner)
+    # One move to learn the velocity and the stop latency
+    settle.move_to(0, 100e-6, TOLERANCE, timeout=10)
+
+    print('{:>12} {:>14} {:>14} {:>9}'.format(
+        'distance', 'automove', 'FastSettle', 'speed-up'))
+    origin = -1e-3
+    for distance in DISTANCES:
+        positioner.move_to(0, origin, TOLERANCE, timeout=30)
+        plain = positioner.move_to(0, origin + distance, TOLERANCE,
+                                   timeout=30)
+        positioner.move_to(0, origin, TOLERANCE, timeout=30)
+        fast = settle.move_to(0, origin + distance, TOLERANCE, timeout=30)
+        if not (plain.reached and fast.reached):
+            print('{:9.0f} um  not reached: {} / {}'.format(
+                distance * 1e6, plain.reason, fast.reason))
+            continue
+        print('{:9.0f} um {:12.3f} s {:12.3f} s {:8.2f}x'.format(
+            distance * 1e6, plain.elapsed, fast.elapsed,
+            plain.elapsed / fast.elapsed))
+    positioner.disconnect()
+
+
+if __name__ == '__main__':
+    main()
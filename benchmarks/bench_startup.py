@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark of the startup of a short-lived script.
+
+Runs fresh interpreters which import ANC350.PylibANC350, connect the
+simulated device and read one position, and reports the median of the
+import time, the time from import to the first getPosition and the wall
+time of the whole process. The package is byte-compiled first, as it is
+when installed. Also compares the bit-ness detection of
+platform.architecture() with the one used by library_path:
+
+    python benchmarks/bench_startup.py
+'''
+
+import compileall
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+RUNS = 15
+
+SCRIPT = '''
+import time
+start = time.perf_counter()
+from ANC350 import PylibANC350
+imported = time.perf_counter()
+PylibANC350.discover_ANC350(backend='sim', verbose=False)
+positioner = PylibANC350.Positioner_ANC350(0, backend='sim', verbose=False)
+positioner.getPosition(0)
+first = time.perf_counter()
+print(imported - start, first - imported)
+'''
+
+
+def run():
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, '-c', SCRIPT], env=env,
+                         capture_output=True, check=True, text=True).stdout
+    wall = time.perf_counter() - start
+    imported, first = map(float, out.split())
+    return imported, first, wall
+
+
+def per_call(statement, setup, n=20):
+    code = ('import time\n{}\nstart = time.perf_counter()\n'
+            'for _ in range({}):\n    {}\n'
+            'print((time.perf_counter() - start) / {})').format(
+                setup, n, statement, n)
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True,
+                         check=True, text=True).stdout
+    return float(out)
+
+
+def main():
+    compileall.compile_dir(os.path.join(ROOT, 'ANC350'), quiet=1)
+    runs = [run() for _ in range(RUNS)]
+    imported, first, wall = (statistics.median(column)
+                             for column in zip(*runs))
+    print('import ANC350.PylibANC350: {:7.1f} ms'.format(1e3 * imported))
+    print('first getPosition (sim):  {:7.1f} ms'.format(1e3 * first))
+    print('process wall time:        {:7.1f} ms'.format(1e3 * wall))
+
+    # First call of platform.architecture() in a fresh process, including
+    # the import of platform
+    print('\nbit-ness: platform.architecture() {:7.3f} ms'.format(
+        1e3 * per_call('import platform; platform.architecture()', '',
+                       n=1)))
+    print('          ctypes.sizeof(c_void_p)   {:7.3f} ms'.format(
+        1e3 * per_call('8 * ctypes.sizeof(ctypes.c_void_p)',
+                       'import ctypes', n=1000)))
+
+
+if __name__ == '__main__':
+    main()
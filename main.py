@@ -5,5 +5,4 @@ Created on Fri Jul  5 16:11:11 2019
 @author: schaecl
 '''
 
-import numpy as np
 import ANC350.PylibANC350